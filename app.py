@@ -6,271 +6,776 @@ RK3576 机器人视觉 - Flask Web 应用
 
 import cv2
 import numpy as np
+import hmac
+import json
 import logging
 import threading
 import time
 import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Optional
 from flask import Flask, render_template, Response, jsonify, request
 
 import config
+from core.broadcaster import FrameBroadcaster, MetadataChannel, StreamRegistry
 from core.camera import Camera
+from core.capture_manager import CaptureManager
+from core.events import StatusEvents
+from core.metrics import METRICS, frame_age_histogram, stage_histogram
+from core.overlay import StaticLayer, blend_rect
+from core.profiler import SamplingProfiler, default_thread_group
+from core.file_source import FileSource
+from core.log import RateLimitedLogger, setup_logging
+from core.synthetic_source import SyntheticSource
 from core.detector import YOLODetector
 from core.detector_cpu import YOLODetectorCPU
 from core.servo_controller import ServoController
 from core.tracker import ObjectTracker
 
-# 配置日志
-logging.basicConfig(
-    level=getattr(logging, config.LOG_CONFIG["level"]),
-    format=config.LOG_CONFIG["format"]
-)
+# 配置日志（后台线程输出）
+setup_logging(config.LOG_CONFIG["level"], config.LOG_CONFIG["format"],
+              config.LOG_CONFIG.get("queue_size", 10000), config.LOG_CONFIG.get("rate_limit_interval", 5.0))
 logger = logging.getLogger(__name__)
+hot_log = RateLimitedLogger(logger)  # 处理流水线中的逐帧日志
 
 # 创建 Flask 应用
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'rk3576-robot-vision'
 
+METRICS.enabled = config.METRICS_CONFIG.get("enabled", True)
+_TRACKING_TIME = stage_histogram("tracking")
+
+class LatestQueue:
+    """有界队列，满时丢弃最旧的元素（最新优先），慢消费者只会丢帧不会阻塞生产者"""
+    
+    def __init__(self, maxsize: int = 1):
+        self._items = deque(maxlen=max(1, maxsize))
+        self._cond = threading.Condition()
+        self.dropped = 0
+        
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+            
+    def get(self, timeout: float = 0.5):
+        """取出最早的元素，超时返回 None"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+
+def _draw_crosshair(canvas: np.ndarray):
+    """显示画面中心十字线"""
+    h, w = canvas.shape[:2]
+    cx, cy = w // 2, h // 2
+    cv2.line(canvas, (cx - 20, cy), (cx + 20, cy), (0, 255, 0), 1)
+    cv2.line(canvas, (cx, cy - 20), (cx, cy + 20), (0, 255, 0), 1)
+
+
+def _draw_simulation_background(canvas: np.ndarray):
+    """模拟画面的静态部分：网格、中心十字与提示文字"""
+    for i in range(0, 640, 40):
+        cv2.line(canvas, (i, 0), (i, 480), (50, 50, 50), 1)
+    for i in range(0, 480, 40):
+        cv2.line(canvas, (0, i), (640, i), (50, 50, 50), 1)
+    
+    cx, cy = 320, 240
+    cv2.line(canvas, (cx - 30, cy), (cx + 30, cy), (0, 255, 0), 2)
+    cv2.line(canvas, (cx, cy - 30), (cx, cy + 30), (0, 255, 0), 2)
+    
+    cv2.putText(canvas, "SIMULATION MODE", (180, 50),
+               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+    cv2.putText(canvas, "Run on host for real camera", (150, 450),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (200, 200, 200), 1)
+
+
+class PipelineItem:
+    """在流水线各阶段之间传递的一帧"""
+    
+    def __init__(self, seq: int, timestamp: float, image: np.ndarray, frame_set=None):
+        self.seq = seq
+        self.timestamp = timestamp  # 采集时间 (time.monotonic)
+        self.image = image          # 原始帧（真实帧为只读视图）
+        self.frame_set = frame_set  # 多摄像头帧组，模拟帧为 None
+        self.detections = []
+        self.target = None
+        self.frame = None           # 渲染后的显示帧
+        self.raw_frame = None       # 未叠加的显示帧（有浏览器端叠加的客户端时）
+        self.meta = None            # 叠加元数据（与显示帧同一帧序号发布）
+
+
+class PipelineStage:
+    """
+    流水线阶段：独立线程循环 source() 取数据、work(item) 处理
+    耗时只统计 work，另记录处理完成时的帧龄（距采集的时间）
+    metric: work 耗时计入的环节直方图名称（None 表示不单独计入）
+    source() 返回 None 表示暂无数据，返回 STOP 表示输入已结束，阶段退出
+    on_error(item): work 出错、该帧被丢弃时调用（逐帧模式下据此释放帧）
+    """
+    
+    STOP = object()
+    
+    def __init__(self, name: str, source, work, running, inbox: Optional[LatestQueue] = None,
+                 max_errors: int = 5, metric: Optional[str] = None, on_error=None):
+        self.name = name
+        self._source = source
+        self._work = work
+        self._running = running
+        self._inbox = inbox
+        self._max_errors = max_errors
+        self._on_error = on_error
+        self._thread: Optional[threading.Thread] = None
+        self._age_hist = frame_age_histogram(name)
+        self._time_hist = stage_histogram(metric) if metric else None
+        
+        self.count = 0
+        self.avg_ms = 0.0
+        self.max_ms = 0.0
+        self.age_ms = 0.0
+        
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+        self._thread.start()
+        
+    def join(self, timeout: Optional[float] = None):
+        if self._thread:
+            self._thread.join(timeout)
+            
+    def _run(self):
+        error_count = 0
+        while self._running():
+            item = None
+            try:
+                item = self._source()
+                if item is None:
+                    continue
+                if item is PipelineStage.STOP:
+                    logger.info(f"{self.name} 阶段输入已结束，停止")
+                    break
+                start = time.monotonic()
+                self._work(item)
+                end = time.monotonic()
+                self._record((end - start) * 1000.0, (end - item.timestamp) * 1000.0)
+                error_count = 0
+            except Exception as e:
+                error_count += 1
+                hot_log.exception("%s 阶段出错 (%d/%d): %s", self.name, error_count, self._max_errors, e, every=1.0)
+                if self._on_error and isinstance(item, PipelineItem):
+                    self._on_error(item)
+                if error_count >= self._max_errors:
+                    logger.error(f"{self.name} 阶段连续错误次数过多，停止处理")
+                    break
+                time.sleep(0.01)
+                
+    def _record(self, elapsed_ms: float, age_ms: float):
+        """记录耗时（指数平均 + 直方图）"""
+        self._age_hist.observe(age_ms / 1000.0)
+        if self._time_hist:
+            self._time_hist.observe(elapsed_ms / 1000.0)
+        self.count += 1
+        if self.count == 1:
+            self.avg_ms, self.age_ms = elapsed_ms, age_ms
+        else:
+            self.avg_ms = 0.9 * self.avg_ms + 0.1 * elapsed_ms
+            self.age_ms = 0.9 * self.age_ms + 0.1 * age_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        
+    def get_stats(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.avg_ms, 2),
+            "max_ms": round(self.max_ms, 2),
+            "frame_age_ms": round(self.age_ms, 2),
+            "dropped": self._inbox.dropped if self._inbox else 0,
+        }
+
+
+def _init_failed(future: Future) -> bool:
+    """初始化任务被取消或抛出异常"""
+    return future.cancelled() or future.exception() is not None
+
+
 # 全局组件
 class RobotVisionSystem:
     def __init__(self):
-        self.camera: Camera = None
+        self.camera: Camera = None  # 头部摄像头（主帧源）
+        self.capture = CaptureManager(config.CAMERA_CONFIG.get("sync_tolerance", 0.05))
         self.detector: YOLODetector = None
         self.servo: ServoController = None
         self.tracker: ObjectTracker = None
         
         self.is_running = False
         self.frame = None
+        self.frame_seq = 0  # 已处理输出帧序号
         self.status = {"mode": "stopped", "message": "系统未启动"}
+        self.events = StatusEvents()  # 状态增量推送 (/api/events)
+        self._status_key = None       # 上次推送时的 (模式, 目标)
+        self._volatile_time = 0.0     # 上次定时推送帧率与消息的时间
         self.lock = threading.Lock()
+        # 输出帧每个画质档位只编码一次，同档位客户端共享
+        self.broadcaster = FrameBroadcaster(config.STREAM_CONFIG.get("jpeg_quality", 85),
+                                            config.STREAM_CONFIG.get("tiers"),
+                                            config.STREAM_CONFIG.get("default_tier", "high"))
+        # 浏览器端叠加的客户端观看未叠加的画面，与服务端叠加的画面分别编码
+        self.raw_broadcaster = FrameBroadcaster(config.STREAM_CONFIG.get("jpeg_quality", 85),
+                                                config.STREAM_CONFIG.get("tiers"),
+                                                config.STREAM_CONFIG.get("default_tier", "high"))
+        self.stream_clients = StreamRegistry(config.STREAM_CONFIG.get("max_clients", 4))
+        # 默认叠加模式（客户端可用 /video_feed?overlay= 各自选择）:
+        # "server" 画进视频帧，"client" 只推送元数据由浏览器绘制
+        self.overlay_mode = config.STREAM_CONFIG.get("overlay", "server")
+        self.metadata = MetadataChannel()
+        self.detections = (0, [])  # 推理阶段的最新结果 (帧序号, 检测结果)
+        self.stages = []
+        self._stream_lock = threading.Lock()
+        self._stream_jpeg = {}  # 附加摄像头: 名称 -> (帧序号, JPEG)，多个客户端共享
         
         # 显示设置
+        self.mirror = config.CAMERA_CONFIG.get("mirror", True)  # 显示画面水平镜像
         self.show_detection = True
         self.show_fps = True
+        # 静态叠加层按分辨率缓存，每帧只写入图层像素
+        self._crosshair = StaticLayer(_draw_crosshair)
+        self._sim_background = StaticLayer(_draw_simulation_background)
         
         # 模拟模式
         self.simulation_mode = False
         self.sim_frame_count = 0
         
+        # 并行初始化：组件 -> Future，及各组件状态与耗时
+        self._init_executor: Optional[ThreadPoolExecutor] = None
+        self.init_futures = {}
+        self.startup = {}
+        self.startup_seconds = None
+        
     def initialize(self) -> bool:
-        """初始化所有组件"""
+        """初始化所有组件并等待完成（阻塞）"""
+        self.start_initialization()
+        return self.wait_ready()
+        
+    def start_initialization(self):
+        """
+        并行初始化各组件，立即返回
+        摄像头、检测器、舵机互不依赖，同时开始；跟踪器等待舵机完成后创建。
+        各组件的状态与耗时见 startup（/api/status）
+        """
+        logger.info("=" * 50)
+        logger.info("RK3576 机器人视觉系统初始化（并行）")
+        logger.info("=" * 50)
+        self._startup_begin = time.monotonic()
+        self.status = {"mode": "starting", "message": "系统启动中"}
+        self.is_running = True
+        self._init_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="init")
+        self.init_futures = {}
+        for name, init in (("camera", self._init_camera), ("detector", self._init_detector),
+                           ("servo", self._init_servo), ("tracker", self._init_tracker)):
+            self.startup[name] = {"state": "pending", "seconds": None}
+            self.init_futures[name] = self._init_executor.submit(self._run_init, name, init)
+        for future in self.init_futures.values():
+            future.add_done_callback(self._on_component_done)
+            
+    def _run_init(self, name: str, init) -> bool:
+        """执行一个组件的初始化并记录耗时"""
+        self.startup[name] = {"state": "running", "seconds": None}
+        start = time.monotonic()
         try:
-            logger.info("=" * 50)
-            logger.info("RK3576 机器人视觉系统初始化")
-            logger.info("=" * 50)
+            ok = init()
+        except Exception as e:
+            self.startup[name] = {"state": "failed", "seconds": round(time.monotonic() - start, 2)}
+            logger.error(f"{name} 初始化失败: {e}")
+            raise
+        self.startup[name] = {"state": "ready" if ok else "degraded", "seconds": round(time.monotonic() - start, 2)}
+        logger.info(f"{name} 初始化完成，用时 {self.startup[name]['seconds']:.2f}s")
+        return ok
+        
+    def _on_component_done(self, _):
+        """全部组件完成（含失败与取消）时汇总启动耗时，只执行一次"""
+        with self.lock:
+            if self.startup_seconds is not None or not all(f.done() for f in self.init_futures.values()):
+                return
+            total = time.monotonic() - self._startup_begin
+            self.startup_seconds = round(total, 2)
+        for name, future in self.init_futures.items():
+            if future.cancelled():
+                self.startup[name] = {"state": "cancelled", "seconds": None}
+        timings = ", ".join(f"{name} {info['seconds']}s" if info["seconds"] is not None else f"{name} {info['state']}"
+                            for name, info in self.startup.items())
+        logger.info("=" * 50)
+        logger.info(f"系统初始化完成！用时 {total:.2f}s（{timings}）")
+        logger.info("=" * 50)
+        self._init_executor.shutdown(wait=False)
             
-            # 1. 初始化摄像头
-            logger.info("[1/4] 初始化摄像头...")
-            self.camera = Camera(
-                camera_id=config.CAMERA_CONFIG["id"],
+    def wait_ready(self, components=None, timeout: Optional[float] = None) -> bool:
+        """等待指定组件（默认全部）初始化完成，任一组件出错返回 False"""
+        futures = [self.init_futures[name] for name in (components or self.init_futures)]
+        done, pending = wait(futures, timeout)
+        return not pending and not any(_init_failed(f) for f in done)
+        
+    def _init_camera(self) -> bool:
+        """初始化摄像头（配置了离线帧源时用文件或合成帧代替），失败时进入模拟模式"""
+        if config.FILE_SOURCE_CONFIG.get("path") == "synthetic":
+            logger.info("使用合成帧源")
+            camera = SyntheticSource(
                 width=config.CAMERA_CONFIG["width"],
                 height=config.CAMERA_CONFIG["height"],
-                fps=config.CAMERA_CONFIG["fps"]
-            )
-            if not self.camera.open():
-                logger.warning("⚠ 摄像头初始化失败，使用模拟模式")
-                self.simulation_mode = True
-            else:
-                self.simulation_mode = False
-                logger.info("✓ 摄像头初始化成功")
-            
-            # 2. 初始化检测器 (NPU 优先，失败则使用 CPU)
-            logger.info("[2/4] 初始化 YOLO 检测器...")
-            self.detector = YOLODetector(
-                model_path=config.MODEL_PATH,
-                input_size=config.YOLO_CONFIG["input_size"],
-                conf_threshold=config.YOLO_CONFIG["conf_threshold"],
-                iou_threshold=config.YOLO_CONFIG["iou_threshold"],
-                min_box_size=config.YOLO_CONFIG.get("min_box_size", 50)
+                fps=config.FILE_SOURCE_CONFIG.get("fps") or config.CAMERA_CONFIG["fps"],
+                buffer_slots=config.CAMERA_CONFIG.get("buffer_slots", 4)
             )
-            if self.detector.initialized:
-                logger.info("✓ YOLO NPU 检测器初始化成功")
-            else:
-                logger.warning("⚠ NPU 检测器初始化失败，尝试使用 CPU 检测器...")
-                self.detector = YOLODetectorCPU(
-                    model_path=config.MODEL_PATH,
-                    input_size=config.YOLO_CONFIG["input_size"],
-                    conf_threshold=config.YOLO_CONFIG["conf_threshold"],
-                    iou_threshold=config.YOLO_CONFIG["iou_threshold"],
-                    min_box_size=config.YOLO_CONFIG.get("min_box_size", 50)
-                )
-                if self.detector.initialized:
-                    # 检查是否是模拟模式
-                    if hasattr(self.detector, 'simulation_mode') and self.detector.simulation_mode:
-                        logger.info("✓ YOLO CPU 检测器初始化成功 (模拟模式 - 将生成随机检测框)")
-                        # 如果摄像头也失败了，使用完全模拟模式
-                        if not self.camera.is_opened():
-                            self.simulation_mode = True
-                    else:
-                        logger.info("✓ YOLO CPU 检测器初始化成功 (真实推理)")
-                else:
-                    logger.warning("⚠ CPU 检测器也未初始化")
-                
-            # 3. 初始化舵机控制器
-            logger.info("[3/4] 初始化舵机控制器...")
-            self.servo = ServoController(
-                port=config.SERVO_CONFIG["port"],
-                baudrate=config.SERVO_CONFIG["baudrate"],
-                timeout=config.SERVO_CONFIG["timeout"]
+        elif config.FILE_SOURCE_CONFIG.get("path"):
+            logger.info(f"使用离线帧源: {config.FILE_SOURCE_CONFIG['path']}")
+            camera = FileSource(
+                path=config.FILE_SOURCE_CONFIG["path"],
+                fps=config.FILE_SOURCE_CONFIG.get("fps"),
+                realtime=config.FILE_SOURCE_CONFIG.get("realtime", True),
+                loop=config.FILE_SOURCE_CONFIG.get("loop", True),
+                buffer_slots=config.CAMERA_CONFIG.get("buffer_slots", 4)
             )
-            if not self.servo.connect():
-                logger.warning("⚠ 舵机控制器连接失败")
-            else:
-                logger.info("✓ 舵机控制器连接成功")
-                
-            # 4. 初始化跟踪器
-            logger.info("[4/4] 初始化跟踪器...")
-            self.tracker = ObjectTracker(
-                servo_controller=self.servo,
-                action_config=config.ACTION_CONFIG
+        else:
+            camera = Camera(
+                camera_id=config.CAMERA_CONFIG["id"],
+                width=config.CAMERA_CONFIG["width"],
+                height=config.CAMERA_CONFIG["height"],
+                fps=config.CAMERA_CONFIG["fps"],
+                buffer_slots=config.CAMERA_CONFIG.get("buffer_slots", 4),
+                fourcc=config.CAMERA_CONFIG.get("fourcc", "MJPG"),
+                v4l2_buffers=config.CAMERA_CONFIG.get("v4l2_buffers", 1),
+                drop_stale=config.CAMERA_CONFIG.get("drop_stale", True),
+                cache_file=config.CAMERA_CONFIG.get("cache_file"),
+                probe_timeout=config.CAMERA_CONFIG.get("probe_timeout", 3.0),
+                fallback_ids=config.CAMERA_CONFIG.get("fallback_ids")
             )
-            logger.info("✓ 跟踪器初始化成功")
-            
-            self.is_running = True
-            logger.info("=" * 50)
-            logger.info("系统初始化完成！")
-            logger.info("=" * 50)
+        self.capture.add_source("head", camera, priority=0)
+        opened = self.capture.open(["head"])["head"]
+        self.camera = camera
+        if not opened:
+            logger.warning("⚠ 摄像头初始化失败，使用模拟模式")
+            self.simulation_mode = True
+            return False
+        self.simulation_mode = False
+        logger.info("✓ 摄像头初始化成功")
+        self._open_extra_cameras()
+        return True
+        
+    def _init_detector(self) -> bool:
+        """初始化检测器 (NPU 优先，失败则使用 CPU)"""
+        detector = YOLODetector(
+            model_path=config.MODEL_PATH,
+            input_size=config.YOLO_CONFIG["input_size"],
+            conf_threshold=config.YOLO_CONFIG["conf_threshold"],
+            iou_threshold=config.YOLO_CONFIG["iou_threshold"],
+            min_box_size=config.YOLO_CONFIG.get("min_box_size", 50),
+            mirror=config.CAMERA_CONFIG.get("mirror", True),
+            batch_size=config.YOLO_CONFIG.get("batch_size", 1)
+        )
+        if detector.initialized:
+            logger.info("✓ YOLO NPU 检测器初始化成功")
+            self.detector = detector
             return True
-            
-        except Exception as e:
-            logger.error(f"初始化失败: {e}")
+        
+        logger.warning("⚠ NPU 检测器初始化失败，尝试使用 CPU 检测器...")
+        detector = YOLODetectorCPU(
+            model_path=config.MODEL_PATH,
+            input_size=config.YOLO_CONFIG["input_size"],
+            conf_threshold=config.YOLO_CONFIG["conf_threshold"],
+            iou_threshold=config.YOLO_CONFIG["iou_threshold"],
+            min_box_size=config.YOLO_CONFIG.get("min_box_size", 50),
+            mirror=config.CAMERA_CONFIG.get("mirror", True)
+        )
+        self.detector = detector
+        if not detector.initialized:
+            logger.warning("⚠ CPU 检测器也未初始化")
+            return False
+        # 模拟模式的 CPU 检测器生成随机检测框；摄像头失败时由摄像头初始化进入完全模拟模式
+        if getattr(detector, 'simulation_mode', False):
+            logger.info("✓ YOLO CPU 检测器初始化成功 (模拟模式 - 将生成随机检测框)")
+            return False
+        logger.info("✓ YOLO CPU 检测器初始化成功 (真实推理)")
+        return True
+        
+    def _init_servo(self) -> bool:
+        """初始化舵机控制器（连接失败时后台自动重连）"""
+        servo = ServoController(
+            port=config.SERVO_CONFIG["port"],
+            baudrate=config.SERVO_CONFIG["baudrate"],
+            timeout=config.SERVO_CONFIG["timeout"],
+            firmware_actions=config.SERVO_CONFIG.get("firmware_actions", False),
+            action_config=config.ACTION_CONFIG,
+            control_rate=config.SERVO_CONFIG.get("control_rate", 50),
+            max_velocity=(config.SERVO_CONFIG["max_velocity_x"], config.SERVO_CONFIG["max_velocity_y"]),
+            max_acceleration=(config.SERVO_CONFIG["max_acceleration_x"], config.SERVO_CONFIG["max_acceleration_y"]),
+            trajectory_profile=config.SERVO_CONFIG.get("trajectory_profile", "min_jerk"),
+            ready_timeout=config.SERVO_CONFIG.get("ready_timeout", 3.0),
+            reconnect_min_delay=config.SERVO_CONFIG.get("reconnect_min_delay", 0.5),
+            reconnect_max_delay=config.SERVO_CONFIG.get("reconnect_max_delay", 10.0)
+        )
+        self.servo = servo
+        if not servo.connect():
+            logger.warning("⚠ 舵机控制器连接失败，后台自动重连中")
             return False
+        logger.info("✓ 舵机控制器连接成功")
+        return True
+        
+    def _init_tracker(self) -> bool:
+        """初始化跟踪器（依赖舵机控制器，等待其初始化完成）"""
+        self.init_futures["servo"].result()
+        self.tracker = ObjectTracker(
+            servo_controller=self.servo,
+            action_config=config.ACTION_CONFIG
+        )
+        logger.info("✓ 跟踪器初始化成功")
+        return True
+            
+    def _open_extra_cameras(self):
+        """打开附加摄像头（共享镜像设置，只打开指定设备）"""
+        for cam in config.EXTRA_CAMERAS:
+            camera = Camera(
+                camera_id=cam["id"],
+                width=cam.get("width", config.CAMERA_CONFIG["width"]),
+                height=cam.get("height", config.CAMERA_CONFIG["height"]),
+                fps=cam.get("fps", config.CAMERA_CONFIG["fps"]),
+                buffer_slots=config.CAMERA_CONFIG.get("buffer_slots", 4),
+                fourcc=cam.get("fourcc", config.CAMERA_CONFIG.get("fourcc", "MJPG")),
+                v4l2_buffers=config.CAMERA_CONFIG.get("v4l2_buffers", 1),
+                drop_stale=config.CAMERA_CONFIG.get("drop_stale", True),
+                discover=False
+            )
+            self.capture.add_source(cam["name"], camera,
+                                    priority=cam.get("priority", 1),
+                                    detect_interval=cam.get("detect_interval", 0.5))
+            if self.capture.open([cam["name"]])[cam["name"]]:
+                logger.info(f"✓ 附加摄像头 {cam['name']} 初始化成功")
             
+    # ==================== 处理流水线 ====================
+    # capture -> inference（自身速率）
+    #         -> control（相机帧率，使用最新检测结果）-> render -> encode
+    # 阶段之间用最新优先的有界队列连接，慢阶段只会丢弃旧数据，不会拖慢其他阶段
+    
     def process_frame(self):
-        """处理视频帧的主循环 - 优化帧率"""
-        frame_count = 0
-        error_count = 0
-        max_errors = 5
+        """摄像头与检测器就绪后启动处理流水线（舵机与跟踪器可以稍后就绪），阻塞直到系统停止"""
+        required = [self.init_futures[name] for name in ("camera", "detector") if name in self.init_futures]
+        while self.is_running and wait(required, timeout=0.5).not_done:
+            pass
+        if not self.is_running:
+            return
+        if any(_init_failed(f) for f in required):
+            logger.error("摄像头或检测器初始化出错，处理流水线未启动")
+            return
         
-        # 跳帧参数：每 N 帧检测一次
-        detect_interval = 3  # 每3帧检测一次，提高帧率
-        last_detections = []
-        last_detect_time = 0
-
-        while self.is_running:
+        queue_size = config.PIPELINE_CONFIG.get("queue_size", 1)
+        self._infer_q = LatestQueue(queue_size)
+        self._control_q = LatestQueue(queue_size)
+        self._render_q = LatestQueue(queue_size)
+        self._encode_q = LatestQueue(queue_size)
+        self._last_capture_seq = 0
+        self._next_sim_time = time.monotonic()
+        self._last_inference = 0.0
+        self._inference_count = 0
+        
+        # 非实时离线帧源逐帧处理：同一时间只有一帧在流水线中，依次经过推理、控制、渲染、编码，
+        # 该帧处理完（或被丢弃）后才取下一帧，帧源随之解码下一帧，每一帧都会被检测且结果可复现
+        source = self.capture.get_source(self.capture.primary)
+        self._lockstep = not self.simulation_mode and getattr(source, "realtime", True) is False
+        self._frame_done = threading.Event()
+        self._frame_done.set()
+        if self._lockstep:
+            logger.info("非实时离线帧源：流水线逐帧处理")
+        
+        running = lambda: self.is_running
+        release = self._release_frame
+        self.stages = [
+            PipelineStage("capture", self._capture_source, self._capture_stage, running, on_error=release),
+            PipelineStage("inference", self._infer_q.get, self._inference_stage, running, self._infer_q,
+                          on_error=release),
+            PipelineStage("control", self._control_q.get, self._control_stage, running, self._control_q,
+                          on_error=release),
+            PipelineStage("render", self._render_q.get, self._render_stage, running, self._render_q,
+                          metric="render", on_error=release),
+            PipelineStage("encode", self._encode_q.get, self._encode_stage, running, self._encode_q,
+                          on_error=release),
+        ]
+        for stage in self.stages:
+            stage.start()
+        for stage in self.stages:
+            stage.join()
+            
+    def get_pipeline_stats(self) -> dict:
+        """各阶段耗时与丢帧统计"""
+        return {stage.name: stage.get_stats() for stage in self.stages}
+        
+    def _capture_source(self) -> Optional[PipelineItem]:
+        """capture 阶段的输入：模拟帧或主摄像头新帧（带附加摄像头帧组）"""
+        if self.simulation_mode:
+            # 模拟模式：按 30 FPS 节拍生成测试画面
+            self._next_sim_time = max(self._next_sim_time + 1.0 / 30, time.monotonic())
+            time.sleep(max(0.0, self._next_sim_time - time.monotonic()))
+            self.sim_frame_count += 1
+            return PipelineItem(self.sim_frame_count, time.monotonic(), self._generate_simulation_frame())
+        
+        # 逐帧模式：上一帧处理完才取下一帧（取帧即确认上一帧已处理，帧源随之解码下一帧）
+        if self._lockstep and not self._frame_done.wait(0.5):
+            return None
+        
+        # 阻塞等待主摄像头新帧（只读视图），附加摄像头取时间最接近的帧
+        frame_set = self.capture.wait_frame_set(self._last_capture_seq, timeout=0.5)
+        if frame_set is None:
+            if self.capture.closed():
+                # 帧源已停止：缓冲区关闭后等待会立即返回，继续取帧只会空转
+                self._on_source_closed()
+                return PipelineStage.STOP
+            return None
+        packet = frame_set.frames[frame_set.primary]
+        self._last_capture_seq = packet.seq
+        if self._lockstep:
+            self._frame_done.clear()
+        return PipelineItem(packet.seq, packet.timestamp, packet.image, frame_set)
+        
+    def _on_source_closed(self):
+        """主帧源停止后更新状态（采集阶段随之退出）：离线帧源播放结束，或摄像头断开"""
+        source = self.capture.get_source(self.capture.primary)
+        if not self.is_running or getattr(source, "released", False):
+            # 正常关闭（shutdown / release）时帧源也会关闭缓冲区，不是断线
+            logger.info("帧源已停止，处理流水线停止取帧")
+            return
+        if getattr(source, "finished", False):
+            logger.info("离线帧源播放结束，处理流水线停止取帧")
+            self.status = {"mode": "finished", "message": "离线帧源播放结束"}
+        else:
+            logger.error("摄像头采集已停止（读取连续失败或设备断开），处理流水线停止取帧")
+            self.status = {"mode": "error", "message": "摄像头已断开"}
+        self._publish_status()
+        
+    def _release_frame(self, item: Optional[PipelineItem] = None):
+        """逐帧模式下当前帧已处理完或被丢弃，允许采集阶段取下一帧"""
+        if self._lockstep:
+            self._frame_done.set()
+        
+    def _capture_stage(self, item: PipelineItem):
+        """分发新帧：模拟帧直接渲染，真实帧同时送往推理与控制（逐帧模式下先推理再控制）"""
+        if item.frame_set is None:
+            self.status = {"mode": "simulation", "message": "Simulation Mode - Run on host for real camera", "fps": 30}
+            self._publish_status()
+            self._render_q.put(item)
+            return
+        
+        # 验证帧数据
+        if not isinstance(item.image, np.ndarray) or item.image.size == 0:
+            hot_log.warning("无效的帧数据")
+            self._release_frame(item)
+            return
+        
+        if self.detector and self.detector.initialized:
+            self._infer_q.put(item)
+            if self._lockstep:
+                return  # 推理完成后再送往控制
+        self._control_q.put(item)
+        
+    def _inference_stage(self, item: PipelineItem):
+        """推理阶段：以检测器自身的速度处理最新帧，附加摄像头有待检测的帧时同批推理"""
+        interval = config.PIPELINE_CONFIG.get("inference_min_interval", 0.0)
+        now = time.monotonic()
+        if now - self._last_inference < interval and not self._lockstep:
+            return
+        self._last_inference = now
+        
+        frame_set = item.frame_set
+        extra = None
+        if len(frame_set.frames) > 1:
+            extra = self.capture.schedule(frame_set, exclude=(frame_set.primary,))
+        batch = [item.image] + ([frame_set.frames[extra].image] if extra else [])
+        results = self.detector.detect_batch(batch)
+        
+        # 推理期间写入方可能已绕回并改写了视图所在的槽位：结果与画面不再对应，丢弃
+        if not self.capture.frame_valid(frame_set.primary, item.seq):
+            hot_log.warning("推理期间帧 %d 已被覆盖，丢弃检测结果", item.seq)
+            self._release_frame(item)
+            return
+        if extra and not self.capture.frame_valid(extra, frame_set.frames[extra].seq):
+            hot_log.warning("推理期间帧源 %s 的帧已被覆盖，丢弃其检测结果", extra)
+            extra = None
+        
+        self.detections = (item.seq, results[0])
+        self.capture.record_detections(frame_set.primary, item.seq, results[0])
+        if extra:
+            self.capture.record_detections(extra, frame_set.frames[extra].seq, results[1])
+        
+        self._inference_count += 1
+        hot_log.info("Detection result: %d objects", len(results[0]))
+        if self._lockstep:
+            self._control_q.put(item)
+            
+    def _control_stage(self, item: PipelineItem):
+        """控制阶段：按相机帧率用最新检测结果更新跟踪器与舵机"""
+        if not (self.detector and self.detector.initialized):
+            hot_log.warning("Detector not ready: detector=%s", self.detector)
+        
+        _, item.detections = self.detections
+        if self.tracker:
             try:
-                if self.simulation_mode:
-                    # 模拟模式：生成测试画面
-                    frame = self._generate_simulation_frame()
-                    self.status = {"mode": "simulation", "message": "Simulation Mode - Run on host for real camera", "fps": 30}
-                else:
-                    # 正常模式：读取摄像头帧
-                    ret, frame = self.camera.read()
-                    if not ret or frame is None:
-                        time.sleep(0.001)  # 减少等待时间
-                        continue
-
-                    # 验证帧数据
-                    if not isinstance(frame, np.ndarray) or frame.size == 0:
-                        logger.warning("无效的帧数据")
-                        time.sleep(0.001)
-                        continue
-
-                    # 目标检测 - 跳帧优化
-                    detections = last_detections  # 默认使用上次的检测结果
-                    current_time = time.time()
-                    
-                    if self.detector and self.detector.initialized:
-                        # 每隔 detect_interval 帧或超过 100ms 没有检测时才检测
-                        if frame_count % detect_interval == 0 or (current_time - last_detect_time) > 0.1:
-                            try:
-                                detections = self.detector.detect(frame)
-                                last_detections = detections
-                                last_detect_time = current_time
-                                if frame_count % 90 == 0:  # 每90帧记录一次 (考虑跳帧)
-                                    logger.info(f"Detection result: {len(detections)} objects")
-                            except Exception as det_e:
-                                logger.error(f"检测过程出错: {det_e}")
-                                detections = last_detections  # 出错时使用上次结果
-                    else:
-                        if frame_count % 30 == 0:
-                            logger.warning(f"Detector not ready: detector={self.detector}, initialized={self.detector.initialized if self.detector else False}")
-
-                    # 更新跟踪器
-                    target_to_draw = None
-                    if self.tracker:
-                        try:
-                            self.status = self.tracker.update(detections, frame.shape)
-                            # 获取当前跟踪的目标
-                            if self.status.get("target"):
-                                target_to_draw = self.status["target"]
-                        except Exception as track_e:
-                            logger.error(f"跟踪过程出错: {track_e}")
-
-                    # 绘制检测结果 - 只绘制占画面比例最大的目标
-                    if self.show_detection:
-                        try:
-                            best_target = None
-                            
-                            if detections:
-                                # 计算每个检测框的面积（占画面比例）
-                                frame_area = frame.shape[0] * frame.shape[1]
-                                
-                                def get_box_area(det):
-                                    x1, y1, x2, y2 = det['bbox']
-                                    return (x2 - x1) * (y2 - y1)
-                                
-                                # 按面积排序，选择最大的
-                                best_target = max(detections, key=get_box_area)
-                                
-                            elif target_to_draw:
-                                best_target = target_to_draw
-                            
-                            # 只绘制一个目标
-                            if best_target:
-                                frame = self._draw_single_detection(frame, best_target, True)
-                                
-                        except Exception as draw_e:
-                            logger.error(f"绘制检测结果出错: {draw_e}")
-
-                # 绘制状态信息
-                if self.show_fps:
-                    try:
-                        frame = self._draw_status(frame)
-                    except Exception as status_e:
-                        logger.error(f"绘制状态信息出错: {status_e}")
-
-                with self.lock:
-                    self.frame = frame.copy() if isinstance(frame, np.ndarray) else frame
-
-                frame_count += 1
-                error_count = 0  # 重置错误计数
-
-            except Exception as e:
-                error_count += 1
-                logger.error(f"处理帧出错 ({error_count}/{max_errors}): {e}")
-                import traceback
-                logger.error(traceback.format_exc())
-
-                if error_count >= max_errors:
-                    logger.error("连续错误次数过多，停止处理")
-                    break
-
-                time.sleep(0.01)
-    
+                start = time.perf_counter()
+                self.status = self.tracker.update(item.detections, item.image.shape)
+                _TRACKING_TIME.observe(time.perf_counter() - start)
+                # 获取当前跟踪的目标
+                item.target = self.status.get("target")
+                self._publish_status()
+            except Exception as track_e:
+                hot_log.error("跟踪过程出错: %s", track_e)
+        self._render_q.put(item)
+        
+    def _publish_status(self):
+        """跟踪模式或目标变化时立即推送（消息随之更新，帧率等由定时刷新推送）"""
+        target = self.status.get("target")
+        target = {"label": target.get("label"), "category": target.get("category")} if target else None
+        key = (self.status.get("mode"), target)
+        if key == self._status_key:
+            return
+        self._status_key = key
+        self.events.update({"mode": key[0], "target": target, "message": self.status.get("message", "")})
+        
+    def status_fields(self) -> dict:
+        """硬件与视频流状态（/api/status 与状态推送共用）"""
+        return {
+            "camera_connected": self.camera.is_opened() if self.camera else False,
+            "detector_initialized": self.detector.initialized if self.detector else False,
+            "servo_connected": self.servo.is_connected() if self.servo else False,
+            "simulation_mode": self.simulation_mode,
+            "system_running": self.is_running,
+            "overlay": self.overlay_mode,
+            "streams": self.capture.stream_names(),
+            "stream_clients": len(self.stream_clients),
+            "startup": {name: dict(info) for name, info in self.startup.items()},
+            "startup_seconds": self.startup_seconds,
+        }
+        
+    def refresh_status_events(self):
+        """
+        刷新慢变字段（硬件状态等），只有变化的字段会推送
+        帧率与消息在跟踪时几乎每次都有变化，只按 EVENTS_CONFIG["volatile_interval"] 随定时刷新推送
+        （消息在模式或目标变化时已由 _publish_status 立即推送）
+        """
+        fields = self.status_fields()
+        fields["mode"] = self.status.get("mode", "unknown")
+        now = time.monotonic()
+        if now - self._volatile_time >= config.EVENTS_CONFIG.get("volatile_interval", 5.0):
+            self._volatile_time = now
+            fields["fps"] = self.status.get("fps", 0)
+            fields["message"] = self.status.get("message", "")
+        self.events.update(fields)
+        
+    def _render_stage(self, item: PipelineItem):
+        """渲染阶段：生成显示帧与叠加元数据，服务端叠加模式下绘制检测框与状态"""
+        if item.frame_set is None:
+            frame = item.image  # 模拟帧本身可写
+        else:
+            # 生成可写的显示帧（缓冲区视图只读，且发布后仍需保留）
+            # 镜像只在需要显示的帧上做一次，翻转本身即替代了复制
+            frame = cv2.flip(item.image, 1) if self.mirror else item.image.copy()
+            if not self.capture.frame_valid(item.frame_set.primary, item.seq):
+                hot_log.warning("渲染前帧 %d 已被覆盖，丢弃该帧", item.seq)
+                self._release_frame(item)
+                return
+        
+        best_target = None
+        if item.frame_set is not None and self.show_detection:
+            best_target = self._select_display_target(item)
+        item.meta = self._overlay_meta(item, frame.shape, best_target)
+        
+        # 只在有客户端需要时分别生成两种画面；两者都需要时叠加画在副本上
+        need_raw = self.raw_broadcaster.subscribers > 0
+        need_drawn = self.broadcaster.subscribers > 0 or self.overlay_mode != "client"
+        if need_raw:
+            item.raw_frame = frame
+            if need_drawn:
+                frame = frame.copy()
+        
+        if need_drawn:
+            # 只绘制一个目标（绘制会改写 center，使用副本避免影响跟踪线程）
+            if best_target:
+                try:
+                    frame = self._draw_single_detection(frame, dict(best_target), True)
+                except Exception as draw_e:
+                    hot_log.error("绘制检测结果出错: %s", draw_e)
+            
+            # 绘制状态信息
+            if self.show_fps:
+                try:
+                    frame = self._draw_status(frame)
+                except Exception as status_e:
+                    hot_log.error("绘制状态信息出错: %s", status_e)
+        
+        item.frame = frame
+        self._encode_q.put(item)
+        
+    def _select_display_target(self, item: PipelineItem) -> Optional[dict]:
+        """选择要显示的目标：占画面比例最大的检测结果，没有检测结果时为跟踪目标"""
+        if item.detections:
+            def get_box_area(det):
+                x1, y1, x2, y2 = det['bbox']
+                return (x2 - x1) * (y2 - y1)
+            
+            # 按面积排序，选择最大的
+            return max(item.detections, key=get_box_area)
+        return item.target
+        
+    def _overlay_meta(self, item: PipelineItem, shape: tuple, best_target: Optional[dict]) -> dict:
+        """
+        本帧的叠加元数据（紧凑格式）
+        boxes: 全部检测框 [x1, y1, x2, y2, label, category, conf]
+        target: 显示目标 [x1, y1, x2, y2, cx, cy, label, category, conf]（人脸为估算的人脸框）
+        """
+        target = None
+        if best_target:
+            x1, y1, x2, y2, (cx, cy) = self._display_box(best_target)
+            target = [int(x1), int(y1), int(x2), int(y2), int(cx), int(cy), best_target["label"],
+                      best_target.get("category", "other"), round(float(best_target["confidence"]), 2)]
+        boxes = []
+        if self.show_detection:
+            for det in item.detections:
+                x1, y1, x2, y2 = det["bbox"]
+                boxes.append([int(x1), int(y1), int(x2), int(y2), det["label"],
+                              det.get("category", "other"), round(float(det["confidence"]), 2)])
+        return {
+            "width": int(shape[1]),
+            "height": int(shape[0]),
+            "mode": self.status.get("mode", "unknown"),
+            "fps": self.status.get("fps", 0),
+            "show_status": self.show_fps,
+            "boxes": boxes,
+            "target": target,
+        }
+        
+    def _encode_stage(self, item: PipelineItem):
+        """编码阶段：发布输出帧，有客户端观看时在本线程编码一次（不持有帧锁）"""
+        with self.lock:
+            self.frame = item.frame
+            self.frame_seq += 1
+            seq = self.frame_seq
+        # 元数据先于画面发布，浏览器收到画面时对应的元数据已经到达
+        if item.meta is not None:
+            self.metadata.publish(seq, item.meta)
+        if item.raw_frame is not None:
+            self.raw_broadcaster.publish(item.raw_frame, seq)
+        self.broadcaster.publish(item.frame, seq)
+        self._release_frame(item)
+            
     def _generate_simulation_frame(self) -> np.ndarray:
         """生成模拟测试画面"""
-        self.sim_frame_count += 1
-        
-        # 创建渐变背景
-        frame = np.zeros((480, 640, 3), dtype=np.uint8)
         
-        # 添加动态效果
+        # 动态背景色
         t = self.sim_frame_count % 100
         color_val = int(128 + 127 * np.sin(t * 0.1))
         
-        # 绘制背景
-        frame[:, :] = [color_val // 4, color_val // 3, color_val // 2]
-        
-        # 绘制网格
-        for i in range(0, 640, 40):
-            cv2.line(frame, (i, 0), (i, 480), (50, 50, 50), 1)
-        for i in range(0, 480, 40):
-            cv2.line(frame, (0, i), (640, i), (50, 50, 50), 1)
+        # 填充背景后合成缓存的网格、十字与文字
+        # （先填一行再按行广播，比逐像素广播三通道颜色快一个数量级）
+        frame = np.empty((480, 640, 3), dtype=np.uint8)
+        frame[:, :] = np.full((1, 640, 3), (color_val // 4, color_val // 3, color_val // 2), dtype=np.uint8)
+        self._sim_background.apply(frame)
         
-        # 绘制中心十字
         cx, cy = 320, 240
-        cv2.line(frame, (cx - 30, cy), (cx + 30, cy), (0, 255, 0), 2)
-        cv2.line(frame, (cx, cy - 30), (cx, cy + 30), (0, 255, 0), 2)
         
         # 绘制模拟人脸框（移动）
         offset_x = int(100 * np.sin(t * 0.05))
@@ -280,14 +785,29 @@ class RobotVisionSystem:
         cv2.putText(frame, "person: 0.85", (face_x, face_y - 10), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
         
-        # 绘制文字
-        cv2.putText(frame, "SIMULATION MODE", (180, 50), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-        cv2.putText(frame, "Run on host for real camera", (150, 450), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (200, 200, 200), 1)
-        
         return frame
                 
+    def _display_box(self, det: dict) -> tuple:
+        """显示用的框与中心 (x1, y1, x2, y2, center) - 人脸使用 tracker 估算的人脸框（更稳定）"""
+        x1, y1, x2, y2 = det["bbox"]
+        if det.get("category") != "face" or det["label"] != "person":
+            return x1, y1, x2, y2, det["center"]
+        
+        # 优先使用 tracker 保存的 face_bbox
+        if "face_bbox" in det:
+            x1, y1, x2, y2 = det["face_bbox"]
+        else:
+            # 如果没有，估算人脸位置
+            face_height = int((y2 - y1) * 0.3)
+            face_width = int((x2 - x1) * 0.5)
+            face_center_y = y1 + int((y2 - y1) * 0.15)
+            face_center_x = (x1 + x2) // 2
+            x1 = face_center_x - face_width // 2
+            y1 = face_center_y - face_height // 2
+            x2 = face_center_x + face_width // 2
+            y2 = face_center_y + face_height // 2
+        return x1, y1, x2, y2, ((x1 + x2) // 2, (y1 + y2) // 2)
+        
     def _draw_single_detection(self, frame: np.ndarray, det: dict, is_target: bool = False) -> np.ndarray:
         """在帧上绘制单个检测结果 - 人脸使用精确框"""
         # 类别颜色映射 (BGR格式)
@@ -298,30 +818,14 @@ class RobotVisionSystem:
             "other": (255, 255, 0),   # 青色 - 其他
         }
         
-        x1, y1, x2, y2 = det["bbox"]
         label = det["label"]
         category = det.get("category", "other")
         conf = det["confidence"]
         
         color = colors.get(category, (128, 128, 128))
         
-        # 如果是人脸，使用 tracker 估算的人脸框（更稳定）
-        if category == "face" and label == "person":
-            # 优先使用 tracker 保存的 face_bbox
-            if "face_bbox" in det:
-                x1, y1, x2, y2 = det["face_bbox"]
-            else:
-                # 如果没有，估算人脸位置
-                face_height = int((y2 - y1) * 0.3)
-                face_width = int((x2 - x1) * 0.5)
-                face_center_y = y1 + int((y2 - y1) * 0.15)
-                face_center_x = (x1 + x2) // 2
-                x1 = face_center_x - face_width // 2
-                y1 = face_center_y - face_height // 2
-                x2 = face_center_x + face_width // 2
-                y2 = face_center_y + face_height // 2
-            # 更新 det 的 center 为人脸中心
-            det["center"] = ((x1 + x2) // 2, (y1 + y2) // 2)
+        # 人脸使用估算的人脸框，中心改为人脸中心
+        x1, y1, x2, y2, det["center"] = self._display_box(det)
         
         # 使用细框（线条更细）
         thickness = 2 if is_target else 1
@@ -415,18 +919,11 @@ class RobotVisionSystem:
         x, y = 10, 20
         padding = 4
         
-        # 绘制半透明背景（使用叠加）
-        overlay = frame.copy()
-        bg_color = (0, 0, 0)
-        alpha = 0.3  # 透明度
-        
-        cv2.rectangle(overlay, 
-                     (x - padding, y - text_h - padding), 
-                     (x + text_w + padding, y + padding), 
-                     bg_color, -1)
-        
-        # 应用透明度
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+        # 绘制半透明背景（只在标签区域内混合，不复制整帧）
+        blend_rect(frame,
+                   (x - padding, y - text_h - padding),
+                   (x + text_w + padding, y + padding),
+                   (0, 0, 0), 0.3)
         
         # 绘制文字（带阴影提高可读性）
         # 阴影
@@ -434,42 +931,74 @@ class RobotVisionSystem:
         # 主文字
         cv2.putText(frame, status_text, (x, y), font, font_scale, (0, 255, 0), thickness)
         
-        # 绘制中心十字线
-        h, w = frame.shape[:2]
-        cx, cy = w // 2, h // 2
-        cv2.line(frame, (cx - 20, cy), (cx + 20, cy), (0, 255, 0), 1)
-        cv2.line(frame, (cx, cy - 20), (cx, cy + 20), (0, 255, 0), 1)
+        # 绘制中心十字线（静态图层）
+        self._crosshair.apply(frame)
         
         return frame
         
-    def get_frame_bytes(self) -> bytes:
-        """获取当前帧的 JPEG 字节"""
-        with self.lock:
-            if self.frame is None:
-                # 创建空白帧
-                blank = np.zeros((480, 640, 3), dtype=np.uint8)
-                # 添加状态信息
-                cv2.putText(blank, "NO CAMERA FEED", (120, 200),
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                cv2.putText(blank, f"Mode: {self.status.get('mode', 'unknown')}", (120, 250),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                cv2.putText(blank, "Check camera connection", (120, 300),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 1)
-                ret, buffer = cv2.imencode('.jpg', blank)
-                return buffer.tobytes() if ret else b""
-
-            ret, buffer = cv2.imencode('.jpg', self.frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    def head_broadcaster(self, overlay: str) -> FrameBroadcaster:
+        """主视频流按叠加模式对应的广播：浏览器端叠加的客户端取未叠加的画面"""
+        return self.raw_broadcaster if overlay == "client" else self.broadcaster
+        
+    def _placeholder_bytes(self) -> bytes:
+        """无画面时的占位画面"""
+        # 创建空白帧
+        blank = np.zeros((480, 640, 3), dtype=np.uint8)
+        # 添加状态信息
+        cv2.putText(blank, "NO CAMERA FEED", (120, 200),
+                   cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        cv2.putText(blank, f"Mode: {self.status.get('mode', 'unknown')}", (120, 250),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        cv2.putText(blank, "Check camera connection", (120, 300),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 1)
+        ret, buffer = cv2.imencode('.jpg', blank)
+        return buffer.tobytes() if ret else b""
+            
+    def get_stream_bytes(self, name: str, after_seq: int, timeout: float = 1.0):
+        """
+        附加摄像头的 JPEG 画面，返回 (帧序号, JPEG)，超时无新帧时 JPEG 为空，
+        帧源不存在或已停止时返回 None（视频流随之结束）
+        只在有客户端观看时渲染编码，同一帧的结果由所有客户端共享
+        """
+        source = self.capture.get_source(name)
+        if source is None or self.capture.closed(name):
+            return None
+        packet = source.wait_frame(after_seq, timeout)
+        if packet is None:
+            # 等待期间帧源停止时 wait_frame 立即返回，下次调用即结束视频流
+            return after_seq, b""
+
+        with self._stream_lock:
+            cached = self._stream_jpeg.get(name)
+            if cached and cached[0] == packet.seq:
+                return cached
+
+            image = cv2.flip(packet.image, 1) if self.mirror else packet.image.copy()
+            if not self.capture.frame_valid(name, packet.seq):
+                # 复制期间槽位被改写，下次调用取更新的帧
+                return after_seq, b""
+            if self.show_detection:
+                _, detections = self.capture.get_detections(name)
+                image = self._draw_detections(image, detections)
+            ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 85])
             if not ret:
-                logger.warning("JPEG encoding failed")
-                return b""
-            return buffer.tobytes()
+                return packet.seq, b""
+            self._stream_jpeg[name] = (packet.seq, buffer.tobytes())
+            return self._stream_jpeg[name]
             
     def shutdown(self):
         """关闭系统"""
         self.is_running = False
+        if self._init_executor:
+            # 取消未开始的初始化，进行中的最多等待几秒，以便释放已创建的组件
+            self._init_executor.shutdown(wait=False, cancel_futures=True)
+            wait(list(self.init_futures.values()), timeout=5.0)
+        self.broadcaster.close()
+        self.raw_broadcaster.close()
+        self.metadata.close()
+        self.events.close()
         
-        if self.camera:
-            self.camera.release()
+        self.capture.release()
         if self.detector:
             self.detector.release()
         if self.servo:
@@ -487,70 +1016,270 @@ def index():
     """主页"""
     return render_template('index.html')
 
+def _mjpeg_response(client, next_frame) -> Response:
+    """
+    MJPEG 响应：每个客户端按自己的帧率上限发送
+    next_frame(last_seq) 返回 (序号, JPEG)，JPEG 为空表示暂无新帧，返回 None 表示结束
+    """
+    def generate():
+        last_seq = 0
+        last_log_time = time.time()
+        try:
+            while True:
+                # 节拍等待期间到达的帧被跳过，醒来后只发送最新一帧
+                client.pace()
+                result = next_frame(last_seq)
+                if result is None:
+                    break
+                seq, frame_bytes = result
+                if not frame_bytes:
+                    continue
+                skipped = seq - last_seq - 1 if last_seq and seq > last_seq else 0
+                last_seq = seq
+
+                send_start = time.monotonic()
+                # X-Frame-Seq 与 /api/overlay 的元数据序号对应，Content-Length 供浏览器端按长度切分
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n'
+                       b'Cache-Control: no-cache\r\n'
+                       b'X-Frame-Seq: %d\r\n'
+                       b'Content-Length: %d\r\n'
+                       b'\r\n' % (seq, len(frame_bytes)) + frame_bytes + b'\r\n')
+                # 生成器恢复时本帧已写出，间隔即写入阻塞时间
+                client.record(skipped, time.monotonic() - send_start)
+
+                # 每5秒记录一次日志
+                current_time = time.time()
+                if current_time - last_log_time >= 5:
+                    logger.info("Video stream %s (%s): %.1f FPS, dropped %d, mode: %s", client.client_id, client.stream,
+                                client.fps, client.dropped, robot_system.status.get('mode', 'unknown'))
+                    last_log_time = current_time
+        except Exception as e:
+            logger.error("Video stream %s error: %s", client.client_id, e)
+
+    def cleanup():
+        # 响应关闭时注销（客户端在首帧前断开也会调用）
+        robot_system.stream_clients.release(client)
+        if client.stream == "head":
+            robot_system.head_broadcaster(client.overlay).unsubscribe(client.tier)
+
+    response = Response(generate(),
+                        mimetype='multipart/x-mixed-replace; boundary=frame',
+                        headers={
+                            'Cache-Control': 'no-cache, no-store, must-revalidate',
+                            'Pragma': 'no-cache',
+                            'Expires': '0'
+                        })
+    response.call_on_close(cleanup)
+    return response
+
+def _next_head_frame(broadcaster: FrameBroadcaster, tier: str):
+    """主视频流：等待档位的下一帧（已编码，同档位客户端共享）；无画面时每秒发送一次占位画面"""
+    def next_frame(last_seq: int):
+        seq, frame_bytes = broadcaster.wait(last_seq, timeout=1.0, tier=tier)
+        if frame_bytes is None:
+            if broadcaster.closed:
+                return None
+            if broadcaster.seq > 0:
+                return last_seq, b""
+            return last_seq, robot_system._placeholder_bytes()
+        return seq, frame_bytes
+    return next_frame
+
 @app.route('/video_feed')
 def video_feed():
-    """视频流"""
-    logger.info("Video feed requested")
+    """
+    视频流
+    ?stream=<name> 查看附加摄像头
+    ?tier=<high|medium|low> 或 ?width=&quality=&fps= 选择画质档位（映射到不超过请求值的最高档位）
+    ?overlay=<server|client> 本客户端的叠加模式（默认为 STREAM_CONFIG["overlay"]），client 时发送未叠加的画面
+    """
+    stream = request.args.get("stream") or "head"
+    if stream == robot_system.capture.primary:
+        stream = "head"
+    if stream != "head" and stream not in robot_system.capture.stream_names():
+        return jsonify({"success": False, "message": f"未知视频流: {stream}"}), 404
 
-    def generate():
-        frame_count = 0
-        last_log_time = time.time()
+    overlay = request.args.get("overlay")
+    if overlay not in ("server", "client"):
+        overlay = robot_system.overlay_mode
+    broadcaster = robot_system.head_broadcaster(overlay)
+    requested_fps = request.args.get("fps", type=float)
+    tier = request.args.get("tier")
+    if tier not in broadcaster.tiers:
+        tier = broadcaster.select_tier(width=request.args.get("width", type=int),
+                                       quality=request.args.get("quality", type=int),
+                                       fps=requested_fps)
 
-        while True:
-            try:
-                frame_bytes = robot_system.get_frame_bytes()
-                if frame_bytes:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n'
-                           b'Cache-Control: no-cache\r\n'
-                           b'\r\n' + frame_bytes + b'\r\n')
-                    frame_count += 1
-
-                    # 每5秒记录一次日志
-                    current_time = time.time()
-                    if current_time - last_log_time >= 5:
-                        fps = frame_count / (current_time - last_log_time)
-                        logger.info(f"Video stream: {fps:.1f} FPS, mode: {robot_system.status.get('mode', 'unknown')}")
-                        frame_count = 0
-                        last_log_time = current_time
-                else:
-                    logger.warning("No frame bytes available")
-
-                time.sleep(0.033)  # ~30 FPS
+    max_fps = min(config.STREAM_CONFIG.get("max_fps", 30), broadcaster.tiers[tier].fps)
+    if requested_fps:
+        max_fps = min(max_fps, requested_fps)
+    client = robot_system.stream_clients.acquire(stream, request.remote_addr or "", max_fps,
+                                                 tier if stream == "head" else "",
+                                                 overlay if stream == "head" else "")
+    if client is None:
+        logger.warning("视频流客户端过多，拒绝 %s", request.remote_addr)
+        return jsonify({"success": False, "message": "视频流客户端数量已达上限"}), 503
+    logger.info("Video feed requested: %s, client %s, tier %s, overlay %s, max %s FPS",
+                stream, client.client_id, tier, overlay, max_fps)
 
-            except Exception as e:
-                logger.error(f"Video stream error: {e}")
+    if stream != "head":
+        def next_frame(last_seq):
+            if not robot_system.is_running:
+                return None
+            return robot_system.get_stream_bytes(stream, last_seq)
+        return _mjpeg_response(client, next_frame)
+
+    # 只为有订阅者的档位编码
+    broadcaster.subscribe(tier)
+    return _mjpeg_response(client, _next_head_frame(broadcaster, tier))
+
+@app.route('/api/streams')
+def api_streams():
+    """视频流客户端统计"""
+    stats = robot_system.stream_clients.get_stats()
+    stats["tiers"] = robot_system.broadcaster.get_stats()
+    stats["raw_tiers"] = robot_system.raw_broadcaster.get_stats()
+    return jsonify(stats)
+
+@app.route('/api/overlay')
+def api_overlay():
+    """
+    叠加元数据流 (Server-Sent Events)
+    每条消息为一帧的元数据，seq 与 /video_feed 各帧的 X-Frame-Seq 对应；落后时只补发最近的几帧
+    """
+    def generate():
+        last_seq = robot_system.metadata.seq - 1
+        while True:
+            metas = robot_system.metadata.wait(last_seq, timeout=5.0)
+            if metas is None:
                 break
+            if not metas:
+                yield ": keepalive\n\n"
+                continue
+            for meta in metas[-3:]:
+                yield f"data: {json.dumps(meta, ensure_ascii=False, separators=(',', ':'))}\n\n"
+            last_seq = metas[-1]["seq"]
 
-    return Response(generate(),
-                   mimetype='multipart/x-mixed-replace; boundary=frame',
-                   headers={
-                       'Cache-Control': 'no-cache, no-store, must-revalidate',
-                       'Pragma': 'no-cache',
-                       'Expires': '0'
-                   })
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/status')
 def api_status():
     """获取系统状态"""
     status = robot_system.status.copy()
-    status["camera_connected"] = robot_system.camera.is_opened() if robot_system.camera else False
-    status["detector_initialized"] = robot_system.detector.initialized if robot_system.detector else False
-    status["servo_connected"] = robot_system.servo.is_connected() if robot_system.servo else False
-    status["simulation_mode"] = robot_system.simulation_mode
-    status["system_running"] = robot_system.is_running
+    status.update(robot_system.status_fields())
+    if robot_system.camera and status["camera_connected"]:
+        status["camera_stats"] = robot_system.camera.get_stats()
+    if robot_system.stages:
+        status["pipeline"] = robot_system.get_pipeline_stats()
+    if len(status["streams"]) > 1:
+        status["stream_stats"] = robot_system.capture.get_stats()
     return jsonify(status)
 
+@app.route('/api/metrics')
+def api_metrics():
+    """各环节耗时与帧龄直方图，及流水线丢帧与视频流客户端数（Prometheus 文本格式）"""
+    lines = [METRICS.render().rstrip("\n")]
+    if robot_system.stages:
+        lines.append("# HELP robot_pipeline_dropped_total Items dropped by a pipeline stage inbox")
+        lines.append("# TYPE robot_pipeline_dropped_total counter")
+        for name, stats in robot_system.get_pipeline_stats().items():
+            lines.append(f'robot_pipeline_dropped_total{{stage="{name}"}} {stats["dropped"]}')
+    lines.append("# HELP robot_stream_clients Connected video stream clients")
+    lines.append("# TYPE robot_stream_clients gauge")
+    lines.append(f"robot_stream_clients {len(robot_system.stream_clients)}")
+    return Response("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
+
+def _profile_thread_group(name: str) -> str:
+    """Werkzeug 为每个请求创建的线程统一归为 flask"""
+    group = default_thread_group(name)
+    return "flask" if group == "process_request_thread" else group
+
+
+profiler = SamplingProfiler(config.PROFILE_CONFIG.get("interval", 0.005), group=_profile_thread_group)
+
+
+@app.route('/api/profile')
+def api_profile():
+    """
+    采样分析：?seconds=N 采样 N 秒后返回
+    ?threads=stage-,flask 只采样这些线程组（前缀），?idle=1 计入等待中的采样，
+    ?format=collapsed 只返回折叠调用栈文本（flamegraph.pl / speedscope 可直接读取）
+    """
+    token = config.PROFILE_CONFIG.get("token")
+    if not token:
+        return jsonify({"success": False, "message": "采样分析未启用（未设置 PROFILE_TOKEN）"}), 403
+    provided = request.headers.get("X-Profile-Token", "")
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        provided = auth[len("Bearer "):]
+    if not hmac.compare_digest(provided.encode(), token.encode()):
+        return jsonify({"success": False, "message": "认证失败"}), 401
+
+    seconds = request.args.get("seconds", 5.0, type=float)
+    seconds = min(max(seconds, 0.1), config.PROFILE_CONFIG.get("max_seconds", 60))
+    threads = [t for t in request.args.get("threads", "").split(",") if t]
+    logger.info("采样分析开始: %ss, 线程 %s", seconds, threads or '全部')
+    result = profiler.profile(seconds, threads, include_idle=request.args.get("idle") == "1")
+    if result is None:
+        return jsonify({"success": False, "message": "已有采样分析在进行"}), 409
+    logger.info("采样分析完成: %d 个采样", result['samples'])
+
+    if request.args.get("format") == "collapsed":
+        return Response(result["collapsed"] + "\n", mimetype='text/plain')
+    result["success"] = True
+    return jsonify(result)
+
+@app.route('/api/events')
+def api_events():
+    """
+    状态推送 (Server-Sent Events)
+    连接后先发送完整状态，之后只发送变化的字段：跟踪模式或目标变化立即推送，
+    其余字段按 EVENTS_CONFIG["refresh_interval"] 检查，无事件时定期发送心跳
+    """
+    refresh_interval = config.EVENTS_CONFIG.get("refresh_interval", 1.0)
+    heartbeat = config.EVENTS_CONFIG.get("heartbeat", 10.0)
+    events = robot_system.events
+
+    def encode(fields: dict) -> str:
+        return f"data: {json.dumps(fields, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+    def generate():
+        robot_system.refresh_status_events()
+        version, snapshot = events.snapshot()
+        yield "retry: 2000\n" + encode(snapshot)
+        last_refresh = last_send = time.monotonic()
+        while True:
+            result = events.wait(version, timeout=refresh_interval)
+            if result is None:
+                break
+            version, delta = result
+            now = time.monotonic()
+            if delta:
+                last_send = now
+                yield encode(delta)
+            elif now - last_send >= heartbeat:
+                last_send = now
+                yield ": heartbeat\n\n"
+            if now - last_refresh >= refresh_interval:
+                last_refresh = now
+                robot_system.refresh_status_events()
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/control/<action>', methods=['POST'])
 def api_control(action):
     """控制接口"""
-    logger.info(f"控制接口被调用: action={action}")
+    logger.info("控制接口被调用: action=%s", action)
     
     if action == 'center':
-        logger.info(f"回中心命令: servo={robot_system.servo}, initialized={robot_system.servo.initialized if robot_system.servo else False}")
+        logger.info("回中心命令: servo=%s, initialized=%s", robot_system.servo,
+                    getattr(robot_system.servo, "initialized", False))
         if robot_system.servo and robot_system.servo.initialized:
             result = robot_system.servo.center()
-            logger.info(f"回中心结果: {result}")
+            logger.info("回中心结果: %s", result)
             return jsonify({"success": result, "message": "舵机回到中心" if result else "舵机回中心失败"})
         else:
             logger.warning("舵机未初始化，无法回中心")
@@ -568,21 +1297,24 @@ def api_control(action):
         return jsonify({"success": True, "message": f"检测框已{status}"})
         
     elif action == 'action_nod':
-        logger.info(f"点头动作: servo={robot_system.servo}, initialized={robot_system.servo.initialized if robot_system.servo else False}")
+        logger.info("点头动作: servo=%s, initialized=%s", robot_system.servo,
+                    getattr(robot_system.servo, "initialized", False))
         if robot_system.servo and robot_system.servo.initialized:
             result = robot_system.servo.execute_action("head_nod", config.ACTION_CONFIG)
             return jsonify({"success": result, "message": "执行点头动作" if result else "动作执行失败"})
         return jsonify({"success": False, "message": "舵机未连接"})
         
     elif action == 'action_shake':
-        logger.info(f"摇头动作: servo={robot_system.servo}, initialized={robot_system.servo.initialized if robot_system.servo else False}")
+        logger.info("摇头动作: servo=%s, initialized=%s", robot_system.servo,
+                    getattr(robot_system.servo, "initialized", False))
         if robot_system.servo and robot_system.servo.initialized:
             result = robot_system.servo.execute_action("head_shake", config.ACTION_CONFIG)
             return jsonify({"success": result, "message": "执行摇头动作" if result else "动作执行失败"})
         return jsonify({"success": False, "message": "舵机未连接"})
         
     elif action == 'action_roll':
-        logger.info(f"转圈动作: servo={robot_system.servo}, initialized={robot_system.servo.initialized if robot_system.servo else False}")
+        logger.info("转圈动作: servo=%s, initialized=%s", robot_system.servo,
+                    getattr(robot_system.servo, "initialized", False))
         if robot_system.servo and robot_system.servo.initialized:
             result = robot_system.servo.execute_action("head_roll", config.ACTION_CONFIG)
             return jsonify({"success": result, "message": "执行转圈动作" if result else "动作执行失败"})
@@ -594,13 +1326,11 @@ def api_control(action):
 
 def main():
     """主函数"""
-    # 初始化系统
-    if not robot_system.initialize():
-        logger.error("系统初始化失败，退出")
-        return
+    # 后台并行初始化组件，Web 服务立即启动，初始化进度见 /api/status 的 startup
+    robot_system.start_initialization()
         
-    # 启动处理线程
-    process_thread = threading.Thread(target=robot_system.process_frame, daemon=True)
+    # 启动处理线程（摄像头与检测器就绪后开始处理）
+    process_thread = threading.Thread(target=robot_system.process_frame, name="process-frame", daemon=True)
     process_thread.start()
     
     try:
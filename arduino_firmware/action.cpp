@@ -0,0 +1,123 @@
+#include "action.h"
+#include "head.h"
+
+// --- Sequence Storage ---
+struct ActionStep {
+  int8_t x;
+  int8_t y;
+  uint16_t ms;
+};
+
+struct ActionSequence {
+  char name[ACTION_NAME_LEN];
+  uint8_t count;
+  ActionStep steps[ACTION_MAX_STEPS];
+};
+
+ActionSequence sequences[ACTION_MAX_SEQUENCES];
+uint8_t sequence_count = 0;
+
+// --- Playback State ---
+int playing_index = -1;
+uint8_t step_index = 0;
+unsigned long step_start_time = 0;
+unsigned long last_tick_time = 0;
+float from_x = 0;
+float from_y = 0;
+
+int find_sequence(String name) {
+  for (uint8_t i = 0; i < sequence_count; i++) {
+    if (name.equals(sequences[i].name)) return i;
+  }
+  return -1;
+}
+
+bool action_define(String name, String steps) {
+  name.trim();
+  steps.trim();
+  if (name.length() == 0 || name.length() >= ACTION_NAME_LEN) return false;
+
+  int index = find_sequence(name);
+  if (index < 0) {
+    if (sequence_count >= ACTION_MAX_SEQUENCES) return false;
+    index = sequence_count++;
+  }
+  // Never overwrite a sequence while it is playing
+  if (index == playing_index) action_stop();
+
+  ActionSequence &seq = sequences[index];
+  name.toCharArray(seq.name, ACTION_NAME_LEN);
+  seq.count = 0;
+
+  // Parse "x,y,ms" tokens separated by spaces
+  int start = 0;
+  while (start < (int)steps.length() && seq.count < ACTION_MAX_STEPS) {
+    int end = steps.indexOf(' ', start);
+    if (end < 0) end = steps.length();
+    String token = steps.substring(start, end);
+    int c1 = token.indexOf(',');
+    int c2 = token.indexOf(',', c1 + 1);
+    if (c1 > 0 && c2 > c1) {
+      ActionStep &step = seq.steps[seq.count++];
+      step.x = constrain(token.substring(0, c1).toInt(), -X_OFFSET, X_OFFSET);
+      step.y = constrain(token.substring(c1 + 1, c2).toInt(), -Y_OFFSET, Y_OFFSET);
+      step.ms = max(ACTION_TICK_MS, (int)token.substring(c2 + 1).toInt());
+    }
+    start = end + 1;
+  }
+  return seq.count > 0;
+}
+
+bool action_play(String name) {
+  name.trim();
+  int index = find_sequence(name);
+  if (index < 0) return false;
+
+  playing_index = index;
+  step_index = 0;
+  step_start_time = millis();
+  last_tick_time = 0;
+  from_x = head_get_x();
+  from_y = head_get_y();
+  return true;
+}
+
+void action_stop() {
+  playing_index = -1;
+}
+
+bool action_is_playing() {
+  return playing_index >= 0;
+}
+
+void action_update() {
+  if (playing_index < 0) return;
+
+  unsigned long now = millis();
+  if (now - last_tick_time < ACTION_TICK_MS) return;
+  last_tick_time = now;
+
+  ActionSequence &seq = sequences[playing_index];
+  ActionStep &step = seq.steps[step_index];
+  float target_x = X_CENTER + step.x;
+  float target_y = Y_CENTER + step.y;
+
+  // Linear interpolation across the step duration (timer based, not loop based)
+  unsigned long elapsed = now - step_start_time;
+  float t = min(1.0f, (float)elapsed / step.ms);
+  head_test((int)(from_x + (target_x - from_x) * t),
+            (int)(from_y + (target_y - from_y) * t));
+
+  if (elapsed >= step.ms) {
+    from_x = target_x;
+    from_y = target_y;
+    step_start_time += step.ms;  // Keep cumulative timing drift-free
+    step_index++;
+    if (step_index >= seq.count) {
+      playing_index = -1;
+      head_center();
+      Serial.print(F("ActionDone:"));
+      Serial.println(seq.name);
+    }
+  }
+}
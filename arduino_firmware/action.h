@@ -0,0 +1,24 @@
+#ifndef ACTION_H
+#define ACTION_H
+
+#include "common.h"
+
+// --- Action Settings ---
+#define ACTION_MAX_SEQUENCES 8
+#define ACTION_MAX_STEPS 12
+#define ACTION_NAME_LEN 16
+#define ACTION_TICK_MS 10   // Interpolation tick (ms)
+
+// Define / replace a named sequence
+// steps: "x,y,ms x,y,ms ..." (offsets relative to center)
+bool action_define(String name, String steps);
+
+// Start / stop playback
+bool action_play(String name);
+void action_stop();
+bool action_is_playing();
+
+// Core Update Loop (Must call in loop)
+void action_update();
+
+#endif
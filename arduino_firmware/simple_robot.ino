@@ -6,6 +6,7 @@
 #include "common.h"
 #include "emoji.h"
 #include "head.h"
+#include "action.h"
 
 // --- Global Instances ---
 Adafruit_SSD1306 display(SCREEN_WIDTH, SCREEN_HEIGHT, &Wire, OLED_RESET);
@@ -59,14 +60,62 @@ void setup() {
   head_test(90, 70); // Syncs current_x/y variables
   
   Serial.println(F("Robot Ready"));
-  inputString.reserve(50);
+  inputString.reserve(128);
   last_cmd_time = millis();
 }
 
+// Host JSON envelope: {"factory": "head_move 0 0 3"}
+void parseFactory(String cmd) {
+  int colon = cmd.indexOf(':');
+  int start = cmd.indexOf('"', colon + 1);
+  int end = cmd.lastIndexOf('"');
+  if (colon < 0 || start < 0 || end <= start) return;
+
+  String body = cmd.substring(start + 1, end);
+  body.trim();
+  int space = body.indexOf(' ');
+  String op = space > 0 ? body.substring(0, space) : body;
+  String args = space > 0 ? body.substring(space + 1) : "";
+  args.trim();
+
+  if (op == "head_move") {
+    // head_move <offset_x> <offset_y> <delay_ms>
+    int s1 = args.indexOf(' ');
+    int s2 = args.indexOf(' ', s1 + 1);
+    if (s1 > 0) {
+      int ox = args.substring(0, s1).toInt();
+      int oy = args.substring(s1 + 1, s2 > 0 ? s2 : args.length()).toInt();
+      if (s2 > 0) head_set_speed(args.substring(s2 + 1).toInt());
+      action_stop(); // Live moves always win over playback
+      head_set_target(X_CENTER + ox, Y_CENTER + oy);
+    }
+  }
+  else if (op == "action_define") {
+    // action_define <name> x,y,ms x,y,ms ...
+    int s1 = args.indexOf(' ');
+    String name = s1 > 0 ? args.substring(0, s1) : args;
+    bool ok = s1 > 0 && action_define(name, args.substring(s1 + 1));
+    Serial.print(ok ? F("ActionDefined:") : F("ActionError:"));
+    Serial.println(name);
+  }
+  else if (op == "action_play") {
+    if (!action_play(args)) {
+      Serial.print(F("ActionError:"));
+      Serial.println(args);
+    }
+  }
+  else if (op == "action_stop") {
+    action_stop();
+  }
+}
+
 void parseCommand(String cmd) {
   cmd.trim();
   
-  if (cmd.startsWith("Move:")) {
+  if (cmd.startsWith("{")) {
+    parseFactory(cmd);
+  }
+  else if (cmd.startsWith("Move:")) {
     // Move:10,-20 (Relative or Absolute? Let's assume absolute target for simplicity in new logic, 
     // OR relative if that's what the python app sends. The previous code did relative constrain.
     // Let's stick to the previous behavior: Python sent offsets? 
@@ -193,6 +242,7 @@ void loop() {
   }
   
   // 4. Hardware Update (Animation & Servo)
+  action_update();
   head_update();
   emoji_update();
 }
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端延迟基准测试（glass-to-servo）
+用合成帧源驱动完整处理流水线（capture -> inference -> control -> 运动调度 -> 串口），
+测量目标阶跃出现在画面上到舵机命令离开串口的时间
+
+- 合成帧源每帧编码帧序号，目标按固定周期左右跳变
+- 舵机控制器连接到伪串口（pty），另一端模拟 Arduino 并记录每条 head_move 命令的到达时间
+- 检测器可选 synthetic（无模型，直接从画面解出目标）/ cpu / npu；
+  cpu / npu 照常对每帧推理（计入耗时），但检测结果替换为画面中解出的目标，保证阶跃可被跟踪
+
+用法:
+    python benchmarks/glass_to_servo.py
+    python benchmarks/glass_to_servo.py --backends synthetic,cpu --detect-intervals 0,0.1 --input-sizes 320,640
+    python benchmarks/glass_to_servo.py --duration 20 --json results.json
+
+说明: 帧的采集时间即合成帧的生成时间，不包含真实摄像头的曝光与 USB 传输（通常为 1~2 个帧周期）；
+伪串口没有波特率限制，115200 波特率下一条命令另需约 3 ms
+"""
+
+import argparse
+import json
+import logging
+import os
+import pty
+import sys
+import threading
+import time
+import tty
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from app import RobotVisionSystem  # noqa: E402
+from core.detector import YOLODetector  # noqa: E402
+from core.detector_cpu import YOLODetectorCPU  # noqa: E402
+from core.servo_controller import ServoController  # noqa: E402
+from core.synthetic_source import SyntheticSource  # noqa: E402
+from core.tracker import ObjectTracker  # noqa: E402
+
+logger = logging.getLogger("glass_to_servo")
+
+
+class FakeArduino:
+    """
+    伪串口端点：pty 的主端模拟 Arduino
+    舵机控制器打开从端，这里记录收到的每条 head_move 命令及其到达时间
+    """
+
+    def __init__(self):
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)  # 关闭回显，命令不会回流给控制器
+        self.port = os.ttyname(self._slave)
+        self.commands: List[tuple] = []  # (到达时间, offset_x, offset_y)
+        self._running = True
+        self._thread = threading.Thread(target=self._read_loop, name="fake-arduino", daemon=True)
+        self._thread.start()
+
+    def _read_loop(self):
+        pending = b""
+        while self._running:
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                break
+            now = time.monotonic()
+            pending += data
+            while b"\n" in pending:
+                line, pending = pending.split(b"\n", 1)
+                try:
+                    parts = json.loads(line).get("factory", "").split()
+                except ValueError:
+                    continue
+                if len(parts) >= 3 and parts[0] == "head_move":
+                    self.commands.append((now, int(parts[1]), int(parts[2])))
+
+    def close(self):
+        self._running = False
+        for fd in (self._slave, self._master):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class MarkerDetector:
+    """
+    基准测试用检测器
+    有内部检测器时照常推理（计入耗时）；结果总是替换为从画面解出的目标，
+    同时记录每个帧序号第一次完成检测的时间
+    """
+
+    def __init__(self, inner=None, input_size: int = 640, mirror: bool = False):
+        self.inner = inner
+        self.input_size = input_size
+        self.mirror = mirror
+        self.initialized = True
+        self.detected_at: Dict[int, float] = {}
+
+    def detect(self, frame: np.ndarray) -> list:
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames: List[np.ndarray]) -> List[list]:
+        if self.inner is not None:
+            self.inner.detect_batch(frames)
+        else:
+            # 无模型：只模拟预处理的缩放开销
+            for frame in frames:
+                cv2.resize(frame, (self.input_size, self.input_size))
+
+        now = time.monotonic()
+        results = []
+        for frame in frames:
+            self.detected_at.setdefault(SyntheticSource.decode_frame_id(frame), now)
+            box = SyntheticSource.locate_target(frame)
+            if box is None:
+                results.append([])
+                continue
+            x1, y1, x2, y2 = box
+            if self.mirror:
+                x1, x2 = frame.shape[1] - x2, frame.shape[1] - x1
+            results.append([{
+                "class": 0,
+                "label": "person",
+                "category": "face",
+                "confidence": 0.9,
+                "bbox": (x1, y1, x2, y2),
+                "center": ((x1 + x2) // 2, (y1 + y2) // 2),
+            }])
+        return results
+
+    def release(self):
+        if self.inner is not None:
+            self.inner.release()
+
+
+def create_backend(backend: str, input_size: int):
+    """创建内部检测器，不可用时返回 None 并说明原因"""
+    size = (input_size, input_size)
+    common = dict(model_path=config.MODEL_PATH, input_size=size,
+                  conf_threshold=config.YOLO_CONFIG["conf_threshold"],
+                  iou_threshold=config.YOLO_CONFIG["iou_threshold"],
+                  min_box_size=config.YOLO_CONFIG.get("min_box_size", 50))
+    if backend == "synthetic":
+        return None, None
+    if backend == "npu":
+        detector = YOLODetector(**common)
+        if not detector.initialized:
+            return None, "NPU 检测器初始化失败（RKNNLite 或模型不可用）"
+        return detector, None
+    if backend == "cpu":
+        detector = YOLODetectorCPU(**common)
+        if not detector.initialized or getattr(detector, "simulation_mode", False):
+            return None, "CPU 检测器没有可用的 ONNX 模型"
+        return detector, None
+    return None, f"未知后端: {backend}"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    return float(np.percentile(values, q)) if values else None
+
+
+def measure_steps(source: SyntheticSource, detector: MarkerDetector, commands: List[tuple]) -> dict:
+    """
+    阶跃响应：每次阶跃后第一条朝新方向移动的舵机命令
+    - glass_to_servo: 命令到达串口 - 阶跃帧采集时间
+    - glass_to_detect: 阶跃帧（或其后第一帧）完成检测 - 阶跃帧采集时间
+    """
+    steps = source.steps[1:]  # 第一项是初始位置
+    servo_latency, detect_latency = [], []
+    missed = 0
+
+    for i, step in enumerate(steps):
+        next_time = steps[i + 1].timestamp if i + 1 < len(steps) else float("inf")
+        before = [c for c in commands if c[0] <= step.timestamp]
+        last_x = before[-1][1] if before else 0
+        direction = 1 if step.x > source.width // 2 else -1
+
+        response = next((c for c in commands
+                         if step.timestamp < c[0] < next_time and (c[1] - last_x) * direction > 0), None)
+        if response is None:
+            missed += 1
+        else:
+            servo_latency.append(response[0] - step.timestamp)
+
+        detected = [t for seq, t in detector.detected_at.items()
+                    if seq >= step.seq and t < next_time]
+        if detected:
+            detect_latency.append(min(detected) - step.timestamp)
+
+    return {
+        "steps": len(steps),
+        "missed": missed,
+        "glass_to_servo_ms": {f"p{q}": _ms(percentile(servo_latency, q)) for q in (50, 95, 99)},
+        "glass_to_detect_ms": {f"p{q}": _ms(percentile(detect_latency, q)) for q in (50, 95, 99)},
+    }
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000.0, 1) if value is not None else None
+
+
+def run_config(backend: str, detect_interval: float, input_size: int, args) -> dict:
+    """运行一组配置并返回结果"""
+    label = {"backend": backend, "detect_interval": detect_interval, "input_size": input_size}
+    inner, reason = create_backend(backend, input_size)
+    if reason:
+        return dict(label, skipped=reason)
+
+    config.PIPELINE_CONFIG["inference_min_interval"] = detect_interval
+    arduino = FakeArduino()
+    source = SyntheticSource(args.width, args.height, args.fps, args.step_period)
+
+    system = RobotVisionSystem()
+    system.mirror = False
+    system.overlay_mode = "client"  # 不绘制叠加层，只测控制链路
+    system.camera = source
+    system.capture.add_source("head", source, priority=0)
+    system.capture.open(["head"])
+    system.detector = MarkerDetector(inner, input_size)
+    system.servo = ServoController(
+        port=arduino.port,
+        baudrate=config.SERVO_CONFIG["baudrate"],
+        control_rate=config.SERVO_CONFIG.get("control_rate", 50),
+        max_velocity=(config.SERVO_CONFIG["max_velocity_x"], config.SERVO_CONFIG["max_velocity_y"]),
+        max_acceleration=(config.SERVO_CONFIG["max_acceleration_x"], config.SERVO_CONFIG["max_acceleration_y"]),
+        trajectory_profile=config.SERVO_CONFIG.get("trajectory_profile", "min_jerk"),
+        ready_timeout=0.3,  # 伪串口不输出就绪横幅
+    )
+    if not system.servo.connect():
+        arduino.close()
+        source.release()
+        return dict(label, skipped="伪串口连接失败")
+    system.tracker = ObjectTracker(servo_controller=system.servo, action_config=config.ACTION_CONFIG)
+    system.is_running = True
+
+    thread = threading.Thread(target=system.process_frame, name="benchmark-pipeline", daemon=True)
+    start = time.monotonic()
+    thread.start()
+    time.sleep(args.duration)
+    system.is_running = False
+    thread.join(timeout=2.0)
+    elapsed = time.monotonic() - start
+
+    stats = system.get_pipeline_stats()
+    result = dict(label)
+    result.update(measure_steps(source, system.detector, list(arduino.commands)))
+    result["pipeline_fps"] = round(stats["control"]["count"] / elapsed, 1)
+    result["inference_fps"] = round(system._inference_count / elapsed, 1)
+    result["servo_commands"] = len(arduino.commands)
+
+    system.broadcaster.close()
+    source.release()
+    system.detector.release()
+    system.servo.close()
+    arduino.close()
+    return result
+
+
+def _cell(value: Optional[float], width: int = 8) -> str:
+    return f"{value:>{width}.1f}" if value is not None else f"{'-':>{width}}"
+
+
+def format_table(results: List[dict]) -> str:
+    header = f"{'backend':<10}{'interval':>9}{'input':>7}{'steps':>7}{'miss':>6}" \
+             f"{'p50':>8}{'p95':>8}{'p99':>8}{'det p50':>9}{'fps':>7}{'inf/s':>7}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        prefix = f"{r['backend']:<10}{r['detect_interval']:>9}{r['input_size']:>7}"
+        if "skipped" in r:
+            lines.append(f"{prefix}  跳过: {r['skipped']}")
+            continue
+        servo = r["glass_to_servo_ms"]
+        lines.append(f"{prefix}{r['steps']:>7}{r['missed']:>6}"
+                     f"{_cell(servo['p50'])}{_cell(servo['p95'])}{_cell(servo['p99'])}"
+                     f"{_cell(r['glass_to_detect_ms']['p50'], 9)}{r['pipeline_fps']:>7}{r['inference_fps']:>7}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="glass-to-servo 端到端延迟基准测试")
+    parser.add_argument("--backends", default="synthetic", help="检测后端，逗号分隔: synthetic,cpu,npu")
+    parser.add_argument("--detect-intervals", default="0", help="最短检测间隔（秒），逗号分隔")
+    parser.add_argument("--input-sizes", default=str(config.YOLO_CONFIG["input_size"][0]),
+                        help="模型输入尺寸，逗号分隔")
+    parser.add_argument("--duration", type=float, default=10.0, help="每组配置运行时长（秒）")
+    parser.add_argument("--fps", type=float, default=30.0, help="合成帧源帧率")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--step-period", type=float, default=1.0, help="目标阶跃周期（秒）")
+    parser.add_argument("--json", help="结果另存为 JSON 文件")
+    parser.add_argument("--verbose", action="store_true", help="输出系统日志")
+    args = parser.parse_args()
+
+    # 日志已由 app 配置（后台线程输出），这里只调整级别
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.ERROR)
+    logger.setLevel(logging.INFO)
+
+    results = []
+    for backend in args.backends.split(","):
+        for interval in (float(v) for v in args.detect_intervals.split(",")):
+            for size in (int(v) for v in args.input_sizes.split(",")):
+                logger.info(f"运行: backend={backend} detect_interval={interval} input_size={size}")
+                results.append(run_config(backend.strip(), interval, size, args))
+
+    print(format_table(results))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频流负载测试
+逐级增加并发的 /video_feed 与 /api/status 客户端，每秒采样：
+- 每个视频流客户端的帧率、字节率、跳帧数（按 X-Frame-Seq 计算）
+- /api/status 响应延迟
+- 服务进程 CPU 占用（读取 /proc/<pid>/stat）
+- 视觉处理循环自身的帧率（/api/status 中 control 阶段处理计数的增量）
+每一级结束后汇总，最后输出报告，用于发现 app.py 视频流改动带来的性能退化
+
+默认自行启动服务（VIDEO_SOURCE=synthetic，也可指定视频文件），也可以用 --url 测试已在运行的服务
+
+用法:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --clients 0,1,2,4,8 --stage-duration 15 --tier low
+    python benchmarks/load_test.py --source /path/to/clip.mp4 --json load.json
+    python benchmarks/load_test.py --url http://192.168.1.20:8888 --pid 1234
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import config  # noqa: E402
+
+logger = logging.getLogger("load_test")
+
+
+class StreamClient(threading.Thread):
+    """MJPEG 客户端：按 Content-Length 切分每一帧，只计数不解码"""
+
+    def __init__(self, base_url: str, index: int, query: str = ""):
+        super().__init__(name=f"stream-client-{index}", daemon=True)
+        self.index = index
+        self._url = urlsplit(base_url)
+        self._path = "/video_feed" + (f"?{query}" if query else "")
+        self._running = True
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self.frames = 0
+        self.bytes = 0
+        self.skipped = 0      # 服务端帧序号的间隔（未送达本客户端的帧）
+        self.rejected = False  # 服务端客户端数已达上限
+        self.error: Optional[str] = None
+
+    def run(self):
+        try:
+            self._conn = http.client.HTTPConnection(self._url.hostname, self._url.port or 80, timeout=10)
+            self._conn.request("GET", self._path)
+            resp = self._conn.getresponse()
+            if resp.status == 503:
+                self.rejected = True
+                return
+            if resp.status != 200:
+                self.error = f"HTTP {resp.status}"
+                return
+
+            last_seq = 0
+            while self._running:
+                length, seq, header_bytes = None, None, 0
+                while True:
+                    line = resp.readline()
+                    if not line:
+                        return
+                    header_bytes += len(line)
+                    if line in (b"\r\n", b"\n"):
+                        if length is not None:
+                            break
+                        continue  # 上一帧末尾的空行
+                    name, _, value = line.partition(b":")
+                    name = name.strip().lower()
+                    if name == b"content-length":
+                        length = int(value)
+                    elif name == b"x-frame-seq":
+                        seq = int(value)
+                body = resp.read(length)
+                if len(body) < length:
+                    return
+                self.frames += 1
+                self.bytes += header_bytes + length
+                if seq is not None:
+                    if last_seq and seq > last_seq + 1:
+                        self.skipped += seq - last_seq - 1
+                    last_seq = seq
+        except Exception as e:
+            if self._running:
+                self.error = str(e)
+        finally:
+            if self._conn:
+                self._conn.close()
+
+    def stop(self):
+        self._running = False
+        if self._conn and self._conn.sock:
+            try:
+                self._conn.sock.shutdown(2)
+            except OSError:
+                pass
+
+
+class StatusClient(threading.Thread):
+    """按固定间隔轮询 /api/status（与旧版网页相同的 500 ms），记录响应延迟"""
+
+    def __init__(self, base_url: str, index: int, interval: float):
+        super().__init__(name=f"status-client-{index}", daemon=True)
+        self._url = base_url.rstrip("/") + "/api/status"
+        self._interval = interval
+        self._running = True
+        self.latencies: List[float] = []
+        self.bytes = 0
+        self.errors = 0
+
+    def run(self):
+        next_time = time.monotonic()
+        while self._running:
+            start = time.monotonic()
+            try:
+                with urllib.request.urlopen(self._url, timeout=5) as resp:
+                    self.bytes += len(resp.read())
+                self.latencies.append(time.monotonic() - start)
+            except Exception:
+                self.errors += 1
+            next_time = max(next_time + self._interval, time.monotonic())
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+    def stop(self):
+        self._running = False
+
+
+def read_cpu_seconds(pid: int) -> Optional[float]:
+    """进程累计 CPU 时间（用户态 + 内核态，秒）"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def fetch_status(base_url: str) -> Optional[dict]:
+    try:
+        with urllib.request.urlopen(base_url.rstrip("/") + "/api/status", timeout=5) as resp:
+            return json.loads(resp.read())
+    except Exception:
+        return None
+
+
+def pipeline_count(status: Optional[dict], stage: str = "control") -> Optional[int]:
+    if not status or "pipeline" not in status:
+        return None
+    return status["pipeline"].get(stage, {}).get("count")
+
+
+class Sampler:
+    """每个采样周期记录一次全部指标"""
+
+    def __init__(self, base_url: str, pid: Optional[int]):
+        self.base_url = base_url
+        self.pid = pid
+        self._last_time = time.monotonic()
+        self._last_cpu = read_cpu_seconds(pid) if pid else None
+        status = fetch_status(base_url)
+        self._last_control = pipeline_count(status)
+        self._last_frames: Dict[int, tuple] = {}
+
+    def sample(self, stage: int, streams: List[StreamClient]) -> dict:
+        now = time.monotonic()
+        dt = max(now - self._last_time, 1e-6)
+        self._last_time = now
+
+        cpu = None
+        if self.pid:
+            cpu_seconds = read_cpu_seconds(self.pid)
+            if cpu_seconds is not None and self._last_cpu is not None:
+                cpu = (cpu_seconds - self._last_cpu) / dt * 100.0
+            self._last_cpu = cpu_seconds
+
+        status = fetch_status(self.base_url)
+        control = pipeline_count(status)
+        vision_fps = None
+        if control is not None and self._last_control is not None:
+            vision_fps = (control - self._last_control) / dt
+        self._last_control = control
+
+        clients = []
+        for client in streams:
+            frames, sent = self._last_frames.get(client.index, (0, 0))
+            self._last_frames[client.index] = (client.frames, client.bytes)
+            if client.rejected:
+                continue
+            clients.append({"client": client.index,
+                            "fps": (client.frames - frames) / dt,
+                            "bytes_per_s": (client.bytes - sent) / dt})
+
+        return {
+            "time": now,
+            "stage": stage,
+            "cpu_percent": cpu,
+            "vision_fps": vision_fps,
+            "frame_age_ms": (status or {}).get("pipeline", {}).get("encode", {}).get("frame_age_ms"),
+            "clients": clients,
+        }
+
+
+def _mean(values: list) -> Optional[float]:
+    values = [v for v in values if v is not None]
+    return float(np.mean(values)) if values else None
+
+
+def summarize(n_clients: int, samples: List[dict], streams: List[StreamClient],
+              status_clients: List[StatusClient]) -> dict:
+    """一级负载的汇总（丢弃第一个采样，避开客户端建立连接的过程）"""
+    steady = samples[1:] or samples
+    client_fps = [c["fps"] for s in steady for c in s["clients"]]
+    per_sample_bytes = [sum(c["bytes_per_s"] for c in s["clients"]) for s in steady]
+    latencies = [v for c in status_clients for v in c.latencies]
+    skipped = sum(c.skipped for c in streams)
+    delivered = sum(c.frames for c in streams)
+    return {
+        "clients": n_clients,
+        "rejected": sum(1 for c in streams if c.rejected),
+        "errors": [c.error for c in streams if c.error] + [f"status x{c.errors}" for c in status_clients if c.errors],
+        "client_fps_mean": _mean(client_fps),
+        "client_fps_min": min(client_fps) if client_fps else None,
+        "total_mbytes_per_s": _mean(per_sample_bytes) / 1e6 if per_sample_bytes else None,
+        "skip_ratio": skipped / (skipped + delivered) if skipped + delivered else None,
+        "cpu_percent": _mean([s["cpu_percent"] for s in steady]),
+        "vision_fps": _mean([s["vision_fps"] for s in steady]),
+        "frame_age_ms": _mean([s["frame_age_ms"] for s in steady]),
+        "status_p50_ms": float(np.percentile(latencies, 50)) * 1000 if latencies else None,
+        "status_p95_ms": float(np.percentile(latencies, 95)) * 1000 if latencies else None,
+    }
+
+
+def start_server(source: str, port: int, log_path: str) -> subprocess.Popen:
+    """以指定帧源启动服务，等待 /api/status 中出现流水线统计"""
+    env = dict(os.environ, VIDEO_SOURCE=source, FLASK_PORT=str(port))
+    log = open(log_path, "w")
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"服务启动失败，日志见 {log_path}")
+        if pipeline_count(fetch_status(base_url)) is not None:
+            return proc
+        time.sleep(0.5)
+    stop_server(proc)
+    raise RuntimeError(f"等待服务就绪超时，日志见 {log_path}")
+
+
+def stop_server(proc: subprocess.Popen):
+    """发送 SIGINT 让服务正常关闭，超时后强制结束"""
+    proc.send_signal(signal.SIGINT)
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def run_load(base_url: str, pid: Optional[int], args) -> dict:
+    levels = [int(v) for v in args.clients.split(",")]
+    query = f"tier={args.tier}" if args.tier else ""
+    streams: List[StreamClient] = []
+    status_clients: List[StatusClient] = []
+    sampler = Sampler(base_url, pid)
+    timeline, stages = [], []
+
+    try:
+        for n in levels:
+            # 逐级增加客户端（不断开已有连接）
+            while len(streams) < n:
+                client = StreamClient(base_url, len(streams), query)
+                client.start()
+                streams.append(client)
+            while len(status_clients) < n * args.status_per_client:
+                client = StatusClient(base_url, len(status_clients), args.status_interval)
+                client.start()
+                status_clients.append(client)
+            for client in status_clients:
+                client.latencies = []
+            logger.info(f"负载级别: {n} 个视频流客户端, {len(status_clients)} 个状态轮询客户端")
+
+            samples = []
+            end = time.monotonic() + args.stage_duration
+            sampler.sample(n, streams)  # 重置增量基准
+            while time.monotonic() < end:
+                time.sleep(args.sample_interval)
+                samples.append(sampler.sample(n, streams))
+            timeline.extend(samples)
+            stages.append(summarize(n, samples, streams, status_clients))
+    finally:
+        for client in streams + status_clients:
+            client.stop()
+        for client in streams + status_clients:
+            client.join(timeout=2)
+
+    return {"url": base_url, "tier": args.tier, "stages": stages, "timeline": timeline}
+
+
+def _cell(value: Optional[float], width: int, digits: int = 1) -> str:
+    return f"{value:>{width}.{digits}f}" if value is not None else f"{'-':>{width}}"
+
+
+def format_report(report: dict) -> str:
+    header = f"{'clients':>8}{'reject':>8}{'fps/cli':>9}{'min':>7}{'MB/s':>7}{'skip%':>7}" \
+             f"{'cpu%':>7}{'vision':>8}{'age ms':>8}{'st p50':>8}{'st p95':>8}"
+    lines = [header, "-" * len(header)]
+    baseline = None
+    for s in report["stages"]:
+        if baseline is None and s["vision_fps"]:
+            baseline = s["vision_fps"]
+        skip = s["skip_ratio"] * 100 if s["skip_ratio"] is not None else None
+        lines.append(f"{s['clients']:>8}{s['rejected']:>8}{_cell(s['client_fps_mean'], 9)}"
+                     f"{_cell(s['client_fps_min'], 7)}{_cell(s['total_mbytes_per_s'], 7, 2)}{_cell(skip, 7)}"
+                     f"{_cell(s['cpu_percent'], 7)}{_cell(s['vision_fps'], 8)}{_cell(s['frame_age_ms'], 8)}"
+                     f"{_cell(s['status_p50_ms'], 8)}{_cell(s['status_p95_ms'], 8)}")
+        for error in s["errors"]:
+            lines.append(f"{'':>8}  错误: {error}")
+
+    if baseline:
+        worst = min(report["stages"], key=lambda s: s["vision_fps"] or float("inf"))
+        drop = (1 - (worst["vision_fps"] or 0) / baseline) * 100
+        lines.append(f"\n视觉循环帧率: 基线 {baseline:.1f} FPS, 最低 {worst['vision_fps']:.1f} FPS "
+                     f"({worst['clients']} 个客户端, 下降 {drop:.1f}%)")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="视频流负载测试")
+    parser.add_argument("--clients", default="0,1,2,4,8", help="逐级的视频流客户端数，逗号分隔（0 为无观看者基线）")
+    parser.add_argument("--stage-duration", type=float, default=10.0, help="每一级持续时间（秒）")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="采样间隔（秒）")
+    parser.add_argument("--status-per-client", type=int, default=1, help="每个视频流客户端对应的状态轮询客户端数")
+    parser.add_argument("--status-interval", type=float, default=0.5, help="状态轮询间隔（秒）")
+    parser.add_argument("--tier", help="视频流画质档位（high/medium/low）")
+    parser.add_argument("--source", default="synthetic", help="自行启动服务时的帧源: synthetic 或视频文件/图片目录")
+    parser.add_argument("--port", type=int, default=config.FLASK_CONFIG["port"], help="自行启动服务时的端口（经 FLASK_PORT 传给服务）")
+    parser.add_argument("--url", help="测试已在运行的服务，如 http://192.168.1.20:8888")
+    parser.add_argument("--pid", type=int, help="配合 --url: 服务进程号（同一台机器上时用于采样 CPU）")
+    parser.add_argument("--server-log", default="load_test_server.log", help="自行启动服务时的日志文件")
+    parser.add_argument("--json", help="报告（含逐秒时间线）另存为 JSON 文件")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=config.LOG_CONFIG["format"])
+
+    proc = None
+    if args.url:
+        base_url, pid = args.url, args.pid
+    else:
+        logger.info(f"启动服务: VIDEO_SOURCE={args.source}, 端口 {args.port}")
+        proc = start_server(args.source, args.port, args.server_log)
+        base_url, pid = f"http://127.0.0.1:{args.port}", proc.pid
+
+    try:
+        report = run_load(base_url, pid, args)
+    finally:
+        if proc:
+            stop_server(proc)
+
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
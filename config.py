@@ -17,6 +17,38 @@ CAMERA_CONFIG = {
     "width": 640,
     "height": 480,
     "fps": 30,
+    "mirror": True,     # 水平镜像（检测框坐标变换 + 显示时翻转，不在采集路径翻转）
+    "buffer_slots": 8,  # 帧环形缓冲区槽位数（只读视图在 slots-1 帧内有效，推理/渲染用完后检查，被覆盖则丢弃）
+    "fourcc": "MJPG",   # 显式协商 MJPEG 格式
+    "v4l2_buffers": 1,  # 驱动缓冲区数量（越少延迟越低）
+    "drop_stale": True, # grab 排空旧帧，只解码最新一帧
+    
+    # 设备发现：缓存上次成功的设备，其余候选并行探测
+    "cache_file": os.path.join(BASE_DIR, ".camera_cache.json"),
+    "probe_timeout": 3.0,
+    "fallback_ids": [33, 0, 1, 2, 34, 35, 36, 37],
+    
+    # 多摄像头：帧组内允许的最大采集时间差（秒）
+    "sync_tolerance": 0.05,
+}
+
+# ==================== 附加摄像头配置 ====================
+# 头部摄像头之外的摄像头（如广角场景摄像头），只打开指定设备，不参与自动发现
+# priority 数值越大优先级越低；detect_interval 为两次检测的最短间隔（秒），
+# 到期时与头部摄像头同批推理；网页通过 /video_feed?stream=<name> 查看
+EXTRA_CAMERAS = [
+    # {"name": "scene", "id": 0, "width": 640, "height": 480, "fps": 30,
+    #  "priority": 1, "detect_interval": 0.5},
+]
+
+# ==================== 离线帧源配置 ====================
+# 设置 path（或环境变量 VIDEO_SOURCE）后用视频文件 / 图片目录代替摄像头，
+# 便于在开发机上用录制素材重复测试和分析；设为 "synthetic" 时使用合成帧源（无需任何素材）
+FILE_SOURCE_CONFIG = {
+    "path": os.environ.get("VIDEO_SOURCE") or None,  # MP4/MJPEG 文件、图片目录或 "synthetic"
+    "realtime": True,  # True 按原始帧率播放，False 尽快播放（逐帧处理，不丢帧）
+    "loop": True,      # 播放结束后从头循环
+    "fps": None,       # 覆盖帧率（None 使用文件自身帧率，图片目录默认 30）
 }
 
 # ==================== YOLO 检测配置 ====================
@@ -25,6 +57,7 @@ YOLO_CONFIG = {
     "conf_threshold": 0.55,    # 置信度阈值 (调整到 0.55 平衡准确度和召回率)
     "iou_threshold": 0.4,      # NMS IOU 阈值 (调整到 0.4)
     "min_box_size": 60,        # 最小框尺寸 (调整到 60)
+    "batch_size": 1,           # RKNN 模型编译的批大小（>1 时多帧整批推理）
     "classes_file": os.path.join(BASE_DIR, "models", "coco.names"),
 }
 
@@ -53,11 +86,22 @@ CATEGORY_MAPPING = {
               "motorcycle", "airplane", "bus", "train", "truck", "boat"]
 }
 
+# ==================== 处理流水线配置 ====================
+# capture -> inference / control -> render -> encode，各阶段独立线程，
+# 阶段之间为最新优先的有界队列（满时丢弃旧帧）
+PIPELINE_CONFIG = {
+    "queue_size": 1,                # 阶段间队列长度
+    "inference_min_interval": 0.0,  # 两次推理的最短间隔（秒），0 表示以检测器最大速度运行
+}
+
 # ==================== 舵机配置 ====================
 SERVO_CONFIG = {
     "port": "/dev/ttyACM0",
     "baudrate": 115200,
     "timeout": 2,
+    "ready_timeout": 3.0,        # 等待固件 "Robot Ready" 横幅的最长时间（秒）
+    "reconnect_min_delay": 0.5,  # 断线重连退避（秒）
+    "reconnect_max_delay": 10.0,
     
     # X轴（水平）配置
     "x_min": 65,
@@ -75,6 +119,18 @@ SERVO_CONFIG = {
     "gain_y": 0.10,         # Y轴增益 480px -> ±50°
     "smooth_factor": 0.3,   # 平滑系数
     "move_delay": 3,        # 移动延迟 ms
+    "control_rate": 50,     # 运动调度控制频率 Hz
+    
+    # 轨迹参数（每轴最大角速度 °/s、最大角加速度 °/s²）
+    "max_velocity_x": 300,
+    "max_velocity_y": 240,
+    "max_acceleration_x": 3000,
+    "max_acceleration_y": 2400,
+    "trajectory_profile": "min_jerk",  # min_jerk / trapezoid
+    
+    # 固件动作播放（需烧录含 action.cpp 的 simple_robot.ino；final_robot.ino 与旧固件不支持）
+    # 开启后只有固件回复 ActionDefined 的动作由固件播放，其余仍由主机规划
+    "firmware_actions": False,
 }
 
 # ==================== 动作配置 ====================
@@ -105,15 +161,63 @@ ACTION_CONFIG = {
     ],
 }
 
+# ==================== 视频流配置 ====================
+STREAM_CONFIG = {
+    "jpeg_quality": 85,  # 未配置档位时的 JPEG 质量
+    "max_clients": 4,    # 同时观看的客户端上限（超出返回 503）
+    "max_fps": 30,       # 每个客户端的发送帧率上限（可用 ?fps= 进一步降低）
+    
+    # 画质档位（按画质从高到低）：/video_feed?tier= 或 ?width=&quality=&fps= 选择，
+    # 每个档位只在有客户端观看时缩放编码，每帧一次，同档位客户端共享
+    "default_tier": "high",
+    "tiers": {
+        "high": {"width": 0, "quality": 85, "fps": 30},     # width 0 表示原始分辨率
+        "medium": {"width": 480, "quality": 70, "fps": 20},
+        "low": {"width": 320, "quality": 50, "fps": 10},
+    },
+
+    # 默认叠加层绘制位置（客户端可用 /video_feed?overlay= 各自选择）：
+    # "server" - 服务端把检测框、状态、十字线画进视频帧
+    # "client" - 服务端只推送原始画面，检测框等元数据经 /api/overlay 按帧序号推送，由浏览器在 canvas 上绘制
+    "overlay": "server",
+}
+
+# ==================== 状态推送配置 ====================
+# /api/events (Server-Sent Events)：跟踪模式或目标变化时立即推送，
+# 帧率、消息与硬件状态按 refresh_interval 检查，只推送变化的字段
+EVENTS_CONFIG = {
+    "refresh_interval": 1.0,  # 慢变字段刷新间隔（秒）
+    "volatile_interval": 5.0, # 帧率与状态消息（含置信度、剩余时间，跟踪时每帧都在变）的定时推送间隔（秒）
+    "heartbeat": 10.0,        # 无事件时的心跳间隔（秒），用于保持连接与发现断开的客户端
+}
+
+# ==================== 性能指标配置 ====================
+# 各环节耗时与帧龄直方图，/api/metrics 以 Prometheus 文本格式导出
+METRICS_CONFIG = {
+    "enabled": True,  # False 时热路径上的记录直接返回
+}
+
+# ==================== 采样分析配置 ====================
+# /api/profile?seconds=N 对处理与 Web 线程做一次采样分析，返回折叠调用栈与函数统计；
+# 未分析时没有开销。需在请求头 X-Profile-Token（或 Authorization: Bearer）中提供 token，未设置 token 时接口关闭
+PROFILE_CONFIG = {
+    "token": os.environ.get("PROFILE_TOKEN") or None,
+    "interval": 0.005,    # 采样间隔（秒）
+    "max_seconds": 60,    # 单次分析最长时间（秒）
+}
+
 # ==================== Flask 配置 ====================
 FLASK_CONFIG = {
     "host": "0.0.0.0",
-    "port": 8888,  # 更改端口避免冲突
+    "port": int(os.environ.get("FLASK_PORT") or 8888),  # 更改端口避免冲突（可用环境变量 FLASK_PORT 覆盖）
     "debug": False,
 }
 
 # ==================== 日志配置 ====================
+# 日志经队列由后台线程输出，处理线程不等待控制台 I/O；热路径日志按调用位置限频
 LOG_CONFIG = {
     "level": "INFO",
     "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    "queue_size": 10000,         # 日志队列长度，满时丢弃新日志
+    "rate_limit_interval": 5.0,  # 热路径日志每个调用位置的最短输出间隔（秒）
 }
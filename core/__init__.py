@@ -4,8 +4,10 @@ RK3576 机器人视觉核心模块
 """
 
 from .camera import Camera
+from .file_source import FileSource
 from .detector import YOLODetector
 from .servo_controller import ServoController
+from .motion_scheduler import MotionScheduler, MotionPriority
 from .tracker import ObjectTracker
 
-__all__ = ['Camera', 'YOLODetector', 'ServoController', 'ObjectTracker']
+__all__ = ['Camera', 'FileSource', 'YOLODetector', 'ServoController', 'MotionScheduler', 'MotionPriority', 'ObjectTracker']
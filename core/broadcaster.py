@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+JPEG 广播模块
+每个新输出帧只编码一次（在发布线程中、任何帧锁之外），
+编码结果连同帧序号缓存，所有视频流客户端等待并共享同一份字节；
+每个客户端独立节拍，慢客户端只会跳帧，不影响其他客户端；
+多个画质档位各自只在有订阅者时缩放编码，同档位客户端共享；
+每帧的叠加元数据（检测框、模式、帧率）按同一帧序号单独发布，供浏览器端绘制
+"""
+
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .log import RateLimitedLogger
+from .metrics import stage_histogram
+
+logger = logging.getLogger(__name__)
+hot_log = RateLimitedLogger(logger)
+
+_ENCODE_TIME = stage_histogram("encode")
+
+
+class StreamTier:
+    """一个画质档位：输出宽度（按比例缩放）、JPEG 质量、帧率上限"""
+
+    def __init__(self, name: str, width: int = 0, quality: int = 85, fps: float = 30.0):
+        self.name = name
+        self.width = width      # 0 表示原始分辨率
+        self.quality = quality
+        self.fps = fps
+
+        # 运行时状态（由 FrameBroadcaster 的锁保护）
+        self.subscribers = 0
+        self.jpeg: Optional[bytes] = None
+        self.jpeg_seq = 0
+        self.encoded = 0
+        self.last_encode = 0.0
+        self.encode_lock = threading.Lock()  # 保证同一帧在本档位只编码一次
+
+    def get_stats(self) -> dict:
+        return {
+            "width": self.width,
+            "quality": self.quality,
+            "fps": self.fps,
+            "subscribers": self.subscribers,
+            "encoded": self.encoded,
+        }
+
+
+class FrameBroadcaster:
+    """
+    编码一次、多客户端共享的帧广播，支持多个画质档位
+    - publish(): 发布新帧；只为有订阅者的档位缩放并编码，且不超过档位帧率
+      （帧率之外的帧由需要它的客户端按需编码）
+    - wait(): 客户端阻塞等待指定档位比自己已发送序号更新的帧
+    - 档位没有订阅者时不编码，新客户端到来时最新一帧按需编码一次
+    """
+
+    def __init__(self, quality: int = 85, tiers: Optional[Dict[str, dict]] = None,
+                 default_tier: str = "high"):
+        """
+        tiers: {档位名: {"width": 宽度, "quality": 质量, "fps": 帧率}}，按画质从高到低排列
+        """
+        if not tiers:
+            tiers = {default_tier: {"width": 0, "quality": quality, "fps": 30}}
+        self.tiers: Dict[str, StreamTier] = {
+            name: StreamTier(name, t.get("width", 0), t.get("quality", quality), t.get("fps", 30))
+            for name, t in tiers.items()
+        }
+        self.default_tier = default_tier if default_tier in self.tiers else next(iter(self.tiers))
+
+        self._cond = threading.Condition()
+        self._seq = 0                          # 最新发布的帧序号
+        self._frame: Optional[np.ndarray] = None  # 最新帧（原始分辨率）
+        self._closed = False
+
+    @property
+    def subscribers(self) -> int:
+        return sum(t.subscribers for t in self.tiers.values())
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def encoded(self) -> int:
+        """所有档位的编码次数"""
+        return sum(t.encoded for t in self.tiers.values())
+
+    def select_tier(self, width: Optional[int] = None, quality: Optional[int] = None,
+                    fps: Optional[float] = None) -> str:
+        """
+        把客户端请求的分辨率 / 质量 / 帧率映射到档位：
+        取不超过所有请求值的最高档位，都不满足时取最低档位
+        """
+        for tier in self.tiers.values():
+            # 原始分辨率档位在还没有帧时视为无穷大
+            tier_width = tier.width or (self._frame.shape[1] if self._frame is not None else float("inf"))
+            if width and tier_width > width:
+                continue
+            if quality and tier.quality > quality:
+                continue
+            if fps and tier.fps > fps:
+                continue
+            return tier.name
+        if width is None and quality is None and fps is None:
+            return self.default_tier
+        return list(self.tiers)[-1]
+
+    def subscribe(self, tier: Optional[str] = None) -> str:
+        """订阅档位，返回实际档位名"""
+        name = tier if tier in self.tiers else self.default_tier
+        with self._cond:
+            self.tiers[name].subscribers += 1
+        return name
+
+    def unsubscribe(self, tier: Optional[str] = None):
+        name = tier if tier in self.tiers else self.default_tier
+        with self._cond:
+            self.tiers[name].subscribers = max(0, self.tiers[name].subscribers - 1)
+
+    def publish(self, frame: np.ndarray, seq: Optional[int] = None) -> int:
+        """发布新帧（发布后调用方不得再修改 frame），返回帧序号"""
+        with self._cond:
+            self._seq = seq if seq is not None else self._seq + 1
+            self._frame = frame
+            seq = self._seq
+            now = time.monotonic()
+            active = [t for t in self.tiers.values()
+                      if t.subscribers > 0 and now - t.last_encode >= 0.9 / t.fps]
+            self._cond.notify_all()
+
+        for tier in active:
+            self._encode(tier, seq)
+        return seq
+
+    def wait(self, after_seq: int, timeout: Optional[float] = None,
+             tier: Optional[str] = None) -> Tuple[int, Optional[bytes]]:
+        """
+        等待指定档位比 after_seq 更新的帧，返回 (序号, JPEG)
+        超时或关闭时返回 (after_seq, None)
+        """
+        t = self.tiers.get(tier) or self.tiers[self.default_tier]
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self._seq > after_seq, timeout)
+            if self._seq <= after_seq:
+                return after_seq, None
+            if t.jpeg_seq == self._seq:
+                return t.jpeg_seq, t.jpeg
+            seq = self._seq
+
+        # 未编码（发布线程尚未编完或当时无订阅者）：由第一个需要它的线程编码
+        self._encode(t, seq)
+        with self._cond:
+            if t.jpeg_seq > after_seq:
+                return t.jpeg_seq, t.jpeg
+            return after_seq, None
+
+    def latest(self, tier: Optional[str] = None) -> Tuple[int, Optional[bytes]]:
+        """指定档位最新一帧的 (序号, JPEG)，必要时编码"""
+        t = self.tiers.get(tier) or self.tiers[self.default_tier]
+        if self._seq and t.jpeg_seq != self._seq:
+            self._encode(t, self._seq)
+        with self._cond:
+            return t.jpeg_seq, t.jpeg
+
+    def _encode(self, tier: StreamTier, seq: int):
+        """为档位缩放并编码最新帧；已被其他线程编码时跳过"""
+        with tier.encode_lock:
+            with self._cond:
+                if tier.jpeg_seq >= seq or self._frame is None:
+                    return
+                frame, seq = self._frame, self._seq
+
+            start = time.perf_counter()
+            h, w = frame.shape[:2]
+            if tier.width and tier.width < w:
+                frame = cv2.resize(frame, (tier.width, h * tier.width // w), interpolation=cv2.INTER_AREA)
+            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, tier.quality])
+            if not ret:
+                hot_log.warning("JPEG encoding failed")
+                return
+            _ENCODE_TIME.observe(time.perf_counter() - start)
+
+            with self._cond:
+                tier.jpeg = buffer.tobytes()
+                tier.jpeg_seq = seq
+                tier.encoded += 1
+                tier.last_encode = time.monotonic()
+                self._cond.notify_all()
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return {name: t.get_stats() for name, t in self.tiers.items()}
+
+    def close(self):
+        """唤醒所有等待的客户端"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class MetadataChannel:
+    """
+    按帧序号发布的叠加元数据
+    与 FrameBroadcaster 使用相同的帧序号，浏览器收到某帧后按序号取对应的元数据绘制；
+    保留最近 history 帧，客户端短暂落后时也能取到对应帧的数据
+    """
+
+    def __init__(self, history: int = 60):
+        self._items: deque = deque(maxlen=max(1, history))
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._closed = False
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def publish(self, seq: int, meta: dict):
+        """发布一帧的元数据（写入 "seq" 字段，发布后调用方不得再修改 meta）"""
+        meta["seq"] = seq
+        with self._cond:
+            self._seq = seq
+            self._items.append(meta)
+            self._cond.notify_all()
+
+    def wait(self, after_seq: int, timeout: Optional[float] = None) -> Optional[List[dict]]:
+        """
+        等待比 after_seq 更新的元数据，返回按序号排列的列表（超时为空列表）
+        关闭时返回 None
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self._seq > after_seq, timeout)
+            if self._closed:
+                return None
+            return [m for m in self._items if m["seq"] > after_seq]
+
+    def get(self, seq: int) -> Optional[dict]:
+        """指定帧序号的元数据（已过期时返回 None）"""
+        with self._cond:
+            for meta in reversed(self._items):
+                if meta["seq"] == seq:
+                    return meta
+        return None
+
+    def close(self):
+        """唤醒所有等待的客户端"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StreamClient:
+    """
+    一个视频流客户端的节拍与统计
+    max_fps: 该客户端的发送帧率上限；节拍等待期间到达的帧直接跳过，只发送最新一帧
+    """
+
+    def __init__(self, client_id: int, stream: str, remote: str = "", max_fps: float = 30.0,
+                 tier: str = "", overlay: str = ""):
+        self.client_id = client_id
+        self.stream = stream
+        self.remote = remote
+        self.max_fps = max_fps
+        self.tier = tier
+        self.overlay = overlay  # 主视频流的叠加模式（server / client）
+
+        self.started = time.monotonic()
+        self.sent = 0           # 已发送帧数
+        self.dropped = 0        # 跳过的帧数（客户端慢或受帧率上限限制）
+        self.fps = 0.0          # 实际发送帧率（指数平均）
+        self.send_ms = 0.0      # 每帧写入阻塞时间（指数平均），反映客户端网络速度
+        self._last_send = 0.0
+        self._next_send = 0.0
+
+    def pace(self):
+        """按帧率上限等待到下一个发送时刻"""
+        delay = self._next_send - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, skipped: int, send_seconds: float):
+        """记录一次发送：跳过的帧数与写入耗时"""
+        now = time.monotonic()
+        self.sent += 1
+        self.dropped += max(0, skipped)
+        if self._last_send:
+            interval = now - self._last_send
+            if interval > 0:
+                self.fps = 1.0 / interval if self.sent == 2 else 0.9 * self.fps + 0.1 / interval
+        self.send_ms = send_seconds * 1000.0 if self.sent == 1 else 0.9 * self.send_ms + 0.1 * send_seconds * 1000.0
+        self._last_send = now
+        if self.max_fps > 0:
+            # 以上一个计划时刻为基准累加；客户端落后时从当前时刻重新计时，不连发补帧
+            period = 1.0 / self.max_fps
+            self._next_send += period
+            if self._next_send < now:
+                self._next_send = now + period
+
+    def get_stats(self) -> dict:
+        return {
+            "id": self.client_id,
+            "stream": self.stream,
+            "tier": self.tier,
+            "overlay": self.overlay,
+            "remote": self.remote,
+            "max_fps": self.max_fps,
+            "fps": round(self.fps, 1),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "send_ms": round(self.send_ms, 2),
+            "duration_s": round(time.monotonic() - self.started, 1),
+        }
+
+
+class StreamRegistry:
+    """视频流客户端登记：限制并发数量并汇总各客户端统计"""
+
+    def __init__(self, max_clients: int = 4):
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._clients: Dict[int, StreamClient] = {}
+        self._ids = itertools.count(1)
+        self.rejected = 0
+
+    def acquire(self, stream: str, remote: str = "", max_fps: float = 30.0,
+                tier: str = "", overlay: str = "") -> Optional[StreamClient]:
+        """登记新客户端，超过并发上限返回 None"""
+        with self._lock:
+            if self.max_clients and len(self._clients) >= self.max_clients:
+                self.rejected += 1
+                return None
+            client = StreamClient(next(self._ids), stream, remote, max_fps, tier, overlay)
+            self._clients[client.client_id] = client
+            return client
+
+    def release(self, client: StreamClient):
+        """注销客户端"""
+        with self._lock:
+            self._clients.pop(client.client_id, None)
+        stats = client.get_stats()
+        logger.info(f"视频流客户端 {client.client_id} ({client.remote}) 断开: "
+                    f"发送 {stats['sent']} 帧, 跳过 {stats['dropped']} 帧, {stats['fps']} FPS")
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            clients = list(self._clients.values())
+        return {
+            "active": len(clients),
+            "max_clients": self.max_clients,
+            "rejected": self.rejected,
+            "clients": [c.get_stats() for c in clients],
+        }
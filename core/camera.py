@@ -1,103 +1,322 @@
 # -*- coding: utf-8 -*-
 """
 摄像头模块 - 支持多索引尝试和 MJPEG 格式
+采集帧写入预分配的环形缓冲区，读取方获得带序号和时间戳的只读视图
+采集采用 grab/retrieve 分离：排空驱动队列中的旧帧，只解码最新一帧
 """
 
 import cv2
 import logging
 import threading
 import time
-from typing import Optional, Tuple
+from collections import deque
+from typing import List, NamedTuple, Optional, Tuple
 import numpy as np
 
+from . import camera_discovery
+from .log import RateLimitedLogger
+from .metrics import stage_histogram
+
 logger = logging.getLogger(__name__)
+hot_log = RateLimitedLogger(logger)
+
+_CAPTURE_TIME = stage_histogram("capture")  # retrieve（解码）耗时，不含 grab 等待下一帧的时间
+
+
+class Frame(NamedTuple):
+    """一帧图像及其元数据"""
+    seq: int            # 帧序号（从 1 开始递增）
+    timestamp: float    # 采集时间 (time.monotonic)
+    image: np.ndarray   # 只读视图
+
+
+class FrameRingBuffer:
+    """
+    固定槽位的帧环形缓冲区（单写多读）
+    写入方直接解码到下一个槽位，读取方拿到的只读视图在之后
+    slots - 1 帧内保持有效；耗时不定的读取方用完视图后以 is_valid(seq) 确认期间未被覆盖，
+    需要长期持有时请自行 copy()
+    """
+    
+    def __init__(self, slots: int = 4):
+        self._size = max(2, slots)
+        self._slots: List[Optional[np.ndarray]] = [None] * self._size
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._latest: Optional[Frame] = None
+        self._recent: deque = deque(maxlen=self._size - 1)  # 仍然有效的最近几帧
+        self._closed = False
+        
+    def next_slot(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """获取下一帧的写入槽位（仅写入线程调用），尺寸变化时重新分配"""
+        index = (self._seq + 1) % self._size
+        buf = self._slots[index]
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self._slots[index] = buf
+        return buf
+        
+    def publish(self, image: np.ndarray, timestamp: Optional[float] = None) -> int:
+        """发布已写好的帧，唤醒等待者，返回帧序号"""
+        view = image.view()
+        view.flags.writeable = False
+        with self._cond:
+            self._seq += 1
+            self._latest = Frame(self._seq, timestamp if timestamp is not None else time.monotonic(), view)
+            self._recent.append(self._latest)
+            self._cond.notify_all()
+            return self._seq
+            
+    def latest(self) -> Optional[Frame]:
+        """最新一帧（可能为 None）"""
+        return self._latest
+        
+    def nearest(self, timestamp: float) -> Optional[Frame]:
+        """最近几帧中采集时间最接近 timestamp 的一帧（多摄像头对齐用）"""
+        with self._cond:
+            return min(self._recent, key=lambda f: abs(f.timestamp - timestamp), default=None)
+        
+    def wait_newer(self, after_seq: int, timeout: Optional[float] = None) -> Optional[Frame]:
+        """阻塞等待序号大于 after_seq 的帧，超时或关闭返回 None"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._closed or (self._latest is not None and self._latest.seq > after_seq),
+                timeout
+            )
+            frame = self._latest
+            if frame is None or frame.seq <= after_seq:
+                return None
+            return frame
+            
+    def is_valid(self, seq: int) -> bool:
+        """
+        序号为 seq 的帧的视图是否仍未被覆盖
+        写入方发布 seq + slots - 1 之后才开始写入 seq 所在的槽位；读取方在用完视图后检查，
+        返回 True 即说明读取期间数据未被改写
+        """
+        with self._cond:
+            return self._seq - seq < self._size - 1
+            
+    @property
+    def closed(self) -> bool:
+        """写入方已停止（wait_newer 不会再等到新帧）"""
+        return self._closed
+        
+    def close(self):
+        """唤醒所有等待者"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            
+    def reopen(self):
+        """重新允许等待"""
+        with self._cond:
+            self._closed = False
 
 
 class Camera:
     """摄像头类，支持多索引尝试"""
     
-    def __init__(self, camera_id: int = 0, width: int = 640, height: int = 480, fps: int = 30):
+    def __init__(self, camera_id: int = 0, width: int = 640, height: int = 480, fps: int = 30,
+                 buffer_slots: int = 4, fourcc: Optional[str] = "MJPG", v4l2_buffers: int = 1,
+                 drop_stale: bool = True, cache_file: Optional[str] = None,
+                 probe_timeout: float = 3.0, fallback_ids: Optional[List[int]] = None,
+                 discover: bool = True):
         self.camera_id = camera_id
         self.width = width
         self.height = height
         self.fps = fps
         self.cap: Optional[cv2.VideoCapture] = None
-        self._lock = threading.Lock()
         self._running = False
-        self._frame = None
+        self._buffer = FrameRingBuffer(buffer_slots)
         self._thread: Optional[threading.Thread] = None
         
+        # 采集参数
+        self.fourcc = fourcc              # 显式协商的像素格式（None 表示驱动默认）
+        self.v4l2_buffers = v4l2_buffers  # 驱动缓冲区数量，越少延迟越低
+        self.drop_stale = drop_stale      # grab 排空旧帧，只 retrieve 最新帧
+        
+        # 设备发现
+        self.cache_file = cache_file      # 上次成功设备的缓存文件
+        self.probe_timeout = probe_timeout
+        self.fallback_ids = fallback_ids if fallback_ids is not None else [33, 0, 1, 2, 34, 35, 36, 37]
+        self.discover = discover          # False 时只打开指定设备（多摄像头时避免抢占其他设备）
+        
+        # 采集统计
+        self._stats_lock = threading.Lock()
+        self._latency_ms = 0.0   # 采集到可读的延迟（指数平均）
+        self._dropped = 0        # 丢弃的旧帧数
+        self._captured = 0
+        self._driver_timestamps = False  # 驱动是否提供帧时间戳
+        
     def open(self) -> bool:
-        """打开摄像头，尝试多个索引"""
+        """打开摄像头：优先尝试缓存的设备，其余候选并行探测"""
         if self.cap and self.cap.isOpened():
             return True
 
-        # 尝试多个摄像头索引
-        camera_ids = [self.camera_id, 33, 0, 1, 2, 34, 35, 36, 37]
+        start = time.monotonic()
+        devices = camera_discovery.list_v4l2_devices()
+        names = {d["index"]: d["name"] for d in devices}
+        result = None
+
+        # 1. 上次成功的设备与后端
+        cached = camera_discovery.load_cache(self.cache_file)
+        if cached and camera_discovery.cache_matches(cached, devices):
+            logger.info(f"尝试缓存的摄像头 {cached['camera_id']}...")
+            probed = self._probe(cached["camera_id"], [cached.get("backend", cv2.CAP_V4L2)])
+            if probed:
+                result = (cached["camera_id"], probed)
+
+        # 2. 其余候选并行探测
+        if result is None:
+            if self.discover:
+                candidates = camera_discovery.candidate_ids(self.camera_id, devices, self.fallback_ids)
+            else:
+                candidates = [self.camera_id]
+            logger.info(f"并行探测摄像头: {candidates}")
+            result = camera_discovery.probe_parallel(candidates, self._probe, self._release_probe,
+                                                     timeout=self.probe_timeout)
 
-        for cam_id in camera_ids:
+        if result is None:
+            logger.error("无法打开任何摄像头")
+            return False
+
+        cam_id, (cap, backend) = result
+        self.cap = cap
+        self.camera_id = cam_id
+        actual_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        actual_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fourcc = self.get_fourcc()
+        logger.info(f"摄像头 {cam_id} 打开成功，分辨率: {actual_width}x{actual_height}, "
+                    f"格式: {fourcc}, 耗时 {time.monotonic() - start:.2f}s")
+
+        camera_discovery.save_cache(self.cache_file, {
+            "camera_id": cam_id,
+            "name": names.get(cam_id, ""),
+            "backend": backend,
+            "fourcc": fourcc,
+            "width": actual_width,
+            "height": actual_height,
+        })
+
+        self._running = True
+        self._buffer.reopen()
+        self._thread = threading.Thread(target=self._capture_loop, name="camera-capture", daemon=True)
+        self._thread.start()
+        return True
+
+    def _probe(self, cam_id: int, backends: Optional[List[int]] = None) -> Optional[Tuple[cv2.VideoCapture, int]]:
+        """探测单个设备：打开、配置并读到有效帧即成功，返回 (cap, backend)"""
+        for backend in backends or [cv2.CAP_V4L2, cv2.CAP_ANY]:
+            cap = None
             try:
-                logger.info(f"尝试打开摄像头 {cam_id}...")
-                
-                # 尝试不同的后端
-                for backend in [cv2.CAP_V4L2, cv2.CAP_ANY]:
-                    try:
-                        self.cap = cv2.VideoCapture(cam_id, backend)
-                        
-                        if self.cap.isOpened():
-                            # 等待摄像头初始化
-                            time.sleep(0.5)
-                            
-                            # 先清除缓冲区
-                            for _ in range(5):
-                                self.cap.read()
-                            
-                            # 设置分辨率
-                            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
-                            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
-                            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
-                            
-                            # 读取一帧测试
-                            ret, frame = self.cap.read()
-                            if ret and frame is not None and frame.size > 0:
-                                actual_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                                actual_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                                logger.info(f"摄像头 {cam_id} 打开成功，分辨率: {actual_width}x{actual_height}")
-                                self.camera_id = cam_id
-                                self._running = True
-                                self._thread = threading.Thread(target=self._capture_loop, daemon=True)
-                                self._thread.start()
-                                return True
-                            else:
-                                self.cap.release()
-                                time.sleep(0.1)
-                    except Exception as e:
-                        logger.debug(f"摄像头 {cam_id} 使用后端 {backend} 失败: {e}")
-                        if self.cap:
-                            self.cap.release()
+                cap = cv2.VideoCapture(cam_id, backend)
+                if not cap.isOpened():
+                    cap.release()
+                    continue
+
+                # 设置格式、驱动缓冲区与分辨率
+                self._configure(cap)
 
+                # 部分摄像头前几帧无效，读到有效帧即可，无需固定等待
+                for _ in range(5):
+                    ret, frame = cap.read()
+                    if ret and frame is not None and frame.size > 0:
+                        return cap, backend
+                cap.release()
             except Exception as e:
-                logger.warning(f"摄像头 {cam_id} 打开失败: {e}")
-                if self.cap:
-                    self.cap.release()
+                logger.debug(f"摄像头 {cam_id} 使用后端 {backend} 失败: {e}")
+                if cap is not None:
+                    cap.release()
+        return None
 
-        logger.error("无法打开任何摄像头")
-        return False
+    @staticmethod
+    def _release_probe(result: Tuple[cv2.VideoCapture, int]):
+        """释放落选的探测结果"""
+        result[0].release()
+        
+    def _configure(self, cap: cv2.VideoCapture):
+        """配置像素格式、驱动缓冲区数量、分辨率和帧率（FOURCC 需先于分辨率设置）"""
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        if self.v4l2_buffers:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, self.v4l2_buffers)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        cap.set(cv2.CAP_PROP_FPS, self.fps)
+        
+    def get_fourcc(self) -> str:
+        """当前生效的像素格式"""
+        if not self.cap:
+            return ""
+        value = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00")
+        
+    def _grab_latest(self) -> Tuple[bool, Optional[float]]:
+        """
+        grab 下一帧；若 grab 立即返回说明取到的是驱动队列中的旧帧，
+        继续 grab 丢弃，直到需要等待新帧为止。返回 (成功, 驱动时间戳)
+        """
+        stale_threshold = 0.25 / max(1, self.fps)
+        max_drain = max(1, self.v4l2_buffers) + 2
+        
+        start = time.monotonic()
+        if not self.cap.grab():
+            return False, None
+        drained = 0
+        while self.drop_stale and time.monotonic() - start < stale_threshold and drained < max_drain:
+            start = time.monotonic()
+            if not self.cap.grab():
+                return False, None
+            drained += 1
+        if drained:
+            with self._stats_lock:
+                self._dropped += drained
+                
+        # V4L2 后端的 POS_MSEC 为驱动缓冲区时间戳（CLOCK_MONOTONIC，毫秒）
+        driver_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if driver_ms > 0:
+            driver_ts = driver_ms / 1000.0
+            if 0 <= time.monotonic() - driver_ts < 1.0:
+                return True, driver_ts
+        return True, None
+        
+    def get_stats(self) -> dict:
+        """采集统计：延迟、丢帧、格式"""
+        with self._stats_lock:
+            return {
+                "captured": self._captured,
+                "dropped": self._dropped,
+                "latency_ms": round(self._latency_ms, 2),
+                "driver_timestamps": self._driver_timestamps,
+                "fourcc": self.get_fourcc(),
+                "v4l2_buffers": self.v4l2_buffers,
+            }
         
     def _capture_loop(self):
-        """后台捕获线程"""
+        """后台捕获线程（grab 本身阻塞到下一帧，无需轮询休眠）"""
         consecutive_errors = 0
         max_errors = 10
+        shape = None  # 上一帧尺寸，用于预取槽位
 
         while self._running:
             if self.cap and self.cap.isOpened():
                 try:
-                    ret, frame = self.cap.read()
+                    ret, driver_ts = self._grab_latest()
+                    grabbed = time.monotonic()
+                    retrieve_start = time.perf_counter()
+                    frame = None
+                    if ret:
+                        # 直接解码到环形缓冲区槽位（镜像不在采集路径处理）
+                        slot = self._buffer.next_slot(shape) if shape is not None else None
+                        ret, frame = self.cap.retrieve(slot) if slot is not None else self.cap.retrieve()
                     if ret and frame is not None:
-                        # 水平翻转图像（解决镜像问题）
-                        frame = cv2.flip(frame, 1)
-                        with self._lock:
-                            self._frame = frame
+                        # 采集时间优先使用驱动时间戳，否则以 grab 返回时刻近似
+                        timestamp = driver_ts if driver_ts is not None else grabbed
+                        shape = frame.shape
+                        _CAPTURE_TIME.observe(time.perf_counter() - retrieve_start)
+                        self._buffer.publish(frame, timestamp)
+                        self._record_latency(time.monotonic() - timestamp, driver_ts is not None)
                         consecutive_errors = 0
                     else:
                         consecutive_errors += 1
@@ -105,26 +324,67 @@ class Camera:
                             logger.error("摄像头读取连续失败，停止捕获")
                             break
                 except Exception as e:
-                    logger.error(f"摄像头读取异常: {e}")
+                    hot_log.error("摄像头读取异常: %s", e)
                     consecutive_errors += 1
                     if consecutive_errors >= max_errors:
                         break
-            time.sleep(0.001)
+            else:
+                time.sleep(0.1)
+        # 唤醒等待帧的处理线程
+        self._buffer.close()
+            
+    def _record_latency(self, latency: float, from_driver: bool):
+        """记录采集到可读的延迟（指数平均）"""
+        with self._stats_lock:
+            self._captured += 1
+            self._driver_timestamps = from_driver
+            latency_ms = latency * 1000.0
+            if self._captured == 1:
+                self._latency_ms = latency_ms
+            else:
+                self._latency_ms = 0.9 * self._latency_ms + 0.1 * latency_ms
             
     def read(self) -> Tuple[bool, Optional[np.ndarray]]:
-        """读取当前帧"""
-        with self._lock:
-            if self._frame is not None:
-                return True, self._frame.copy()
-            return False, None
+        """读取当前帧（兼容接口，返回可写副本）"""
+        frame = self._buffer.latest()
+        if frame is not None:
+            return True, frame.image.copy()
+        return False, None
+        
+    def read_frame(self) -> Optional[Frame]:
+        """读取最新帧（零拷贝只读视图 + 序号 + 时间戳）"""
+        return self._buffer.latest()
+        
+    def frame_near(self, timestamp: float) -> Optional[Frame]:
+        """最近几帧中采集时间最接近 timestamp 的一帧"""
+        return self._buffer.nearest(timestamp)
+        
+    def wait_frame(self, after_seq: int = 0, timeout: Optional[float] = None) -> Optional[Frame]:
+        """阻塞等待比 after_seq 更新的帧"""
+        return self._buffer.wait_newer(after_seq, timeout)
+        
+    def frame_valid(self, seq: int) -> bool:
+        """序号为 seq 的帧视图是否仍未被覆盖"""
+        return self._buffer.is_valid(seq)
             
     def is_opened(self) -> bool:
-        """检查摄像头是否打开"""
-        return self.cap is not None and self.cap.isOpened() and self._running
+        """检查摄像头是否打开（采集线程因读取失败退出后为 False）"""
+        return self.cap is not None and self.cap.isOpened() and self._running and not self._buffer.closed
+        
+    @property
+    def closed(self) -> bool:
+        """采集已停止（读取连续失败、设备拔出或已释放），不会再有新帧"""
+        return self._buffer.closed
+        
+    @property
+    def released(self) -> bool:
+        """已调用 release()（缓冲区关闭是主动停止，而非读取失败）"""
+        return not self._running
         
     def release(self):
         """释放摄像头资源"""
         self._running = False
+        self._buffer.close()
         if self._thread:
             self._thread.join(timeout=1.0)
         if self.cap:
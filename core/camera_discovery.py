@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+摄像头发现模块
+- 通过 V4L2 sysfs 枚举 /dev/video* 设备
+- 缓存上次成功的设备与格式，启动时优先尝试
+- 其余候选设备并行探测，带超时
+"""
+
+import glob
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SYSFS_ROOT = "/sys/class/video4linux"
+
+
+def _read_sysfs(path: str) -> str:
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def list_v4l2_devices() -> List[Dict]:
+    """
+    枚举 V4L2 设备
+    返回 [{"index": 33, "path": "/dev/video33", "name": "USB Camera"}, ...]
+    只保留每个物理设备的主节点（sysfs index 为 0），跳过元数据节点
+    """
+    devices = []
+    for node in sorted(glob.glob(os.path.join(SYSFS_ROOT, "video*"))):
+        base = os.path.basename(node)
+        try:
+            index = int(base[len("video"):])
+        except ValueError:
+            continue
+
+        node_index = _read_sysfs(os.path.join(node, "index"))
+        if node_index and node_index != "0":
+            continue
+
+        devices.append({
+            "index": index,
+            "path": f"/dev/{base}",
+            "name": _read_sysfs(os.path.join(node, "name")),
+        })
+    return devices
+
+
+def load_cache(cache_file: Optional[str]) -> Optional[Dict]:
+    """读取上次成功的设备缓存"""
+    if not cache_file or not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, "r") as f:
+            cached = json.load(f)
+        return cached if "camera_id" in cached else None
+    except (OSError, ValueError) as e:
+        logger.debug(f"读取摄像头缓存失败: {e}")
+        return None
+
+
+def save_cache(cache_file: Optional[str], info: Dict):
+    """保存成功的设备与格式"""
+    if not cache_file:
+        return
+    try:
+        tmp = cache_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, cache_file)
+    except OSError as e:
+        logger.debug(f"保存摄像头缓存失败: {e}")
+
+
+def cache_matches(cached: Dict, devices: List[Dict]) -> bool:
+    """缓存的设备是否仍是同一个物理设备（sysfs 不可用时默认相信缓存）"""
+    if not devices:
+        return True
+    for device in devices:
+        if device["index"] == cached["camera_id"]:
+            return not cached.get("name") or cached["name"] == device["name"]
+    return False
+
+
+def candidate_ids(preferred: int, devices: List[Dict], fallback_ids: List[int]) -> List[int]:
+    """
+    候选设备顺序：配置的设备 > sysfs 枚举到的设备 > 备用索引
+    sysfs 可用时，备用索引只保留实际存在的节点
+    """
+    present = {d["index"] for d in devices}
+    ordered = [preferred] + [d["index"] for d in devices] + list(fallback_ids)
+
+    result = []
+    for cam_id in ordered:
+        if cam_id in result:
+            continue
+        if present and cam_id not in present:
+            continue
+        result.append(cam_id)
+    return result
+
+
+def probe_parallel(candidates: List[int], probe: Callable[[int], Optional[Tuple]],
+                   release: Callable[[Tuple], None], timeout: float = 3.0) -> Optional[Tuple[int, Tuple]]:
+    """
+    并行探测候选设备
+    probe(cam_id) 成功返回结果元组，失败返回 None
+    落选、超时后才返回的结果都由 release() 释放
+    返回 (cam_id, 结果)，按候选顺序取第一个成功者
+    """
+    if not candidates:
+        return None
+
+    executor = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="camera-probe")
+    futures = {executor.submit(probe, cam_id): cam_id for cam_id in candidates}
+    results: Dict[int, Tuple] = {}
+    order = {cam_id: i for i, cam_id in enumerate(candidates)}
+
+    pending = set(futures)
+    deadline = time.monotonic() + timeout
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.debug(f"摄像头 {futures[future]} 探测异常: {e}")
+                continue
+            if result is not None:
+                results[futures[future]] = result
+
+        # 排在最佳结果之前的候选都已结束时即可提前返回
+        best = min(results, key=order.get, default=None)
+        if best is not None and all(order[futures[f]] > order[best] for f in pending):
+            break
+
+    def _release_late(future):
+        try:
+            result = future.result()
+        except Exception:
+            return
+        if result is not None:
+            release(result)
+
+    # 未结束的探测完成后自动释放
+    for future in pending:
+        future.add_done_callback(_release_late)
+    executor.shutdown(wait=False)
+
+    best = min(results, key=order.get, default=None)
+    for cam_id, result in results.items():
+        if cam_id != best:
+            release(result)
+    if best is None:
+        return None
+    return best, results[best]
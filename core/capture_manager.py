@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+多摄像头采集管理
+- 统一管理多个帧源（Camera / FileSource），每个帧源只有自己的采集线程
+- 以主摄像头的新帧为节拍，从其余帧源的环形缓冲区中取时间最接近的一帧组成帧组（零拷贝）
+- 按优先级与权重分配检测器时间
+"""
+
+import logging
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .camera import Frame
+
+logger = logging.getLogger(__name__)
+
+
+class FrameSet(NamedTuple):
+    """同一时刻各路帧源的一组帧"""
+    primary: str                # 主帧源名称
+    frames: Dict[str, Frame]    # 名称 -> 帧（只读视图）
+    skew: Dict[str, float]      # 名称 -> 与主帧的采集时间差（秒）
+    synced: bool                # 所有帧的时间差都在容差内
+
+
+class StreamSource:
+    """
+    一路帧源及其调度状态
+    priority: 数值越小越优先，主帧源为最小值
+    detect_interval: 两次检测之间的最短间隔（秒）
+    """
+
+    def __init__(self, name: str, source, priority: int = 0, detect_interval: float = 0.0):
+        self.name = name
+        self.source = source
+        self.priority = priority
+        self.detect_interval = detect_interval
+
+        self.opened = False
+        self.last_detect_time = 0.0
+        self.last_detect_seq = 0
+        self.detections: list = []
+        self.detect_count = 0
+
+
+class CaptureManager:
+    """多路帧源管理器"""
+
+    def __init__(self, sync_tolerance: float = 0.05):
+        """
+        sync_tolerance: 帧组内允许的最大采集时间差（秒），超出时 FrameSet.synced 为 False
+        """
+        self.sync_tolerance = sync_tolerance
+        self._streams: Dict[str, StreamSource] = {}
+
+    def add_source(self, name: str, source, priority: int = 0, detect_interval: float = 0.0):
+        """注册帧源（优先级最高者为主帧源）"""
+        self._streams[name] = StreamSource(name, source, priority, detect_interval)
+
+    @property
+    def primary(self) -> Optional[str]:
+        """主帧源名称"""
+        opened = [s for s in self._streams.values() if s.opened] or list(self._streams.values())
+        if not opened:
+            return None
+        return min(opened, key=lambda s: s.priority).name
+
+    def stream_names(self) -> List[str]:
+        """已打开的帧源名称（主帧源在前）"""
+        streams = sorted((s for s in self._streams.values() if s.opened), key=lambda s: s.priority)
+        return [s.name for s in streams]
+
+    def get_source(self, name: str):
+        """按名称获取帧源"""
+        stream = self._streams.get(name)
+        return stream.source if stream else None
+
+    def open(self, names: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """打开帧源（默认全部），返回各帧源是否打开成功"""
+        results = {}
+        for name in names if names is not None else list(self._streams):
+            stream = self._streams[name]
+            stream.opened = stream.source.is_opened() or stream.source.open()
+            if not stream.opened:
+                logger.warning(f"帧源 {name} 打开失败")
+            results[name] = stream.opened
+        return results
+
+    def closed(self, name: Optional[str] = None) -> bool:
+        """帧源（默认主帧源）已停止、不会再有新帧；区分于 wait_frame_set 的超时"""
+        stream = self._streams.get(name or self.primary or "")
+        return stream is None or getattr(stream.source, "closed", False)
+
+    def frame_valid(self, name: str, seq: int) -> bool:
+        """帧组中某路帧的只读视图是否仍未被覆盖（慢速读取方用完视图后检查）"""
+        stream = self._streams.get(name)
+        return stream is not None and stream.source.frame_valid(seq)
+
+    def wait_frame_set(self, after_seq: int = 0, timeout: Optional[float] = None) -> Optional[FrameSet]:
+        """
+        等待主帧源比 after_seq 更新的帧，并为其余帧源挑选采集时间最接近的帧
+        超时或主帧源已停止时返回 None（用 closed() 区分）
+        """
+        primary = self.primary
+        if primary is None:
+            return None
+        frame = self._streams[primary].source.wait_frame(after_seq, timeout)
+        if frame is None:
+            return None
+
+        frames = {primary: frame}
+        skew = {primary: 0.0}
+        synced = True
+        for stream in self._streams.values():
+            if stream.name == primary or not stream.opened:
+                continue
+            other = stream.source.frame_near(frame.timestamp)
+            if other is None:
+                continue
+            frames[stream.name] = other
+            skew[stream.name] = other.timestamp - frame.timestamp
+            synced = synced and abs(skew[stream.name]) <= self.sync_tolerance
+        return FrameSet(primary, frames, skew, synced)
+
+    def schedule(self, frame_set: FrameSet, now: Optional[float] = None,
+                 exclude: Iterable[str] = ()) -> Optional[str]:
+        """
+        选出本周期获得检测器时间的帧源：
+        帧组中有未检测的新帧、且距上次检测已超过 detect_interval 的帧源里，
+        优先级最高者胜出，同优先级取等待最久的
+        """
+        now = time.monotonic() if now is None else now
+        excluded = set(exclude)
+        best: Optional[StreamSource] = None
+
+        for name, frame in frame_set.frames.items():
+            stream = self._streams.get(name)
+            if stream is None or name in excluded:
+                continue
+            if frame.seq <= stream.last_detect_seq:
+                continue
+            if now - stream.last_detect_time < stream.detect_interval:
+                continue
+            if best is None or (stream.priority, stream.last_detect_time) < (best.priority, best.last_detect_time):
+                best = stream
+        return best.name if best else None
+
+    def record_detections(self, name: str, seq: int, detections: list, now: Optional[float] = None):
+        """记录某帧源的检测结果"""
+        stream = self._streams[name]
+        stream.last_detect_time = time.monotonic() if now is None else now
+        stream.last_detect_seq = seq
+        stream.detections = detections
+        stream.detect_count += 1
+
+    def get_detections(self, name: str) -> Tuple[int, list]:
+        """某帧源最近一次检测的 (帧序号, 结果)"""
+        stream = self._streams.get(name)
+        if stream is None:
+            return 0, []
+        return stream.last_detect_seq, stream.detections
+
+    def get_stats(self) -> Dict[str, dict]:
+        """各帧源统计"""
+        stats = {}
+        for name in self.stream_names():
+            stream = self._streams[name]
+            entry = stream.source.get_stats() if hasattr(stream.source, "get_stats") else {}
+            entry["priority"] = stream.priority
+            entry["detections"] = stream.detect_count
+            stats[name] = entry
+        return stats
+
+    def release(self):
+        """释放所有帧源"""
+        for stream in self._streams.values():
+            try:
+                stream.source.release()
+            except Exception as e:
+                logger.error(f"释放帧源 {stream.name} 出错: {e}")
+            stream.opened = False
@@ -7,10 +7,21 @@ YOLO 目标检测器 - 使用正确的 YOLOv5 后处理
 import cv2
 import numpy as np
 import logging
+import time
 from typing import List, Dict, Tuple
 from pathlib import Path
 
+from .log import RateLimitedLogger
+from .metrics import stage_histogram
+
 logger = logging.getLogger(__name__)
+hot_log = RateLimitedLogger(logger)
+
+# 各环节耗时
+_PREPROCESS_TIME = stage_histogram("preprocess")
+_INFERENCE_TIME = stage_histogram("inference")
+_DECODE_TIME = stage_histogram("decode")
+_NMS_TIME = stage_histogram("nms")
 
 # 尝试导入 RKNN
 try:
@@ -64,12 +75,16 @@ class YOLODetector:
     
     def __init__(self, model_path: str, input_size: Tuple[int, int] = (640, 640),
                  conf_threshold: float = 0.5, iou_threshold: float = 0.3,
-                 min_box_size: int = 50):
+                 min_box_size: int = 50, mirror: bool = False, batch_size: int = 1):
         self.model_path = model_path
         self.input_size = input_size
         self.conf_threshold = conf_threshold
         self.iou_threshold = iou_threshold
         self.min_box_size = min_box_size
+        self.mirror = mirror  # 输入为未镜像画面，输出框映射到镜像坐标
+        
+        self.batch_size = batch_size  # 模型编译的批大小，1 表示只支持单帧推理
+        self._batch_buffer = None
         
         self.rknn = None
         self.initialized = False
@@ -104,144 +119,172 @@ class YOLODetector:
         logger.info("✓ RKNN model loaded successfully")
     
     def preprocess(self, frame: np.ndarray) -> np.ndarray:
-        """预处理图像"""
-        # Resize
-        img = cv2.resize(frame, self.input_size)
-        
-        # BGR -> RGB
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Normalize to [0, 1]
-        img = img.astype(np.float32) / 255.0
-        
-        # HWC -> CHW
-        img = np.transpose(img, (2, 0, 1))
+        """预处理图像，返回 (1, 3, H, W)"""
+        return self.preprocess_batch([frame])
+    
+    def preprocess_batch(self, frames: List[np.ndarray], rows: int = 0) -> np.ndarray:
+        """
+        批量预处理：缩放、BGR->RGB、归一化后直接写入一个连续的 (N, 3, H, W) 张量
+        rows 大于帧数时张量补齐到 rows 行（补齐的行内容无意义，结果应丢弃）
+        张量按批大小复用，下次调用前有效
+        """
+        in_w, in_h = self.input_size
+        n = max(len(frames), rows)
+        if self._batch_buffer is None or self._batch_buffer.shape[0] != n:
+            self._batch_buffer = np.zeros((n, 3, in_h, in_w), dtype=np.float32)
+        batch = self._batch_buffer
         
-        # Add batch dimension
-        img = np.expand_dims(img, axis=0)
+        for i, frame in enumerate(frames):
+            # Resize + BGR -> RGB
+            img = cv2.cvtColor(cv2.resize(frame, self.input_size), cv2.COLOR_BGR2RGB)
+            # HWC -> CHW，归一化到 [0, 1]，直接写入批张量
+            np.multiply(img.transpose(2, 0, 1), 1.0 / 255.0, out=batch[i], casting="unsafe")
         
-        return img
+        return batch
     
     def detect(self, frame: np.ndarray) -> List[Dict]:
         """检测图像"""
-        if not self.initialized or self.rknn is None:
-            logger.warning("Detector not initialized")
+        return self.detect_batch([frame])[0]
+    
+    def detect_batch(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        """
+        批量检测多帧，返回每帧的检测结果
+        模型以批大小编译时按批大小分块推理（不足一批时补齐，输出只取实际帧数），
+        否则逐帧推理同一个批张量的切片；解码对整批一次完成
+        """
+        if not frames:
             return []
+        if not self.initialized or self.rknn is None:
+            hot_log.warning("Detector not initialized")
+            return [[] for _ in frames]
         
-        orig_h, orig_w = frame.shape[:2]
+        img_sizes = [(f.shape[1], f.shape[0]) for f in frames]
+        n = len(frames)
+        step = max(1, self.batch_size)
         
-        # Preprocess
-        input_data = self.preprocess(frame)
+        # Preprocess（模型输入的批维度固定，补齐到批大小的整数倍）
+        start = time.perf_counter()
+        batch = self.preprocess_batch(frames, -(-n // step) * step)
+        preprocessed = time.perf_counter()
+        _PREPROCESS_TIME.observe(preprocessed - start)
         
         # Inference
-        outputs = self.rknn.inference(inputs=[input_data])
+        chunks = [self.rknn.inference(inputs=[batch[i:i + step]]) for i in range(0, batch.shape[0], step)]
+        if len(chunks) == 1 and step == n:
+            outputs = chunks[0]
+        else:
+            outputs = [np.concatenate([self._as_batch(out[b]) for out in chunks])[:n]
+                       for b in range(len(chunks[0]))]
+        _INFERENCE_TIME.observe(time.perf_counter() - preprocessed)
         
         # Postprocess
-        detections = self.postprocess(outputs, (orig_w, orig_h))
-        
-        return detections
+        return self.postprocess_batch(outputs, img_sizes)
+    
+    @staticmethod
+    def _as_batch(out) -> np.ndarray:
+        """把单个分支输出整理为 (N, C, H, W)"""
+        out = np.asarray(out)
+        while out.ndim > 4 and out.shape[0] == 1:
+            out = out[0]
+        if out.ndim == 3:
+            out = out[np.newaxis]
+        return out
     
     def postprocess(self, outputs: List[np.ndarray], img_size: Tuple[int, int]) -> List[Dict]:
         """
         YOLOv5 后处理 - 使用正确的 anchor 解码
         """
+        return self.postprocess_batch(outputs, [img_size])[0]
+    
+    def postprocess_batch(self, outputs: List[np.ndarray], img_sizes: List[Tuple[int, int]]) -> List[List[Dict]]:
+        """
+        批量 YOLOv5 后处理：对堆叠的 (N, 255, gh, gw) 输出向量化解码，再逐帧 NMS
+        """
         num_classes = 80
         prop_box_size = 5 + num_classes  # 85
-        img_w, img_h = img_size
         model_w, model_h = 640.0, 640.0
+        n = len(img_sizes)
+        start = time.perf_counter()
+        
+        # 每帧原图尺寸，用于把框缩放回原图
+        scales = np.array([(w / model_w, h / model_h) for w, h in img_sizes], dtype=np.float32)
         
         all_boxes = []
         all_scores = []
         all_cls = []
+        all_index = []
         
         for branch_idx, out in enumerate(outputs):
-            if not isinstance(out, np.ndarray):
-                out = np.array(out)
+            out = self._as_batch(out)
             
-            out = np.squeeze(out)
-            
-            if out.ndim == 4:
-                out = out[0]
-            
-            if out.ndim != 3:
-                logger.warning(f"Unexpected output shape: {out.shape}")
+            if out.ndim != 4 or out.shape[0] != n:
+                hot_log.warning("Unexpected output shape: %s", out.shape)
                 continue
             
-            c, gh, gw = out.shape
+            _, c, gh, gw = out.shape
             
             if c != prop_box_size * 3:  # 255 = 3 * 85
-                logger.warning(f"Unexpected channels: {c}, expected {prop_box_size * 3}")
+                hot_log.warning("Unexpected channels: %d, expected %d", c, prop_box_size * 3)
                 continue
             
             stride = model_h / float(gh)
-            branch_anchors = self.ANCHORS[branch_idx]
+            out = out.reshape(n, 3, prop_box_size, gh, gw)
+            
+            # 置信度过滤：box_conf 与 box_conf * cls_score 都不低于阈值
+            box_conf = out[:, :, 4]
+            cls_scores = out[:, :, 5:]
+            cls_ids = cls_scores.argmax(axis=2)
+            score = box_conf * np.take_along_axis(cls_scores, cls_ids[:, :, np.newaxis], axis=2)[:, :, 0]
+            mask = (box_conf >= self.conf_threshold) & (score >= self.conf_threshold)
+            
+            bi, ai, iy, ix = np.nonzero(mask)
+            if bi.size == 0:
+                continue
+            
+            # 解码 bbox (YOLOv5 使用 sigmoid + anchor)
+            xywh = out[bi, ai, :4, iy, ix].astype(np.float32)
+            xywh = 1.0 / (1.0 + np.exp(-xywh))
+            anchors = self.ANCHORS[branch_idx][ai]
+            bx = (xywh[:, 0] * 2.0 - 0.5 + ix) * stride
+            by = (xywh[:, 1] * 2.0 - 0.5 + iy) * stride
+            bw = (xywh[:, 2] * 2.0) ** 2 * anchors[:, 0]
+            bh = (xywh[:, 3] * 2.0) ** 2 * anchors[:, 1]
             
-            for a in range(3):
-                base_c = prop_box_size * a
-                for iy in range(gh):
-                    for ix in range(gw):
-                        # 读取 box confidence
-                        box_conf = float(out[base_c + 4, iy, ix])
-                        
-                        if box_conf < self.conf_threshold:
-                            continue
-                        
-                        # 读取类别分数
-                        cls_scores = out[base_c + 5 : base_c + 5 + num_classes, iy, ix]
-                        cls_id = int(np.argmax(cls_scores))
-                        cls_score = float(cls_scores[cls_id])
-                        
-                        # 最终置信度 = box_conf * cls_score
-                        score = box_conf * cls_score
-                        
-                        if score < self.conf_threshold:
-                            continue
-                        
-                        # 解码 bbox (YOLOv5 使用 sigmoid + anchor)
-                        bx = float(out[base_c + 0, iy, ix])
-                        by = float(out[base_c + 1, iy, ix])
-                        bw = float(out[base_c + 2, iy, ix])
-                        bh = float(out[base_c + 3, iy, ix])
-                        
-                        # Sigmoid activation
-                        bx = 1.0 / (1.0 + np.exp(-bx))
-                        by = 1.0 / (1.0 + np.exp(-by))
-                        bw = 1.0 / (1.0 + np.exp(-bw))
-                        bh = 1.0 / (1.0 + np.exp(-bh))
-                        
-                        # Decode
-                        bx = (bx * 2.0 - 0.5 + float(ix)) * stride
-                        by = (by * 2.0 - 0.5 + float(iy)) * stride
-                        bw = (bw * 2.0) ** 2 * float(branch_anchors[a, 0])
-                        bh = (bh * 2.0) ** 2 * float(branch_anchors[a, 1])
-                        
-                        # Convert to xyxy
-                        x1 = bx - bw / 2.0
-                        y1 = by - bh / 2.0
-                        x2 = bx + bw / 2.0
-                        y2 = by + bh / 2.0
-                        
-                        # Scale to original image
-                        scale_x = img_w / model_w
-                        scale_y = img_h / model_h
-                        x1 *= scale_x
-                        x2 *= scale_x
-                        y1 *= scale_y
-                        y2 *= scale_y
-                        
-                        all_boxes.append([x1, y1, x2, y2])
-                        all_scores.append(score)
-                        all_cls.append(cls_id)
+            # Convert to xyxy and scale to original image
+            sx = scales[bi, 0]
+            sy = scales[bi, 1]
+            all_boxes.append(np.stack([(bx - bw / 2.0) * sx, (by - bh / 2.0) * sy,
+                                       (bx + bw / 2.0) * sx, (by + bh / 2.0) * sy], axis=1))
+            all_scores.append(score[bi, ai, iy, ix])
+            all_cls.append(cls_ids[bi, ai, iy, ix])
+            all_index.append(bi)
         
         if not all_boxes:
-            return []
+            _DECODE_TIME.observe(time.perf_counter() - start)
+            return [[] for _ in range(n)]
         
-        # NMS
-        boxes_xyxy = np.array(all_boxes, dtype=np.float32)
-        scores = np.array(all_scores, dtype=np.float32)
-        cls_ids = np.array(all_cls, dtype=np.int32)
+        boxes_xyxy = np.concatenate(all_boxes).astype(np.float32)
+        scores = np.concatenate(all_scores).astype(np.float32)
+        cls_ids = np.concatenate(all_cls).astype(np.int32)
+        frame_index = np.concatenate(all_index)
+        _DECODE_TIME.observe(time.perf_counter() - start)
         
+        results = []
+        for i, (img_w, img_h) in enumerate(img_sizes):
+            selected = np.nonzero(frame_index == i)[0]
+            if selected.size == 0:
+                results.append([])
+                continue
+            results.append(self._build_results(boxes_xyxy[selected], scores[selected],
+                                               cls_ids[selected], img_w, img_h))
+        return results
+    
+    def _build_results(self, boxes_xyxy: np.ndarray, scores: np.ndarray, cls_ids: np.ndarray,
+                       img_w: int, img_h: int) -> List[Dict]:
+        """单帧 NMS、过滤并生成检测结果"""
+        start = time.perf_counter()
         keep = self._nms(boxes_xyxy, scores, self.iou_threshold)
+        _NMS_TIME.observe(time.perf_counter() - start)
         
         # Build results
         results = []
@@ -265,6 +308,10 @@ class YOLODetector:
             if x2 <= x1 or y2 <= y1:
                 continue
             
+            # 镜像作为坐标变换在框反映射时完成，无需翻转整帧
+            if self.mirror:
+                x1, x2 = img_w - x2, img_w - x1
+            
             label = self.COCO_NAMES[cls_id] if cls_id < len(self.COCO_NAMES) else f"class_{cls_id}"
             category = self._get_category(label)
             
@@ -8,9 +8,25 @@ import cv2
 import numpy as np
 import logging
 import os
+import time
 from typing import List, Tuple, Dict, Optional
 
+from .log import LazyArg, RateLimitedLogger
+from .metrics import stage_histogram
+
 logger = logging.getLogger(__name__)
+hot_log = RateLimitedLogger(logger)
+
+# 各环节耗时（与 NPU 检测器共用同名指标）
+_PREPROCESS_TIME = stage_histogram("preprocess")
+_INFERENCE_TIME = stage_histogram("inference")
+_DECODE_TIME = stage_histogram("decode")
+_NMS_TIME = stage_histogram("nms")
+
+
+def _labels(detections: List[Dict]) -> List[str]:
+    """检测结果的类别名（日志用）"""
+    return [d['label'] for d in detections]
 
 
 class YOLODetectorCPU:
@@ -31,14 +47,16 @@ class YOLODetectorCPU:
 
     def __init__(self, model_path: str, input_size: Tuple[int, int] = (640, 640),
                  conf_threshold: float = 0.5, iou_threshold: float = 0.3,
-                 min_box_size: int = 50):
+                 min_box_size: int = 50, mirror: bool = False):
         self.model_path = model_path
         self.input_size = input_size
         self.conf_threshold = conf_threshold
         self.iou_threshold = iou_threshold
         self.min_box_size = min_box_size
+        self.mirror = mirror  # 输入为未镜像画面，输出框映射到镜像坐标
         self.net = None
         self.initialized = False
+        self._dynamic_batch = True  # 模型是否支持整批推理（失败后改为逐帧）
 
         # 类别映射
         self.category_map = {
@@ -79,30 +97,54 @@ class YOLODetectorCPU:
 
     def preprocess(self, frame: np.ndarray) -> np.ndarray:
         """预处理图像"""
-        img = cv2.resize(frame, self.input_size)
-        blob = cv2.dnn.blobFromImage(img, 1/255.0, self.input_size, swapRB=True, crop=False)
-        return blob
+        return self.preprocess_batch([frame])
+
+    def preprocess_batch(self, frames: List[np.ndarray]) -> np.ndarray:
+        """批量预处理，返回连续的 (N, 3, H, W) 张量"""
+        return cv2.dnn.blobFromImages(frames, 1/255.0, self.input_size, swapRB=True, crop=False)
 
     def detect(self, frame: np.ndarray) -> List[Dict]:
         """检测目标"""
-        if not self.initialized:
-            return []
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        """
+        批量检测多帧，返回每帧的检测结果
+        模型支持动态批大小时整批推理，否则逐帧推理；解码对整批一次完成
+        """
+        if not self.initialized or not frames:
+            return [[] for _ in frames]
 
         # 模拟模式：随机生成检测结果用于测试
         if hasattr(self, 'simulation_mode') and self.simulation_mode:
-            return self._simulate_detection(frame)
+            return [self._simulate_detection(frame) for frame in frames]
 
         try:
-            blob = self.preprocess(frame)
-            self.net.setInput(blob)
-            outputs = self.net.forward()
-
-            detections = self._parse_outputs(outputs, frame.shape)
-            return detections
+            start = time.perf_counter()
+            blob = self.preprocess_batch(frames)
+            preprocessed = time.perf_counter()
+            _PREPROCESS_TIME.observe(preprocessed - start)
+            outputs = None
+            if len(frames) > 1 and self._dynamic_batch:
+                try:
+                    self.net.setInput(blob)
+                    outputs = self.net.forward()
+                except cv2.error:
+                    # 固定批大小的模型，之后都逐帧推理
+                    self._dynamic_batch = False
+            if outputs is None:
+                per_frame = []
+                for i in range(len(frames)):
+                    self.net.setInput(blob[i:i + 1])
+                    per_frame.append(self.net.forward())
+                outputs = np.concatenate(per_frame)
+            _INFERENCE_TIME.observe(time.perf_counter() - preprocessed)
+
+            return self._parse_outputs_batch(outputs, [frame.shape for frame in frames])
 
         except Exception as e:
-            logger.error(f"CPU 检测失败: {e}")
-            return []
+            hot_log.error("CPU 检测失败: %s", e)
+            return [[] for _ in frames]
 
     def _simulate_detection(self, frame: np.ndarray) -> List[Dict]:
         """模拟检测 - 用于测试"""
@@ -171,46 +213,74 @@ class YOLODetectorCPU:
                 "center": (cx, cy)
             })
 
-        logger.info(f"[模拟模式] 生成 {len(detections)} 个模拟检测框: {[d['label'] for d in detections]}")
+        hot_log.info("[模拟模式] 生成 %d 个模拟检测框: %s", len(detections),
+                     LazyArg(_labels, detections))
 
         return detections
 
     def _parse_outputs(self, outputs, orig_shape) -> List[Dict]:
         """解析模型输出"""
-        detections = []
-        h, w = orig_shape[:2]
+        return self._parse_outputs_batch(outputs, [orig_shape])[0]
 
+    def _parse_outputs_batch(self, outputs, orig_shapes) -> List[List[Dict]]:
+        """
+        批量解析模型输出：(N, 行数, 5 + 类别数) 上一次性完成类别选择与阈值过滤，
+        只对通过阈值的行逐个生成结果
+        """
         # 这里需要根据实际的 ONNX 模型输出格式调整
         # 简化版本：假设输出格式与 YOLOv5 类似
-        for detection in outputs:
-            scores = detection[5:]
-            class_id = np.argmax(scores)
-            confidence = scores[class_id]
-
-            if confidence > self.conf_threshold:
-                center_x = int(detection[0] * w)
-                center_y = int(detection[1] * h)
-                width = int(detection[2] * w)
-                height = int(detection[3] * h)
-
-                x1 = max(0, center_x - width // 2)
-                y1 = max(0, center_y - height // 2)
-                x2 = min(w, center_x + width // 2)
-                y2 = min(h, center_y + height // 2)
-
-                label = self.COCO_NAMES[class_id] if class_id < len(self.COCO_NAMES) else f"class_{class_id}"
-                func_category = self._get_function_category(label)
-
-                detections.append({
-                    "class": class_id,
-                    "label": label,
-                    "category": func_category,
-                    "confidence": float(confidence),
-                    "bbox": (x1, y1, x2, y2),
-                    "center": ((x1 + x2) // 2, (y1 + y2) // 2)
-                })
-
-        return self._nms(detections)
+        start = time.perf_counter()
+        outputs = np.asarray(outputs)
+        outputs = outputs.reshape(len(orig_shapes), -1, outputs.shape[-1])
+        scores = outputs[:, :, 5:]
+        class_ids = scores.argmax(axis=2)
+        confidences = np.take_along_axis(scores, class_ids[:, :, np.newaxis], axis=2)[:, :, 0]
+        keep = confidences > self.conf_threshold
+        _DECODE_TIME.observe(time.perf_counter() - start)
+
+        results = []
+        for i, orig_shape in enumerate(orig_shapes):
+            rows = np.nonzero(keep[i])[0]
+            results.append(self._build_detections(outputs[i, rows], class_ids[i, rows],
+                                                  confidences[i, rows], orig_shape))
+        return results
+
+    def _build_detections(self, rows, class_ids, confidences, orig_shape) -> List[Dict]:
+        """单帧：把通过阈值的行转换为检测结果并做 NMS"""
+        detections = []
+        h, w = orig_shape[:2]
+
+        for detection, class_id, confidence in zip(rows, class_ids, confidences):
+            center_x = int(detection[0] * w)
+            center_y = int(detection[1] * h)
+            width = int(detection[2] * w)
+            height = int(detection[3] * h)
+
+            x1 = max(0, center_x - width // 2)
+            y1 = max(0, center_y - height // 2)
+            x2 = min(w, center_x + width // 2)
+            y2 = min(h, center_y + height // 2)
+
+            # 镜像作为坐标变换在框反映射时完成
+            if self.mirror:
+                x1, x2 = w - x2, w - x1
+
+            label = self.COCO_NAMES[class_id] if class_id < len(self.COCO_NAMES) else f"class_{class_id}"
+            func_category = self._get_function_category(label)
+
+            detections.append({
+                "class": class_id,
+                "label": label,
+                "category": func_category,
+                "confidence": float(confidence),
+                "bbox": (x1, y1, x2, y2),
+                "center": ((x1 + x2) // 2, (y1 + y2) // 2)
+            })
+
+        start = time.perf_counter()
+        detections = self._nms(detections)
+        _NMS_TIME.observe(time.perf_counter() - start)
+        return detections
 
     def _get_function_category(self, label: str) -> str:
         """获取功能类别"""
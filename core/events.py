@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+状态事件推送
+记录每个状态字段最后一次变化时的版本号，订阅者按自己已收到的版本号取增量，
+字段值没有变化时不产生事件，供 Server-Sent Events 推送给网页
+"""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+class StatusEvents:
+    """
+    状态增量发布
+    - update(): 写入字段，只有值发生变化时版本号加一并唤醒订阅者
+    - wait(): 阻塞等待比 after_version 更新的字段，返回 (版本号, 增量)
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._version = 0
+        self._fields: Dict[str, Tuple[int, Any]] = {}  # 字段 -> (变化时的版本号, 值)
+        self._closed = False
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def update(self, fields: Dict[str, Any]) -> bool:
+        """写入字段，有变化返回 True"""
+        with self._cond:
+            changed = [k for k, v in fields.items() if k not in self._fields or self._fields[k][1] != v]
+            if not changed:
+                return False
+            self._version += 1
+            for key in changed:
+                self._fields[key] = (self._version, fields[key])
+            self._cond.notify_all()
+            return True
+
+    def snapshot(self) -> Tuple[int, Dict[str, Any]]:
+        """全部字段的 (版本号, 当前值)"""
+        with self._cond:
+            return self._version, {k: v for k, (_, v) in self._fields.items()}
+
+    def wait(self, after_version: int, timeout: Optional[float] = None) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        等待比 after_version 更新的字段，返回 (版本号, 变化的字段)，超时时增量为空
+        关闭时返回 None
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self._version > after_version, timeout)
+            if self._closed:
+                return None
+            delta = {k: v for k, (ver, v) in self._fields.items() if ver > after_version}
+            return self._version, delta
+
+    def close(self):
+        """唤醒所有订阅者"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+离线帧源 - 播放视频文件或图片目录
+接口与 Camera 一致（open / read / read_frame / wait_frame / is_opened / release），
+可直接替换摄像头，在开发机上用录制素材重复测试与分析完整处理流程
+"""
+
+import os
+import threading
+import time
+import logging
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .camera import Frame, FrameRingBuffer
+from .metrics import stage_histogram
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+_CAPTURE_TIME = stage_histogram("capture")  # 解码耗时，与摄像头共用指标
+
+
+class FileSource:
+    """
+    文件帧源
+    - 视频文件（MP4 / MJPEG 等 OpenCV 可解码的格式）或图片目录（按文件名排序）
+    - realtime=True 按原始帧率播放；False 时尽快播放，但每帧都等处理方取走后才解码下一帧，
+      保证每次运行处理的帧序列完全一致
+    - loop=True 播放到结尾后从头循环，否则结束后 is_opened() 返回 False
+    """
+
+    def __init__(self, path: str, fps: Optional[float] = None, realtime: bool = True,
+                 loop: bool = True, width: Optional[int] = None, height: Optional[int] = None,
+                 buffer_slots: int = 4):
+        self.path = path
+        self.fps = fps            # None 时使用视频自身帧率（图片目录默认 30）
+        self.realtime = realtime
+        self.loop = loop
+        self.width = width        # 指定时缩放到该尺寸
+        self.height = height
+        self.cap: Optional[cv2.VideoCapture] = None
+        self._images: List[str] = []
+        self._index = 0
+        self._running = False
+        self._finished = False
+        self._buffer = FrameRingBuffer(buffer_slots)
+        self._thread: Optional[threading.Thread] = None
+
+        # 尽快播放模式下的消费确认
+        self._consume_cond = threading.Condition()
+        self._consumed_seq = 0
+
+        # 播放统计
+        self._stats_lock = threading.Lock()
+        self._captured = 0
+        self._loops = 0
+
+    def open(self) -> bool:
+        """打开文件或图片目录并启动播放线程"""
+        if self._running:
+            return True
+
+        if os.path.isdir(self.path):
+            self._images = sorted(
+                os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            if not self._images:
+                logger.error(f"图片目录为空: {self.path}")
+                return False
+            self.fps = self.fps or 30.0
+            logger.info(f"图片序列打开成功: {self.path}, {len(self._images)} 帧, {self.fps:.1f} FPS")
+        else:
+            cap = cv2.VideoCapture(self.path)
+            if not cap.isOpened():
+                logger.error(f"无法打开视频文件: {self.path}")
+                cap.release()
+                return False
+            self.cap = cap
+            native_fps = cap.get(cv2.CAP_PROP_FPS)
+            self.fps = self.fps or (native_fps if native_fps and native_fps > 0 else 30.0)
+            frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            logger.info(f"视频文件打开成功: {self.path}, {frames} 帧, {self.fps:.1f} FPS")
+
+        self._index = 0
+        self._finished = False
+        self._running = True
+        self._buffer.reopen()
+        self._thread = threading.Thread(target=self._play_loop, name="file-source", daemon=True)
+        self._thread.start()
+        return True
+
+    def _read_next(self, slot: Optional[np.ndarray]) -> Tuple[bool, Optional[np.ndarray]]:
+        """读取下一帧（视频直接解码到槽位），到结尾返回 (False, None)"""
+        if self.cap is not None:
+            return self.cap.read(slot) if slot is not None else self.cap.read()
+
+        while self._index < len(self._images):
+            image = cv2.imread(self._images[self._index])
+            self._index += 1
+            if image is not None:
+                return True, image
+            logger.warning(f"无法读取图片: {self._images[self._index - 1]}")
+        return False, None
+
+    def _rewind(self) -> bool:
+        """回到开头，成功返回 True"""
+        self._index = 0
+        if self.cap is not None:
+            return self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return True
+
+    def _play_loop(self):
+        """播放线程：解码、按节拍发布"""
+        period = 1.0 / self.fps
+        next_time = time.monotonic()
+        shape = None
+
+        while self._running:
+            slot = self._buffer.next_slot(shape) if shape is not None else None
+            decode_start = time.perf_counter()
+            ret, frame = self._read_next(slot)
+
+            if not ret or frame is None:
+                if self.loop and self._captured > 0 and self._rewind():
+                    with self._stats_lock:
+                        self._loops += 1
+                    continue
+                logger.info(f"文件播放结束: {self.path}")
+                self._finished = True
+                break
+
+            if self.width and self.height and frame.shape[:2] != (self.height, self.width):
+                frame = cv2.resize(frame, (self.width, self.height))
+            shape = frame.shape
+            _CAPTURE_TIME.observe(time.perf_counter() - decode_start)
+
+            if self.realtime:
+                # 按原始帧率节拍发布，落后时不追帧
+                next_time = max(next_time + period, time.monotonic())
+                time.sleep(max(0.0, next_time - time.monotonic()))
+
+            seq = self._buffer.publish(frame, time.monotonic())
+            with self._stats_lock:
+                self._captured += 1
+
+            if not self.realtime:
+                # 等处理方取走本帧后再解码下一帧
+                with self._consume_cond:
+                    while self._running and self._consumed_seq < seq:
+                        self._consume_cond.wait(0.5)
+
+        # 唤醒等待帧的处理线程
+        self._buffer.close()
+
+    def get_stats(self) -> dict:
+        """播放统计"""
+        with self._stats_lock:
+            return {
+                "source": self.path,
+                "captured": self._captured,
+                "dropped": 0,
+                "loops": self._loops,
+                "fps": round(self.fps or 0.0, 2),
+                "realtime": self.realtime,
+                "finished": self._finished,
+            }
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """读取当前帧（兼容接口，返回可写副本）"""
+        frame = self._buffer.latest()
+        if frame is not None:
+            return True, frame.image.copy()
+        return False, None
+
+    def read_frame(self) -> Optional[Frame]:
+        """读取最新帧（零拷贝只读视图 + 序号 + 时间戳）"""
+        return self._buffer.latest()
+
+    def frame_near(self, timestamp: float) -> Optional[Frame]:
+        """最近几帧中采集时间最接近 timestamp 的一帧"""
+        return self._buffer.nearest(timestamp)
+
+    def wait_frame(self, after_seq: int = 0, timeout: Optional[float] = None) -> Optional[Frame]:
+        """阻塞等待比 after_seq 更新的帧（同时确认 after_seq 及之前的帧已处理）"""
+        if not self.realtime:
+            with self._consume_cond:
+                if after_seq > self._consumed_seq:
+                    self._consumed_seq = after_seq
+                    self._consume_cond.notify_all()
+        return self._buffer.wait_newer(after_seq, timeout)
+
+    def frame_valid(self, seq: int) -> bool:
+        """序号为 seq 的帧视图是否仍未被覆盖"""
+        return self._buffer.is_valid(seq)
+
+    def is_opened(self) -> bool:
+        """是否仍在播放"""
+        return self._running and not self._finished
+
+    @property
+    def finished(self) -> bool:
+        """已播放到结尾（loop=False）"""
+        return self._finished
+
+    @property
+    def closed(self) -> bool:
+        """播放已结束或已释放，不会再有新帧"""
+        return self._buffer.closed
+
+    @property
+    def released(self) -> bool:
+        """已调用 release()（缓冲区关闭是主动停止，而非读取失败）"""
+        return not self._running
+
+    def release(self):
+        """停止播放并释放资源"""
+        self._running = False
+        with self._consume_cond:
+            self._consume_cond.notify_all()
+        self._buffer.close()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+        logger.info("文件帧源已释放")
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+日志工具
+- setup_logging(): 根日志器只挂一个 QueueHandler，格式化与控制台/文件输出由后台线程完成，
+  队列满时丢弃并计数，处理线程不会因为日志 I/O 阻塞
+- RateLimitedLogger: 热路径日志，按调用位置限频（每 interval 秒最多一条）或采样（每 N 次一条），
+  级别未启用或被限频时不格式化消息；恢复输出时附带期间省略的条数
+热路径上使用 %-格式参数（logger.info("x=%d", x)），消息在后台线程才格式化，参数应为不可变值；
+需要计算才能得到的参数用 LazyArg 包装，只有真正输出时才计算
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+# RateLimitedLogger 未指定 interval 时的默认限频间隔（秒），setup_logging 可修改
+_default_interval = 5.0
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """不在调用线程格式化、队列满时丢弃的 QueueHandler"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 同进程内的队列无需序列化，保留 msg/args 由后台线程格式化
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LazyArg:
+    """延迟计算的日志参数：格式化消息时才调用 func(*args)，被限频或级别未启用时不产生开销"""
+
+    __slots__ = ("_func", "_args")
+
+    def __init__(self, func, *args):
+        self._func = func
+        self._args = args
+
+    def __str__(self) -> str:
+        return str(self._func(*self._args))
+
+    __repr__ = __str__
+
+
+def setup_logging(level: str = "INFO", fmt: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                  queue_size: int = 10000, rate_limit_interval: float = 5.0) -> logging.handlers.QueueListener:
+    """配置根日志器：QueueHandler -> 后台线程 -> 控制台（重复调用时返回已有的后台线程）"""
+    global _listener, _default_interval
+    _default_interval = rate_limit_interval
+    if _listener is not None:
+        return _listener
+
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(logging.Formatter(fmt))
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+    root = logging.getLogger()
+    root.handlers = [_NonBlockingQueueHandler(log_queue)]
+    root.setLevel(getattr(logging, level) if isinstance(level, str) else level)
+
+    _listener = logging.handlers.QueueListener(log_queue, console, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """停止后台线程（先输出队列中剩余的日志）"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    """因队列满被丢弃的日志条数"""
+    return sum(getattr(h, "dropped", 0) for h in logging.getLogger().handlers)
+
+
+class RateLimitedLogger:
+    """
+    按调用位置限频的日志器
+    - info/warning/...(msg, *args, every=秒, sample=N): every 为限频间隔（默认模块级间隔），sample 为每 N 次输出一次
+    - 调用位置由调用方的代码对象与行号确定，无需为每处日志命名
+    """
+
+    def __init__(self, logger: logging.Logger, interval: Optional[float] = None):
+        self.logger = logger
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._sites: Dict[tuple, list] = {}  # 调用位置 -> [上次输出时间, 调用次数, 省略条数]
+
+    def _log(self, level: int, msg: str, args: tuple, every: Optional[float], sample: Optional[int],
+             exc_info: bool = False):
+        if not self.logger.isEnabledFor(level):
+            return
+        caller = sys._getframe(2)
+        key = (caller.f_code, caller.f_lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = [float("-inf"), 0, 0]
+            site[1] += 1
+            if sample:
+                emit = (site[1] - 1) % sample == 0
+            else:
+                interval = every if every is not None else (
+                    self.interval if self.interval is not None else _default_interval)
+                emit = now - site[0] >= interval
+            if not emit:
+                site[2] += 1
+                return
+            suppressed, site[0], site[2] = site[2], now, 0
+
+        if suppressed:
+            msg = f"{msg} (省略 {suppressed} 条)"
+        # stacklevel=3: 记录中的文件与行号指向调用方
+        self.logger.log(level, msg, *args, exc_info=exc_info, stacklevel=3)
+
+    def debug(self, msg: str, *args, every: Optional[float] = None, sample: Optional[int] = None):
+        self._log(logging.DEBUG, msg, args, every, sample)
+
+    def info(self, msg: str, *args, every: Optional[float] = None, sample: Optional[int] = None):
+        self._log(logging.INFO, msg, args, every, sample)
+
+    def warning(self, msg: str, *args, every: Optional[float] = None, sample: Optional[int] = None):
+        self._log(logging.WARNING, msg, args, every, sample)
+
+    def error(self, msg: str, *args, every: Optional[float] = None, sample: Optional[int] = None):
+        self._log(logging.ERROR, msg, args, every, sample)
+
+    def exception(self, msg: str, *args, every: Optional[float] = None, sample: Optional[int] = None):
+        """记录 ERROR 并附带当前异常的堆栈（异常处理块内调用）"""
+        self._log(logging.ERROR, msg, args, every, sample, exc_info=True)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+性能指标
+固定桶直方图记录各环节耗时与帧龄，热路径上每次记录只是一次二分查找与几次计数，
+只有在 /api/metrics 被抓取时才汇总成 Prometheus 文本格式
+"""
+
+import bisect
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# 默认桶上限（秒）：0.5 ms ~ 2 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+
+
+class Histogram:
+    """
+    固定桶直方图
+    每个桶只计本桶内的次数，导出时再累加成 Prometheus 要求的累计计数
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, registry: "Optional[MetricsRegistry]" = None):
+        self.buckets = tuple(sorted(buckets))
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float):
+        """记录一次观测值（秒）"""
+        if self._registry is not None and not self._registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """(各桶累计计数, 总和, 次数)"""
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        cumulative = []
+        running = 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._sum = 0.0
+            self._count = 0
+
+
+class MetricsRegistry:
+    """直方图登记与 Prometheus 文本导出"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._help: Dict[str, str] = {}
+        self._metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+
+    def histogram(self, name: str, help_text: str = "", **labels: str) -> Histogram:
+        """获取（不存在时创建）带标签的直方图；热路径应在初始化时取得并保存引用"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._metrics.get(key)
+            if hist is None:
+                hist = Histogram(self.buckets, self)
+                self._metrics[key] = hist
+                if help_text:
+                    self._help.setdefault(name, help_text)
+            return hist
+
+    def reset(self):
+        """清零所有直方图"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for hist in metrics:
+            hist.reset()
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式 (text/plain; version=0.0.4)"""
+        with self._lock:
+            items = sorted(self._metrics.items())
+            help_texts = dict(self._help)
+
+        lines = []
+        current = None
+        for (name, labels), hist in items:
+            if name != current:
+                current = name
+                if name in help_texts:
+                    lines.append(f"# HELP {name} {help_texts[name]}")
+                lines.append(f"# TYPE {name} histogram")
+
+            cumulative, total, count = hist.snapshot()
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            prefix = label_text + "," if label_text else ""
+            for bound, c in zip(hist.buckets, cumulative):
+                lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {c}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {cumulative[-1]}')
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{name}_sum{suffix} {total:.6f}")
+            lines.append(f"{name}_count{suffix} {count}")
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标（各模块在导入时取得自己的直方图）
+METRICS = MetricsRegistry()
+
+
+def stage_histogram(stage: str) -> Histogram:
+    """某个处理环节的耗时直方图"""
+    return METRICS.histogram("robot_stage_seconds", "Processing time per stage in seconds", stage=stage)
+
+
+def frame_age_histogram(stage: str) -> Histogram:
+    """帧在某个流水线阶段处理完成时的帧龄（距采集）直方图"""
+    return METRICS.histogram("robot_frame_age_seconds", "Frame age (since capture) when a pipeline stage finishes, in seconds",
+                             stage=stage)
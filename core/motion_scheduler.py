@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+运动调度器 - 单线程独占舵机
+按优先级调度手动 / 动作 / 跟踪请求，支持抢占与取消，
+并以固定控制频率对轨迹采样后输出
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from .trajectory import Trajectory, TrajectoryGenerator
+
+logger = logging.getLogger(__name__)
+
+
+class MotionPriority:
+    """运动优先级（数值越小越优先）"""
+    MANUAL = 0    # 手动控制（回中心等）
+    GESTURE = 1   # 动作序列（点头、摇头、转圈）
+    TRACKING = 2  # 目标跟踪
+
+
+class MotionRequest:
+    """
+    运动请求
+    waypoints: [(offset_x, offset_y, duration_s), ...]，每段从上一位置规划轨迹到目标，
+               duration_s 为该段最短时长
+    follow: 在线跟随最后一个路点（跟踪用），目标更新时速度保持连续
+    start_command: 开始时执行一次的命令（如触发固件动作），返回 False 视为失败
+    hold: start_command 之后独占舵机、不输出插值的时长（秒）
+    """
+
+    def __init__(self, priority: int, waypoints: List[Tuple[float, float, float]],
+                 name: str = "", delay_ms: int = 3,
+                 start_command: Optional[Callable[[], bool]] = None, hold: float = 0.0,
+                 follow: bool = False):
+        self.priority = priority
+        self.waypoints = waypoints
+        self.name = name
+        self.delay_ms = delay_ms
+        self.start_command = start_command
+        self.hold = hold
+        self.follow = follow
+
+        self.cancelled = False
+        self.done = threading.Event()
+
+        # 运行时状态（仅调度线程访问）
+        self.started_at = 0.0
+        self.segment = 0
+        self.segment_start = 0.0
+        self.segment_from = (0.0, 0.0)
+        self.trajectory: Optional[Trajectory] = None
+
+    @property
+    def duration(self) -> float:
+        """请求总时长（秒）"""
+        return self.hold + sum(w[2] for w in self.waypoints)
+
+
+class MotionScheduler:
+    """运动调度器，唯一允许写舵机的线程"""
+
+    def __init__(self, write_fn: Callable[[int, int, int], bool], control_rate: float = 50.0,
+                 generator: Optional[TrajectoryGenerator] = None):
+        """
+        write_fn: 实际发送命令的函数 (offset_x, offset_y, delay_ms) -> bool
+        control_rate: 控制频率 (Hz)
+        generator: 轨迹生成器，None 时使用线性插值
+        """
+        self._write = write_fn
+        self.period = 1.0 / control_rate
+        self.generator = generator
+
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._queue: list = []  # 堆: (priority, 序号, request)
+        self._counter = itertools.count()
+        self._current: Optional[MotionRequest] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # 当前输出偏移与速度（浮点，轨迹起点）
+        self.position = (0.0, 0.0)
+        self.velocity = (0.0, 0.0)
+        self._last_written: Optional[Tuple[int, int]] = None
+
+    def start(self):
+        """启动调度线程"""
+        if self._running:
+            return
+        self._running = True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="motion-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止调度线程并取消所有请求"""
+        with self._cond:
+            self._running = False
+            self._cancel_locked(None)
+            self._cond.notify_all()
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def submit(self, request: MotionRequest) -> bool:
+        """
+        提交运动请求
+        - 更高优先级的请求抢占当前请求
+        - 跟踪请求只保留最新一个，被更高优先级占用时直接丢弃
+        """
+        with self._cond:
+            if not self._running:
+                return False
+
+            if request.priority == MotionPriority.TRACKING:
+                if self._busy_locked(MotionPriority.GESTURE):
+                    return False
+                self._cancel_locked(MotionPriority.TRACKING)
+
+            current = self._current
+            if current is not None and request.priority < current.priority:
+                logger.debug("运动请求 %s 抢占 %s", request.name or request.priority, current.name or current.priority)
+                self._finish_locked(current, cancelled=True)
+                # 被抢占后，排队中的低优先级跟踪目标已过期
+                self._cancel_locked(MotionPriority.TRACKING)
+
+            heapq.heappush(self._queue, (request.priority, next(self._counter), request))
+            self._cond.notify_all()
+            return True
+
+    def invalidate(self):
+        """使输出缓存失效（重连后下一次输出必定写出）"""
+        with self._cond:
+            self._last_written = None
+
+    def cancel(self, priority: Optional[int] = None):
+        """取消指定优先级（None 表示全部）的当前与排队请求"""
+        with self._cond:
+            self._cancel_locked(priority)
+            self._cond.notify_all()
+
+    def is_busy(self, priority: int) -> bool:
+        """是否有不低于指定优先级的请求正在执行或排队"""
+        with self._cond:
+            return self._busy_locked(priority)
+
+    def remaining(self, priority: int) -> float:
+        """不低于指定优先级的请求剩余时长（秒）"""
+        now = time.monotonic()
+        with self._cond:
+            total = 0.0
+            current = self._current
+            if current is not None and current.priority <= priority:
+                total += max(0.0, current.started_at + current.duration - now)
+            total += sum(r.duration for p, _, r in self._queue if p <= priority)
+            return total
+
+    # ==================== 内部实现 ====================
+
+    def _busy_locked(self, priority: int) -> bool:
+        if self._current is not None and self._current.priority <= priority:
+            return True
+        return any(p <= priority for p, _, _ in self._queue)
+
+    def _cancel_locked(self, priority: Optional[int]):
+        current = self._current
+        if current is not None and (priority is None or current.priority == priority):
+            self._finish_locked(current, cancelled=True)
+        kept = []
+        for entry in self._queue:
+            if priority is None or entry[0] == priority:
+                entry[2].cancelled = True
+                entry[2].done.set()
+            else:
+                kept.append(entry)
+        if len(kept) != len(self._queue):
+            self._queue = kept
+            heapq.heapify(self._queue)
+
+    def _finish_locked(self, request: MotionRequest, cancelled: bool = False):
+        request.cancelled = request.cancelled or cancelled
+        request.done.set()
+        if self._current is request:
+            self._current = None
+
+    def _begin_locked(self, request: MotionRequest, now: float):
+        request.started_at = now
+        request.segment = 0
+        request.segment_start = now + request.hold
+        request.segment_from = self.position
+        request.trajectory = None
+        if not request.follow:
+            # 点到点轨迹从静止开始
+            self.velocity = (0.0, 0.0)
+        self._current = request
+
+    def _advance_locked(self, request: MotionRequest, now: float) -> Optional[Tuple[float, float]]:
+        """推进请求，返回本周期的目标偏移（保持阶段返回 None）"""
+        if now < request.segment_start:
+            return None
+
+        if request.follow:
+            return self._follow_locked(request)
+
+        while request.segment < len(request.waypoints):
+            x, y, duration = request.waypoints[request.segment]
+            if request.trajectory is None:
+                request.trajectory = self._plan(request.segment_from, (float(x), float(y)), duration)
+            elapsed = now - request.segment_start
+            if elapsed < request.trajectory.duration:
+                return request.trajectory.sample(elapsed)
+            # 本段结束，累计起点避免时间漂移
+            request.segment_from = (float(x), float(y))
+            request.segment_start += request.trajectory.duration
+            request.segment += 1
+            request.trajectory = None
+
+        self._finish_locked(request)
+        return request.segment_from
+
+    def _follow_locked(self, request: MotionRequest) -> Tuple[float, float]:
+        """在线跟随：每周期向目标推进一步"""
+        x, y, _ = request.waypoints[-1]
+        target = (float(x), float(y))
+        if self.generator is None:
+            self._finish_locked(request)
+            return target
+
+        position, self.velocity = self.generator.follow(self.position, self.velocity, target, self.period)
+        if TrajectoryGenerator.reached(position, self.velocity, target):
+            self._finish_locked(request)
+        return position
+
+    def _plan(self, start: Tuple[float, float], end: Tuple[float, float], duration: float) -> Trajectory:
+        """规划一段点到点轨迹"""
+        if self.generator is None:
+            return Trajectory(start, end, duration, profile="linear")
+        return self.generator.plan(start, end, min_duration=duration)
+
+    def _run(self):
+        """调度主循环：空闲时阻塞等待，有请求时按固定频率输出"""
+        next_tick = time.monotonic()
+
+        while True:
+            start_command = None
+            target = None
+            delay_ms = 3
+
+            with self._cond:
+                while self._running and self._current is None and not self._queue:
+                    self._cond.wait()
+                if not self._running:
+                    break
+
+                now = time.monotonic()
+                request = self._current
+                if request is None:
+                    _, _, request = heapq.heappop(self._queue)
+                    self._begin_locked(request, now)
+                    start_command = request.start_command
+                    next_tick = now
+
+                if start_command is None:
+                    target = self._advance_locked(request, now)
+                    if target is not None:
+                        self.position = target
+                delay_ms = request.delay_ms
+
+            # 串口写入在锁外进行，提交请求的线程永不阻塞
+            try:
+                if start_command is not None and not start_command():
+                    logger.warning(f"运动请求启动失败: {request.name}")
+                    with self._cond:
+                        self._finish_locked(request, cancelled=True)
+                elif target is not None:
+                    point = (int(round(target[0])), int(round(target[1])))
+                    if point != self._last_written and self._write(point[0], point[1], delay_ms):
+                        self._last_written = point
+            except Exception as e:
+                logger.error(f"运动调度输出异常: {e}")
+
+            next_tick += self.period
+            wait = next_tick - time.monotonic()
+            if wait < 0:
+                next_tick = time.monotonic()
+                wait = 0
+            self._stop_event.wait(wait)
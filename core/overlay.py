@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+叠加层合成
+- 静态图层（十字线、网格、固定文字）每种分辨率只光栅化一次，
+  缓存为被绘制像素的下标与颜色，之后每帧按下标写入，耗时与图层像素数成正比
+- 半透明矩形只在矩形区域 (ROI) 内混合，不复制整帧
+"""
+
+from typing import Callable, Dict, Tuple
+
+import cv2
+import numpy as np
+
+
+class StaticLayer:
+    """
+    按分辨率缓存的静态图层
+    draw(canvas) 在给定尺寸的画布上绘制图层内容（任意颜色，包括黑色与抗锯齿边缘）；
+    缓存按字节展开的下标，合成时要求帧为连续内存（翻转、复制与新建的帧都满足）
+    """
+
+    def __init__(self, draw: Callable[[np.ndarray], None]):
+        self._draw = draw
+        self._cache: Dict[Tuple[int, ...], tuple] = {}
+
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        """把图层合成到帧上（就地修改）"""
+        if not frame.flags.c_contiguous:
+            raise ValueError("StaticLayer 只能合成到连续内存的帧")
+        cached = self._cache.get(frame.shape)
+        if cached is None:
+            cached = self._render(frame.shape)
+            self._cache[frame.shape] = cached
+        opaque, values, blended, premul, keep = cached
+
+        flat = frame.reshape(-1)
+        flat[opaque] = values
+        if len(blended):
+            # 半透明边缘: 结果 = 预乘颜色 + 底色 * (1 - alpha)
+            flat[blended] = premul + ((flat[blended] * keep + 127) // 255).astype(np.uint8)
+        return frame
+
+    def _render(self, shape: Tuple[int, ...]) -> tuple:
+        """
+        在全黑与全白两张画布上各绘制一次：
+        黑底结果为预乘颜色，两者之差为底色保留比例 (1 - alpha) * 255，差为 255 的字节不属于图层
+        """
+        dark = np.zeros(shape, dtype=np.uint8)
+        light = np.full(shape, 255, dtype=np.uint8)
+        self._draw(dark)
+        self._draw(light)
+        dark, light = dark.reshape(-1), light.reshape(-1)
+        keep = light.astype(np.int16) - dark
+
+        opaque = np.flatnonzero(keep == 0)
+        blended = np.flatnonzero((keep > 0) & (keep < 255))
+        return opaque, dark[opaque], blended, dark[blended], keep[blended].astype(np.uint16)
+
+
+def blend_rect(frame: np.ndarray, pt1: Tuple[int, int], pt2: Tuple[int, int],
+               color: Tuple[int, int, int], alpha: float) -> np.ndarray:
+    """在 pt1-pt2 矩形内就地混合半透明纯色（只处理矩形区域）"""
+    h, w = frame.shape[:2]
+    x1, y1 = max(0, pt1[0]), max(0, pt1[1])
+    x2, y2 = min(w, pt2[0] + 1), min(h, pt2[1] + 1)
+    if x1 >= x2 or y1 >= y2:
+        return frame
+    roi = frame[y1:y2, x1:x2]
+    roi[:] = cv2.addWeighted(roi, 1 - alpha, np.full_like(roi, color), alpha, 0)
+    return frame
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+采样分析器
+按固定间隔读取 sys._current_frames() 中各线程的调用栈，统计折叠调用栈（火焰图输入）与各函数的采样数；
+不安装任何跟踪钩子，只在一次分析的时间窗口内由调用方线程采样，未分析时没有任何开销
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# 叶子帧位于这些标准库文件时视为等待（条件变量、队列、套接字），默认不计入
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "socket.py", "socketserver.py")
+_THREAD_NAME = re.compile(r"^Thread-\d+ \((.+)\)$")
+
+
+def default_thread_group(name: str) -> str:
+    """线程分组名：未命名线程 "Thread-5 (target)" 归为 target"""
+    match = _THREAD_NAME.match(name)
+    return match.group(1) if match else name
+
+
+class SamplingProfiler:
+    """
+    采样分析器
+    - profile(): 在调用方线程中采样 seconds 秒（调用方线程本身不被采样），同一时间只允许一次分析
+    - 结果中的调用栈以 "线程组;外层函数;...;叶子函数 次数" 的折叠格式输出，可直接交给 flamegraph.pl / speedscope
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64,
+                 group: Callable[[str], str] = default_thread_group):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._group = group
+        self._busy = threading.Lock()
+        self._labels: Dict[object, str] = {}
+
+    @property
+    def active(self) -> bool:
+        return self._busy.locked()
+
+    def profile(self, seconds: float, threads: Optional[Iterable[str]] = None,
+                include_idle: bool = False, top: int = 30) -> Optional[dict]:
+        """
+        采样 seconds 秒并返回结果；已有分析在进行时返回 None
+        threads: 线程组名前缀（如 "stage-", "flask"），为空时采样所有线程
+        """
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            stacks = self._sample(seconds, tuple(threads or ()), include_idle)
+        finally:
+            self._busy.release()
+        return self._summarize(stacks, seconds, top)
+
+    def _sample(self, seconds: float, prefixes: Tuple[str, ...], include_idle: bool) -> Tuple[Counter, int, int]:
+        own = threading.get_ident()
+        stacks: Counter = Counter()
+        rounds = idle = 0
+        end = time.monotonic() + seconds
+        next_time = time.monotonic()
+
+        while time.monotonic() < end:
+            groups = {t.ident: self._group(t.name) for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                group = groups.get(ident)
+                if ident == own or group is None:
+                    continue
+                if prefixes and not group.startswith(prefixes):
+                    continue
+                if not include_idle and os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    idle += 1
+                    continue
+                stacks[(group,) + self._stack(frame)] += 1
+            rounds += 1
+            next_time = max(next_time + self.interval, time.monotonic())
+            time.sleep(max(0.0, next_time - time.monotonic()))
+        return stacks, rounds, idle
+
+    def _stack(self, frame) -> Tuple[str, ...]:
+        """由外到内的函数标签"""
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                name = getattr(code, "co_qualname", code.co_name)
+                label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                self._labels[code] = label
+            labels.append(label)
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels)
+
+    def _summarize(self, sampled: Tuple[Counter, int, int], seconds: float, top: int) -> dict:
+        stacks, rounds, idle = sampled
+        total = sum(stacks.values())
+        threads: Counter = Counter()
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in stacks.items():
+            threads[stack[0]] += count
+            self_counts[stack[-1]] += count
+            for label in set(stack[1:]):  # 递归调用只计一次
+                total_counts[label] += count
+
+        functions = [{
+            "function": label,
+            "self": self_counts[label],
+            "total": count,
+            "self_pct": round(self_counts[label] * 100.0 / total, 1) if total else 0.0,
+            "total_pct": round(count * 100.0 / total, 1) if total else 0.0,
+        } for label, count in total_counts.items()]
+        functions.sort(key=lambda f: (f["self"], f["total"]), reverse=True)
+
+        return {
+            "seconds": seconds,
+            "interval": self.interval,
+            "rounds": rounds,
+            "samples": total,
+            "idle_samples": idle,
+            "threads": dict(threads.most_common()),
+            "functions": functions[:top],
+            "collapsed": "\n".join(f"{';'.join(stack)} {count}" for stack, count in stacks.most_common()),
+        }
@@ -1,23 +1,38 @@
 # -*- coding: utf-8 -*-
 """
 舵机控制器 - Arduino 串口通信
-支持 JSON 协议和动作序列
+支持 JSON 协议和动作序列，所有运动经由单一运动调度线程输出
+后台连接管理线程负责断线检测与指数退避重连
 """
 
 import json
+import os
 import serial
 import time
 import logging
 import threading
 from typing import Optional, List, Dict
 
+from .log import RateLimitedLogger
+from .metrics import stage_histogram
+from .motion_scheduler import MotionScheduler, MotionRequest, MotionPriority
+from .trajectory import AxisLimits, TrajectoryGenerator
+
 logger = logging.getLogger(__name__)
+hot_log = RateLimitedLogger(logger)
+
+_SERIAL_WRITE_TIME = stage_histogram("serial_write")
 
 
 class ServoController:
     """舵机控制器，通过串口与 Arduino 通信"""
     
-    def __init__(self, port: str = "/dev/ttyACM0", baudrate: int = 115200, timeout: float = 2):
+    def __init__(self, port: str = "/dev/ttyACM0", baudrate: int = 115200, timeout: float = 2,
+                 firmware_actions: bool = False, action_config: Optional[Dict] = None,
+                 control_rate: float = 50.0, max_velocity: tuple = (300.0, 300.0),
+                 max_acceleration: tuple = (3000.0, 3000.0), trajectory_profile: str = "min_jerk",
+                 ready_timeout: float = 3.0, reconnect_min_delay: float = 0.5,
+                 reconnect_max_delay: float = 10.0):
         self.port = port
         self.baudrate = baudrate
         self.timeout = timeout
@@ -34,32 +49,170 @@ class ServoController:
         self.y_min, self.y_max = 20, 120
         self.x_center, self.y_center = 90, 70
         
-        # 动作执行状态
-        self.is_executing_action = False
-        self.action_start_time = 0
-        self.action_pause_duration = 3.0  # 动作后暂停时间
+        # 固件动作播放：连接时上传动作序列，之后用一条命令触发
+        self.firmware_actions = firmware_actions
+        self.action_config = action_config or {}
+        self.uploaded_actions: set = set()   # 固件已确认（ActionDefined）的动作
+        self.action_ack_timeout = 1.0        # 等待 action_define 确认的最长时间
+        self._rx_buffer = b""                # 串口输入中尚未读完的行
+        
+        # 动作结束后继续暂停跟踪的时长，及暂停截止时间（time.monotonic()）
+        self.action_pause_duration = self.action_config.get("pause_duration", 3.0)
+        self._pause_until = 0.0
+        
+        # 轨迹生成器：按每轴最大速度 / 加速度规划平滑轨迹
+        self.trajectory = TrajectoryGenerator(
+            AxisLimits(max_velocity[0], max_acceleration[0]),
+            AxisLimits(max_velocity[1], max_acceleration[1]),
+            profile=trajectory_profile
+        )
         
-    def connect(self) -> bool:
-        """连接到 Arduino"""
+        # 运动调度器：唯一写舵机的线程
+        self.scheduler = MotionScheduler(self._write_head, control_rate=control_rate,
+                                         generator=self.trajectory)
+        
+        # 连接管理
+        self.ready_timeout = ready_timeout  # 等待 "Robot Ready" 的最长时间
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self._manager_thread: Optional[threading.Thread] = None
+        self._manager_running = False
+        self._wakeup = threading.Event()     # 断线时唤醒连接管理线程
+        self._connected_event = threading.Event()
+        self.reconnect_count = 0
+        
+    def connect(self, wait: Optional[float] = None) -> bool:
+        """
+        启动后台连接管理线程，并最多等待 wait 秒完成首次连接
+        wait 为 None 时使用 ready_timeout；连接失败时后台会持续重连
+        """
+        if not self._manager_running:
+            self._manager_running = True
+            self._manager_thread = threading.Thread(target=self._connection_loop,
+                                                    name="servo-connection", daemon=True)
+            self._manager_thread.start()
+            
+        self._connected_event.wait(self.ready_timeout + 0.5 if wait is None else wait)
+        return self.is_connected()
+        
+    def _connection_loop(self):
+        """连接管理主循环：断线后指数退避重连，在线时监测端口与固件复位"""
+        delay = self.reconnect_min_delay
+        
+        while self._manager_running:
+            if self.initialized:
+                # 在线：检查端口是否消失，并读取固件输出
+                if "://" not in self.port and not os.path.exists(self.port):
+                    self._handle_disconnect("串口设备已消失")
+                else:
+                    self._poll_input()
+                self._wakeup.wait(0.5)
+                self._wakeup.clear()
+                continue
+                
+            if self._open_and_probe():
+                delay = self.reconnect_min_delay
+                self._on_connected()
+            else:
+                # 指数退避，stop 时可被唤醒
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+                delay = min(delay * 2, self.reconnect_max_delay)
+                
+    def _open_and_probe(self) -> bool:
+        """打开串口并等待固件就绪横幅，替代固定时长的 sleep"""
         try:
-            self.serial = serial.Serial(
-                port=self.port,
+            port = serial.serial_for_url(
+                self.port,
                 baudrate=self.baudrate,
-                timeout=self.timeout,
+                timeout=0.1,
                 write_timeout=1
             )
-            time.sleep(2)  # 等待 Arduino 启动
-            self.initialized = True
-            logger.info(f"成功连接到 Arduino: {self.port}")
+        except Exception as e:
+            logger.debug(f"打开串口失败: {e}")
+            return False
             
-            # 初始化到中心位置
-            self.center()
-            return True
+        # 打开串口会复位 Arduino，等待 "Robot Ready"；旧固件无横幅时超时后视为就绪
+        # readline 超时会返回不完整的行，拼接到下次读取，横幅分两次到达时也能匹配
+        deadline = time.monotonic() + self.ready_timeout
+        ready = False
+        partial = b""
+        try:
+            while time.monotonic() < deadline and self._manager_running:
+                partial += port.readline()
+                if not partial.endswith(b"\n"):
+                    continue
+                line, partial = partial.decode("utf-8", errors="ignore").strip(), b""
+                if line:
+                    logger.debug(f"Arduino: {line}")
+                if "Robot Ready" in line:
+                    ready = True
+                    break
+        except Exception as e:
+            logger.warning(f"等待 Arduino 就绪失败: {e}")
+            port.close()
+            return False
+            
+        with self._lock:
+            self.serial = port
+            self._rx_buffer = partial
+            self.initialized = True
+        logger.info(f"成功连接到 Arduino: {self.port}" + ("" if ready else " (未收到就绪横幅)"))
+        return True
+        
+    def _on_connected(self):
+        """连接（或固件复位）后同步状态"""
+        self.uploaded_actions.clear()
+        self.scheduler.start()
+        self.scheduler.invalidate()
+        
+        # 初始化到中心位置
+        self.center()
+        
+        # 上传动作序列到固件
+        if self.firmware_actions and self.action_config:
+            self.upload_actions(self.action_config)
+        self._connected_event.set()
+        
+    def _poll_input(self):
+        """读取固件输出，检测固件自行复位（再次出现就绪横幅，按完整行匹配，跨次读取的横幅也能识别）"""
+        for line in self._read_lines():
+            if "Robot Ready" in line:
+                logger.warning("检测到 Arduino 复位，重新同步")
+                self.reconnect_count += 1
+                self._on_connected()
+                return
             
+    def _read_lines(self) -> List[str]:
+        """读取串口中已到达的数据，返回完整的行（不完整的行留到下次读取）"""
+        try:
+            with self._lock:
+                data = self.serial.read(self.serial.in_waiting) if self.serial and self.serial.in_waiting else b""
         except Exception as e:
-            logger.error(f"连接 Arduino 失败: {e}")
+            self._handle_disconnect(f"读取串口失败: {e}")
+            return []
+        if not data:
+            return []
+        self._rx_buffer += data
+        *lines, self._rx_buffer = self._rx_buffer.split(b"\n")
+        return [line.decode("utf-8", errors="ignore").strip() for line in lines]
+        
+    def _handle_disconnect(self, reason: str):
+        """标记断线并唤醒连接管理线程（只记录一次日志）"""
+        with self._lock:
+            if not self.initialized:
+                return
             self.initialized = False
-            return False
+            port, self.serial = self.serial, None
+        self._connected_event.clear()
+        self.reconnect_count += 1
+        logger.error(f"Arduino 连接断开: {reason}，后台重连中")
+        try:
+            if port:
+                port.close()
+        except Exception:
+            pass
+        self._wakeup.set()
             
     def send_command(self, command_dict: Dict) -> bool:
         """发送 JSON 命令到 Arduino"""
@@ -69,24 +222,44 @@ class ServoController:
         try:
             with self._lock:
                 json_str = json.dumps(command_dict) + "\n"
+                start = time.perf_counter()
                 self.serial.write(json_str.encode('utf-8'))
                 self.serial.flush()
-                logger.debug(f"发送命令: {json_str.strip()}")
+                _SERIAL_WRITE_TIME.observe(time.perf_counter() - start)
+                logger.debug("发送命令: %s", json_str.strip())
                 return True
         except Exception as e:
-            logger.error(f"发送命令失败: {e}")
+            # 写失败视为断线，交给后台重连，避免每帧刷错误日志
+            self._handle_disconnect(f"发送命令失败: {e}")
             return False
             
-    def head_move(self, offset_x: int, offset_y: int, delay_ms: int = 3) -> bool:
+    @property
+    def is_executing_action(self) -> bool:
+        """是否有动作（或手动控制）正在执行或排队"""
+        return self.scheduler.is_busy(MotionPriority.GESTURE)
+        
+    def head_move(self, offset_x: int, offset_y: int, delay_ms: int = 3,
+                  priority: int = MotionPriority.TRACKING) -> bool:
         """
-        移动舵机头
+        移动舵机头（提交到运动调度器）
         offset_x: X轴偏移 (-25 to 25)
         offset_y: Y轴偏移 (-50 to 50)
         delay_ms: 移动延迟
+        priority: 运动优先级，默认为跟踪
+        返回请求是否被接受
         """
         if not self.initialized:
             return False
             
+        offset_x = max(-25, min(25, offset_x))
+        offset_y = max(-50, min(50, offset_y))
+        # 跟踪目标在线跟随（速度连续），其他请求按点到点轨迹规划
+        request = MotionRequest(priority, [(offset_x, offset_y, 0.0)], delay_ms=delay_ms,
+                                follow=priority == MotionPriority.TRACKING)
+        return self.scheduler.submit(request)
+        
+    def _write_head(self, offset_x: int, offset_y: int, delay_ms: int = 3) -> bool:
+        """发送 head_move 命令（仅由运动调度线程调用）"""
         # 限制偏移范围
         offset_x = max(-25, min(25, offset_x))
         offset_y = max(-50, min(50, offset_y))
@@ -110,93 +283,129 @@ class ServoController:
             return True
         return False
         
+    def upload_actions(self, action_config: Dict) -> int:
+        """
+        上传动作序列到 Arduino，由固件按自身定时器插值播放
+        只有收到 "ActionDefined:<name>" 确认的动作才由固件播放，其余（旧固件/上传失败）回退到主机规划
+        返回固件确认的动作数量
+        """
+        if not self.initialized:
+            return 0
+            
+        pending = set()
+        for name, sequence in action_config.items():
+            # 跳过 pause_duration 等非序列配置
+            if not isinstance(sequence, list) or not sequence:
+                continue
+                
+            steps = " ".join(
+                f"{int(step.get('x', 0))},{int(step.get('y', 0))},{int(step.get('delay', 100))}"
+                for step in sequence
+            )
+            if self.send_command({"factory": f"action_define {name} {steps}"}):
+                pending.add(name)
+            # 给固件留出解析时间，避免串口缓冲区溢出
+            time.sleep(0.05)
+            
+        # 等待固件逐条确认；不支持 action_define 的固件不会回复，超时后全部由主机播放
+        deadline = time.monotonic() + self.action_ack_timeout
+        while pending and self.initialized and time.monotonic() < deadline:
+            for line in self._read_lines():
+                kind, _, name = line.partition(":")
+                if name not in pending:
+                    continue
+                if kind == "ActionDefined":
+                    pending.discard(name)
+                    self.uploaded_actions.add(name)
+                elif kind == "ActionError":
+                    pending.discard(name)
+                    logger.warning(f"固件拒绝动作序列: {name}")
+            time.sleep(0.02)
+            
+        if pending:
+            logger.warning(f"固件未确认动作序列 {sorted(pending)}，改由主机播放")
+        logger.info(f"已上传 {len(self.uploaded_actions)} 个动作序列到固件: {sorted(self.uploaded_actions)}")
+        return len(self.uploaded_actions)
+        
     def center(self) -> bool:
         """回到中心位置"""
         if not self.initialized:
             return False
             
-        # 使用 head_move 方法回到中心（偏移量为0）
-        if self.head_move(0, 0, 10):
-            self.current_x = self.x_center
-            self.current_y = self.y_center
+        # 手动优先级，抢占正在执行的动作与跟踪
+        if self.head_move(0, 0, 10, priority=MotionPriority.MANUAL):
             logger.info("舵机回到中心位置")
             return True
         return False
         
-    def execute_action(self, action_name: str, action_config: Dict) -> bool:
+    def execute_action(self, action_name: str, action_config: Dict,
+                       pause: Optional[float] = None) -> bool:
         """
         执行动作序列
         action_name: 动作名称 (head_nod, head_shake, head_roll)
         action_config: 动作配置字典
+        pause: 动作结束后暂停跟踪的时长（秒），默认取 action_config["pause_duration"]
         """
-        logger.info(f"execute_action 被调用: {action_name}, initialized={self.initialized}, is_executing={self.is_executing_action}")
+        logger.debug("execute_action 被调用: %s, initialized=%s, is_executing=%s",
+                     action_name, self.initialized, self.is_executing_action)
         
         if not self.initialized:
-            logger.error("舵机未初始化，无法执行动作")
+            hot_log.error("舵机未初始化，无法执行动作")
             return False
             
         if self.is_executing_action:
-            logger.warning(f"动作正在执行中，忽略新动作: {action_name}")
+            hot_log.warning("动作正在执行中，忽略新动作: %s", action_name)
             return False
             
         if action_name not in action_config:
-            logger.warning(f"未知动作: {action_name}, 可用动作: {list(action_config.keys())}")
+            logger.warning("未知动作: %s, 可用动作: %s", action_name, list(action_config.keys()))
             return False
             
         action_sequence = action_config[action_name]
-        logger.info(f"动作序列: {action_sequence}")
+        logger.debug("动作序列: %s", action_sequence)
         
-        def action_thread():
-            try:
-                self.is_executing_action = True
-                self.action_start_time = time.time()
-                
-                logger.info(f"开始执行动作: {action_name}")
-                
-                for i, step in enumerate(action_sequence):
-                    x = step.get("x", 0)
-                    y = step.get("y", 0)
-                    delay = step.get("delay", 100)
-                    
-                    logger.info(f"  动作步骤 {i+1}/{len(action_sequence)}: x={x}, y={y}, delay={delay}ms")
-                    self.head_move(x, y, 3)
-                    time.sleep(delay / 1000.0)  # 转换为秒
-                    
-                logger.info(f"动作 {action_name} 执行完成，回到中心位置")
-                # 动作完成后回到中心位置
-                self.center()
-            except Exception as e:
-                logger.error(f"动作执行异常: {e}")
-            finally:
-                # 确保状态被重置
-                self.is_executing_action = False
-                logger.info(f"动作状态已重置")
-            
-        # 启动动作线程
-        thread = threading.Thread(target=action_thread, daemon=True)
-        thread.start()
-        logger.info(f"动作线程已启动: {action_name}")
+        # 固件已有该序列：一条命令触发，播放期间调度器保持占用舵机
+        if action_name in self.uploaded_actions:
+            duration = sum(step.get("delay", 100) for step in action_sequence) / 1000.0
+            request = MotionRequest(
+                MotionPriority.GESTURE, [(0, 0, 0.0)], name=action_name,
+                start_command=lambda: self.send_command({"factory": f"action_play {action_name}"}),
+                hold=duration
+            )
+        else:
+            # 主机规划：每步以 delay 为最短时长生成平滑轨迹，最后回到中心
+            waypoints = [(step.get("x", 0), step.get("y", 0), step.get("delay", 100) / 1000.0)
+                         for step in action_sequence]
+            waypoints.append((0, 0, 0.1))
+            request = MotionRequest(MotionPriority.GESTURE, waypoints, name=action_name)
+            
+        if not self.scheduler.submit(request):
+            return False
+        if pause is None:
+            pause = action_config.get("pause_duration", self.action_pause_duration)
+        self._pause_until = time.monotonic() + request.duration + pause
+        logger.info("动作已提交到运动调度器: %s, 预计 %.2fs", action_name, request.duration)
         return True
         
-    def is_action_running(self) -> bool:
-        """检查是否正在执行动作"""
-        if not self.is_executing_action:
-            return False
-            
-        # 检查动作是否超时
-        elapsed = time.time() - self.action_start_time
-        if elapsed > self.action_pause_duration:
-            self.is_executing_action = False
+    def cancel_action(self) -> bool:
+        """取消正在执行或排队的动作（及动作结束后的暂停期）"""
+        if not self.is_action_running():
             return False
-            
+        self.scheduler.cancel(MotionPriority.GESTURE)
+        self._pause_until = 0.0
+        if self.uploaded_actions:
+            self.send_command({"factory": "action_stop"})
+        logger.info("动作已取消")
         return True
         
+    def is_action_running(self) -> bool:
+        """检查是否正在执行动作（含动作结束后的暂停期）"""
+        return self.get_pause_remaining() > 0
+        
     def get_pause_remaining(self) -> float:
-        """获取动作暂停剩余时间"""
-        if not self.is_executing_action:
-            return 0.0
-        elapsed = time.time() - self.action_start_time
-        return max(0, self.action_pause_duration - elapsed)
+        """获取动作暂停剩余时间：动作剩余时长与结束后暂停期中较长者"""
+        return max(self.scheduler.remaining(MotionPriority.GESTURE),
+                   self._pause_until - time.monotonic(), 0.0)
         
     def look_at(self, screen_x: int, screen_y: int, screen_width: int = 640, screen_height: int = 480,
                 dead_zone: int = 40, gain_x: float = 0.08, gain_y: float = 0.10) -> bool:
@@ -235,9 +444,15 @@ class ServoController:
 
     def close(self):
         """关闭连接"""
+        self._manager_running = False
+        self._wakeup.set()
+        if self._manager_thread:
+            self._manager_thread.join(timeout=self.ready_timeout + 1.0)
+            self._manager_thread = None
+        self.scheduler.stop()
         if self.serial:
             try:
-                self.center()  # 回到中心位置
+                self._write_head(0, 0, 10)  # 回到中心位置
                 time.sleep(0.5)
                 self.serial.close()
             except:
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+合成帧源 - 用于端到端延迟测试与压力测试
+接口与 Camera 一致（open / read / read_frame / wait_frame / is_opened / release）；
+每帧左上角以黑白方块编码帧序号，画面中的白色目标按固定周期在左右两侧之间跳变（阶跃），
+处理方可以从任意一帧还原出它的帧序号与目标位置，无需任何模型
+"""
+
+import threading
+import time
+import logging
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .camera import Frame, FrameRingBuffer
+
+logger = logging.getLogger(__name__)
+
+ID_BITS = 32      # 帧序号位数
+ID_BLOCK = 8      # 每位方块边长（像素）
+
+
+class TargetStep(NamedTuple):
+    """一次目标阶跃"""
+    seq: int            # 阶跃后第一帧的序号
+    timestamp: float    # 该帧的采集时间 (time.monotonic)
+    x: int              # 阶跃后的目标中心 x
+
+
+class SyntheticSource:
+    """
+    合成帧源
+    - 按 fps 节拍生成黑底画面，目标为白色方块，中心每 step_period 秒在画面 1/4 与 3/4 宽度之间切换
+    - 目标位置变化记录在 steps 中，供测量阶跃响应
+    """
+
+    def __init__(self, width: int = 640, height: int = 480, fps: float = 30.0,
+                 step_period: float = 1.0, target_size: int = 120, buffer_slots: int = 4):
+        if width < ID_BITS * ID_BLOCK:
+            raise ValueError(f"画面宽度至少需要 {ID_BITS * ID_BLOCK} 像素以编码帧序号")
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.step_period = step_period
+        self.target_size = target_size
+        self.steps: List[TargetStep] = []
+
+        self._buffer = FrameRingBuffer(buffer_slots)
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._captured = 0
+
+    def open(self) -> bool:
+        """启动生成线程"""
+        if self._running:
+            return True
+        self.steps = []
+        self._captured = 0
+        self._running = True
+        self._buffer.reopen()
+        self._thread = threading.Thread(target=self._generate_loop, name="synthetic-source", daemon=True)
+        self._thread.start()
+        logger.info(f"合成帧源已启动: {self.width}x{self.height} @ {self.fps:.1f} FPS, 阶跃周期 {self.step_period}s")
+        return True
+
+    def target_x(self, elapsed: float) -> int:
+        """开始后 elapsed 秒时的目标中心 x"""
+        phase = int(elapsed / self.step_period) % 2 if self.step_period > 0 else 0
+        return self.width // 4 if phase == 0 else self.width * 3 // 4
+
+    def _generate_loop(self):
+        period = 1.0 / self.fps
+        start = next_time = time.monotonic()
+        shape = (self.height, self.width, 3)
+        half = self.target_size // 2
+        cy = self.height // 2
+        last_x = None
+
+        while self._running:
+            next_time = max(next_time + period, time.monotonic())
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+            timestamp = time.monotonic()
+            x = self.target_x(timestamp - start)
+            seq = self._captured + 1
+
+            image = self._buffer.next_slot(shape)
+            image.fill(0)
+            image[cy - half:cy + half, x - half:x + half] = 255
+            self.encode_frame_id(image, seq)
+
+            if x != last_x:
+                self.steps.append(TargetStep(seq, timestamp, x))
+                last_x = x
+            self._buffer.publish(image, timestamp)
+            self._captured = seq
+
+        self._buffer.close()
+
+    @staticmethod
+    def encode_frame_id(image: np.ndarray, seq: int):
+        """在左上角写入帧序号（每位一个 ID_BLOCK 见方的黑白方块，低位在左）"""
+        for bit in range(ID_BITS):
+            value = 255 if (seq >> bit) & 1 else 0
+            image[:ID_BLOCK, bit * ID_BLOCK:(bit + 1) * ID_BLOCK] = value
+
+    @staticmethod
+    def decode_frame_id(image: np.ndarray) -> int:
+        """从画面左上角还原帧序号"""
+        row = image[ID_BLOCK // 2, ID_BLOCK // 2:ID_BITS * ID_BLOCK:ID_BLOCK]
+        bits = (row[:, 0] if row.ndim == 2 else row) > 127
+        return int(sum(1 << i for i, b in enumerate(bits) if b))
+
+    @staticmethod
+    def locate_target(image: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """目标方块的 (x1, y1, x2, y2)，跳过帧序号所在的行"""
+        region = image[2 * ID_BLOCK:, :, 0] if image.ndim == 3 else image[2 * ID_BLOCK:]
+        cols = np.flatnonzero(region.max(axis=0) > 127)
+        rows = np.flatnonzero(region.max(axis=1) > 127)
+        if cols.size == 0 or rows.size == 0:
+            return None
+        offset = 2 * ID_BLOCK
+        return int(cols[0]), int(rows[0]) + offset, int(cols[-1]) + 1, int(rows[-1]) + offset + 1
+
+    def get_stats(self) -> dict:
+        return {
+            "source": "synthetic",
+            "captured": self._captured,
+            "dropped": 0,
+            "fps": round(self.fps, 2),
+            "steps": len(self.steps),
+        }
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """读取当前帧（兼容接口，返回可写副本）"""
+        frame = self._buffer.latest()
+        if frame is not None:
+            return True, frame.image.copy()
+        return False, None
+
+    def read_frame(self) -> Optional[Frame]:
+        """读取最新帧（零拷贝只读视图 + 序号 + 时间戳）"""
+        return self._buffer.latest()
+
+    def frame_near(self, timestamp: float) -> Optional[Frame]:
+        """最近几帧中采集时间最接近 timestamp 的一帧"""
+        return self._buffer.nearest(timestamp)
+
+    def wait_frame(self, after_seq: int = 0, timeout: Optional[float] = None) -> Optional[Frame]:
+        """阻塞等待比 after_seq 更新的帧"""
+        return self._buffer.wait_newer(after_seq, timeout)
+
+    def frame_valid(self, seq: int) -> bool:
+        """序号为 seq 的帧视图是否仍未被覆盖"""
+        return self._buffer.is_valid(seq)
+
+    def is_opened(self) -> bool:
+        return self._running
+
+    @property
+    def closed(self) -> bool:
+        """已停止生成，不会再有新帧"""
+        return self._buffer.closed
+
+    @property
+    def released(self) -> bool:
+        """已调用 release()（缓冲区关闭是主动停止，而非读取失败）"""
+        return not self._running
+
+    def release(self):
+        """停止生成"""
+        self._running = False
+        self._buffer.close()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        logger.info("合成帧源已释放")
@@ -8,7 +8,10 @@ import logging
 from typing import Dict, List, Optional, Tuple
 from collections import deque
 
+from .log import RateLimitedLogger
+
 logger = logging.getLogger(__name__)
+hot_log = RateLimitedLogger(logger)  # 每帧调用的日志按调用位置限频
 
 
 class ObjectTracker:
@@ -87,13 +90,15 @@ class ObjectTracker:
         learnings = [d for d in detections if d.get("category") == "learning"]
         others = [d for d in detections if d.get("category") == "other"]
         
-        # 调试：打印检测统计
+        # 调试：打印检测统计（明细只在 DEBUG 级别输出）
         if faces or foods or learnings or others:
-            logger.info(f"Detection stats - faces:{len(faces)} foods:{len(foods)} learnings:{len(learnings)} others:{len(others)}")
-            for f in faces[:2]:
-                logger.info(f"  Face: {f['label']} conf={f['confidence']:.2f}")
-            for item in (foods + learnings + others)[:2]:
-                logger.info(f"  Item: {item['label']}({item['category']}) conf={item['confidence']:.2f}")
+            hot_log.info("Detection stats - faces:%d foods:%d learnings:%d others:%d",
+                         len(faces), len(foods), len(learnings), len(others))
+            if logger.isEnabledFor(logging.DEBUG):
+                for f in faces[:2]:
+                    logger.debug("  Face: %s conf=%.2f", f['label'], f['confidence'])
+                for item in (foods + learnings + others)[:2]:
+                    logger.debug("  Item: %s(%s) conf=%.2f", item['label'], item['category'], item['confidence'])
         
         # 策略 1: 优先跟踪人脸
         if faces:
@@ -135,7 +140,8 @@ class ObjectTracker:
                 status["mode"] = "face_tracking"
                 status["target"] = self.target_face
                 status["message"] = f"Face: {self.target_face['confidence']:.2f}"
-                logger.info(f"Tracking face: person_center=({person_center_x},{person_center_y}), face_bbox=({face_x1},{face_y1},{face_x2},{face_y2})")
+                hot_log.info("Tracking face: person_center=(%d,%d), face_bbox=(%d,%d,%d,%d)",
+                             person_center_x, person_center_y, face_x1, face_y1, face_x2, face_y2)
                 return status
                 
         # 检查人脸是否刚丢失
@@ -148,7 +154,8 @@ class ObjectTracker:
                 
         # 策略 2: 无人脸时识别物品并执行动作
         cooldown_remaining = self.category_cooldown - (current_time - self.last_category_time)
-        logger.info(f"物品检测检查: foods={len(foods)}, learnings={len(learnings)}, others={len(others)}, cooldown={cooldown_remaining:.1f}s")
+        hot_log.info("物品检测检查: foods=%d, learnings=%d, others=%d, cooldown=%.1fs",
+                     len(foods), len(learnings), len(others), cooldown_remaining)
         
         if current_time - self.last_category_time > self.category_cooldown:
             action_executed = False
@@ -156,7 +163,7 @@ class ObjectTracker:
             # 优先级: food > learning > other
             if foods:
                 best_food = max(foods, key=lambda x: x["confidence"])
-                logger.info(f"尝试执行食物动作: {best_food['label']} conf={best_food['confidence']:.2f}")
+                logger.info("尝试执行食物动作: %s conf=%.2f", best_food['label'], best_food['confidence'])
                 if self._execute_category_action("food", best_food):
                     status["mode"] = "food_detected"
                     status["target"] = best_food
@@ -164,11 +171,11 @@ class ObjectTracker:
                     status["message"] = f"检测到食物: {best_food['label']}，执行点头"
                     action_executed = True
                 else:
-                    logger.warning("食物动作执行失败")
+                    hot_log.warning("食物动作执行失败")
                     
             elif learnings:
                 best_learning = max(learnings, key=lambda x: x["confidence"])
-                logger.info(f"尝试执行学习用品动作: {best_learning['label']} conf={best_learning['confidence']:.2f}")
+                logger.info("尝试执行学习用品动作: %s conf=%.2f", best_learning['label'], best_learning['confidence'])
                 if self._execute_category_action("learning", best_learning):
                     status["mode"] = "learning_detected"
                     status["target"] = best_learning
@@ -176,11 +183,11 @@ class ObjectTracker:
                     status["message"] = f"检测到学习用品: {best_learning['label']}，执行摇头"
                     action_executed = True
                 else:
-                    logger.warning("学习用品动作执行失败")
+                    hot_log.warning("学习用品动作执行失败")
                     
             elif others:
                 best_other = max(others, key=lambda x: x["confidence"])
-                logger.info(f"尝试执行其他物品动作: {best_other['label']} conf={best_other['confidence']:.2f}")
+                logger.info("尝试执行其他物品动作: %s conf=%.2f", best_other['label'], best_other['confidence'])
                 if self._execute_category_action("other", best_other):
                     status["mode"] = "other_detected"
                     status["target"] = best_other
@@ -188,12 +195,12 @@ class ObjectTracker:
                     status["message"] = f"检测到其他物品: {best_other['label']}，执行转圈"
                     action_executed = True
                 else:
-                    logger.warning("其他物品动作执行失败")
+                    hot_log.warning("其他物品动作执行失败")
                     
             if action_executed:
                 return status
         else:
-            logger.info(f"物品检测冷却中，还需等待 {cooldown_remaining:.1f} 秒")
+            hot_log.info("物品检测冷却中，还需等待 %.1f 秒", cooldown_remaining)
                 
         # 没有检测到任何目标
         status["mode"] = "idle"
@@ -297,10 +304,10 @@ class ObjectTracker:
             return False
             
         # 执行动作
-        if self.servo.execute_action(action_name, self.action_config):
+        if self.servo.execute_action(action_name, self.action_config, pause=self.action_pause_duration):
             self.last_category_time = time.time()
             self.last_detected_category = category
-            logger.info(f"执行动作 {action_name} 响应类别 {category}")
+            logger.info("执行动作 %s 响应类别 %s", action_name, category)
             return True
             
         return False
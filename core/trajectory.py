@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+轨迹生成模块 - 把目标变化转换为平滑的舵机轨迹
+支持最小加加速度 (minimum-jerk) 与梯形速度曲线，按每轴最大速度 / 加速度限幅
+"""
+
+import math
+from typing import Tuple
+
+Point = Tuple[float, float]
+
+
+class AxisLimits:
+    """单轴运动限制"""
+
+    def __init__(self, max_velocity: float, max_acceleration: float):
+        self.max_velocity = max_velocity          # °/s
+        self.max_acceleration = max_acceleration  # °/s²
+
+
+class Trajectory:
+    """
+    两轴同步的点到点轨迹
+    两轴共用同一条归一化曲线，时长由最慢的轴决定，保证同时到达
+    """
+
+    def __init__(self, start: Point, end: Point, duration: float,
+                 profile: str = "min_jerk", blend: float = 0.5):
+        self.start = start
+        self.end = end
+        self.duration = duration
+        self.profile = profile
+        self.blend = blend  # 梯形曲线加速段占总时长的比例
+
+    def sample(self, t: float) -> Point:
+        """采样 t 时刻（秒）的位置"""
+        if self.duration <= 0 or t >= self.duration:
+            return self.end
+        if t <= 0:
+            return self.start
+
+        s = t / self.duration
+        if self.profile == "trapezoid":
+            ratio = self._trapezoid(s)
+        elif self.profile == "linear":
+            ratio = s
+        else:
+            # 最小加加速度：10s³ - 15s⁴ + 6s⁵
+            ratio = s * s * s * (10 - 15 * s + 6 * s * s)
+
+        return (self.start[0] + (self.end[0] - self.start[0]) * ratio,
+                self.start[1] + (self.end[1] - self.start[1]) * ratio)
+
+    def _trapezoid(self, s: float) -> float:
+        """归一化梯形速度曲线的位移比例"""
+        b = self.blend
+        peak = 1.0 / (1.0 - b)  # 归一化峰值速度
+        if s < b:
+            return 0.5 * peak / b * s * s
+        if s <= 1.0 - b:
+            return 0.5 * peak * b + peak * (s - b)
+        r = 1.0 - s
+        return 1.0 - 0.5 * peak / b * r * r
+
+
+class TrajectoryGenerator:
+    """
+    轨迹生成器
+    - plan(): 已知路点的点到点规划（动作序列、回中心）
+    - follow(): 目标不断变化时的在线跟随（跟踪），速度连续、不超限
+    """
+
+    # 最小加加速度曲线的峰值速度 / 加速度系数
+    MIN_JERK_PEAK_VELOCITY = 1.875
+    MIN_JERK_PEAK_ACCELERATION = 10.0 / math.sqrt(3.0)
+
+    def __init__(self, limits_x: AxisLimits, limits_y: AxisLimits, profile: str = "min_jerk"):
+        self.limits = (limits_x, limits_y)
+        self.profile = profile
+
+    def plan(self, start: Point, end: Point, min_duration: float = 0.0) -> Trajectory:
+        """规划点到点轨迹，时长不少于 min_duration 且满足两轴限制"""
+        duration = min_duration
+        blend = 0.5
+
+        for axis, limits in enumerate(self.limits):
+            distance = abs(end[axis] - start[axis])
+            if distance <= 0:
+                continue
+            axis_duration, axis_blend = self._axis_duration(distance, limits)
+            if axis_duration > duration:
+                duration, blend = axis_duration, axis_blend
+
+        return Trajectory(start, end, duration, self.profile, blend)
+
+    def _axis_duration(self, distance: float, limits: AxisLimits) -> Tuple[float, float]:
+        """单轴满足限制的最短时长，以及梯形曲线的加速段比例"""
+        v_max = limits.max_velocity
+        a_max = limits.max_acceleration
+
+        if self.profile == "trapezoid":
+            if distance >= v_max * v_max / a_max:
+                duration = distance / v_max + v_max / a_max
+                return duration, (v_max / a_max) / duration
+            # 三角形速度曲线（达不到最大速度）
+            return 2.0 * math.sqrt(distance / a_max), 0.5
+
+        duration = max(self.MIN_JERK_PEAK_VELOCITY * distance / v_max,
+                       math.sqrt(self.MIN_JERK_PEAK_ACCELERATION * distance / a_max))
+        return duration, 0.5
+
+    def follow(self, position: Point, velocity: Point, target: Point, dt: float) -> Tuple[Point, Point]:
+        """
+        在线跟随一个控制周期
+        每轴按 v = sign(d)·min(v_max, √(2·a_max·|d|)) 求期望速度，
+        再以 a_max 限制速度变化，目标变化时速度保持连续
+        返回 (新位置, 新速度)
+        """
+        new_position = []
+        new_velocity = []
+
+        for axis, limits in enumerate(self.limits):
+            p, v = position[axis], velocity[axis]
+            d = target[axis] - p
+            dv_max = limits.max_acceleration * dt
+
+            if abs(d) < 0.05 and abs(v) <= dv_max:
+                new_position.append(float(target[axis]))
+                new_velocity.append(0.0)
+                continue
+
+            desired = math.copysign(min(limits.max_velocity,
+                                        math.sqrt(2.0 * limits.max_acceleration * abs(d))), d)
+            v += max(-dv_max, min(dv_max, desired - v))
+            step = v * dt
+            # 不越过目标
+            if (d > 0 and step > d) or (d < 0 and step < d):
+                step = d
+                v = 0.0
+            new_position.append(p + step)
+            new_velocity.append(v)
+
+        return (new_position[0], new_position[1]), (new_velocity[0], new_velocity[1])
+
+    @staticmethod
+    def reached(position: Point, velocity: Point, target: Point) -> bool:
+        """是否已停在目标位置"""
+        return (position[0] == target[0] and position[1] == target[1]
+                and velocity[0] == 0.0 and velocity[1] == 0.0)
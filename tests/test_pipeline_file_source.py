@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""非实时离线帧源：流水线逐帧处理，每一帧都送到检测器"""
+
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import app
+from core.file_source import FileSource
+
+
+class SlowDetector:
+    """每帧耗时 30 ms 的假检测器，记录收到的帧（帧序号写在像素值中）"""
+
+    initialized = True
+
+    def __init__(self):
+        self.seen = []
+
+    def detect_batch(self, frames):
+        time.sleep(0.03)
+        self.seen.extend(int(frame[0, 0, 0]) for frame in frames)
+        return [[] for _ in frames]
+
+
+def test_every_decoded_frame_reaches_detector(tmp_path):
+    count = 120
+    for i in range(count):
+        image = np.full((48, 64, 3), i, dtype=np.uint8)
+        cv2.imwrite(os.path.join(tmp_path, f"{i:04d}.png"), image)
+
+    source = FileSource(str(tmp_path), realtime=False, loop=False, buffer_slots=4)
+    detector = SlowDetector()
+    system = app.RobotVisionSystem()
+    system.camera = source
+    system.detector = detector
+    system.capture.add_source("head", source)
+    assert system.capture.open(["head"]) == {"head": True}
+    system.is_running = True
+
+    thread = threading.Thread(target=system.process_frame, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 30
+        while len(detector.seen) < count and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        system.is_running = False
+        thread.join(5)
+        source.release()
+
+    assert source.get_stats()["captured"] == count
+    assert detector.seen == list(range(count))
+    stats = system.get_pipeline_stats()
+    assert all(stage["dropped"] == 0 for stage in stats.values())